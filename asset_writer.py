@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from timing import timed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {
+    'png': '.png',
+    'webp': '.webp',
+}
+
+class AssetWriter:
+    # Encodes screenshots and renames recordings on a thread pool so the gamepad
+    # sequence never waits on the encoder or the filesystem. At most
+    # `max_pending` jobs (and therefore frames) are held in memory at once;
+    # further submissions wait for a free slot.
+    def __init__(self, image_format='png', png_compression=1, webp_quality=101, max_pending=8, workers=2):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format '{image_format}'. Use one of: {', '.join(IMAGE_FORMATS)}.")
+        self.image_format = image_format
+        self.extension = IMAGE_FORMATS[image_format]
+        if image_format == 'png':
+            self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        else:
+            # A WebP quality above 100 selects lossless encoding.
+            self.encode_params = [cv2.IMWRITE_WEBP_QUALITY, webp_quality]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-writer")
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = set()
+        self.failures = 0
+
+    def image_path(self, path):
+        return Path(path).with_suffix(self.extension)
+
+    def _run_job(self, function, on_done, *args):
+        path = function(*args)
+        if on_done is not None:
+            on_done(path)
+        return path
+
+    @timed('assets.write_image')
+    def _write_image(self, path, frame):
+        ok, encoded = cv2.imencode(self.extension, frame, self.encode_params)
+        if not ok:
+            raise IOError(f"could not encode image for {path}")
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, path)
+        return path
+
+    @timed('assets.rename')
+    def _rename(self, src, dst):
+        if not os.path.exists(src):
+            raise FileNotFoundError(f"OBS reported video path that does not exist: {src}")
+        # os.replace overwrites an existing destination atomically.
+        os.replace(src, dst)
+        return dst
+
+    async def _submit(self, description, function, on_done, *args):
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._run_job, function, on_done, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        self._pending.add(future)
+
+        def done(f):
+            self._pending.discard(f)
+            self._slots.release()
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is not None:
+                self.failures += 1
+                logger.error(f"Error while {description}: {error}")
+            else:
+                logger.debug(f"Finished {description}")
+
+        future.add_done_callback(done)
+        return future
+
+    # `on_done(path)` is called from the worker thread once the file is in place.
+    async def save_image(self, path, frame, on_done=None):
+        path = self.image_path(path)
+        await self._submit(f"writing {path}", self._write_image, on_done, path, frame)
+        return path
+
+    async def rename(self, src, dst, on_done=None):
+        await self._submit(f"renaming {src} to {dst}", self._rename, on_done, src, dst)
+        return dst
+
+    async def flush(self):
+        # Waits for every queued job. Returns the number of jobs that failed since
+        # the last flush.
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        failures, self.failures = self.failures, 0
+        return failures
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1 @@
+from timing import percentile
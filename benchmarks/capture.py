@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from simulator import MenuGame, install_fake_vgamepad
+
+# The bot's modules import vgamepad, which is only available with ViGEmBus.
+install_fake_vgamepad()
+
+from helpers import load_configs
+from obs_mock import MockOBSServer
+from screen_capture import CaptureProfile, OBSClient
+
+async def time_profile(obs, profile, runs):
+    # Full round trip per screenshot (encode in the server, transfer, base64 and
+    # image decode in the client), plus the decode on its own and the payload size.
+    scene_name = obs._get_scene_name()
+    data = obs._screenshot_data(scene_name, profile)
+    totals = []
+    decodes = []
+    size = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = await obs.request('GetSourceScreenshot', **data)
+        received = time.perf_counter()
+        frame = obs._decode_screenshot(response['imageData'])
+        finished = time.perf_counter()
+        totals.append(finished - started)
+        decodes.append(finished - received)
+        size = len(response['imageData'])
+    return statistics.mean(totals), statistics.mean(decodes), size, frame.shape
+
+async def run(args):
+    config, catalog, ocr_regions = load_configs(args.list, args.version)
+    game = MenuGame(catalog.teams_config, ocr_regions)
+    game.reset('team', team_index=3)
+    frame = game.render()
+    async with MockOBSServer(port=0, frame_source=lambda: frame) as server:
+        port = server._server.sockets[0].getsockname()[1]
+        profiles = [('full (before)', CaptureProfile('jpeg', 1.0, -1)), ('archival', CaptureProfile('png', 1.0, -1))]
+        profiles += [(f"polling {scale}", CaptureProfile('jpeg', scale, args.quality)) for scale in args.scales]
+        baseline = None
+        for label, profile in profiles:
+            # Only the asyncio connection is used; it also reads the canvas size.
+            obs = OBSClient(port=port, polling=profile)
+            obs.capture_scene_name = server.scene_name
+            await obs.connect_async()
+            try:
+                await time_profile(obs, profile, 2)
+                total, decode, size, shape = await time_profile(obs, profile, args.runs)
+            finally:
+                await obs.disconnect_async()
+            baseline = baseline or total
+            print(f"{label:16} {shape[1]:5}x{shape[0]:<5} {profile.image_format:5} {size / 1024:8.1f} KiB  "
+                  f"{total * 1000:7.1f} ms/frame  decode {decode * 1000:6.1f} ms  {baseline / total:5.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time screenshot requests per capture profile against the mock OBS server.")
+    parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
+    parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--scales", type=float, nargs='+', default=[0.5, 0.33], help="Polling scales to compare.")
+    parser.add_argument("--quality", type=int, default=70, help="JPEG quality of the polling frames.")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from simulator import FakeGamepad, MenuGame, install_fake_vgamepad
+
+# The bot's modules import vgamepad, which is only available with ViGEmBus.
+install_fake_vgamepad()
+
+from asset_writer import AssetWriter
+from coordinator import build_jobs, Coordinator, Instance
+from game_pads import Gamepad
+from helpers import load_configs
+from manifest import CaptureManifest
+from ocr import OCRService
+from recording import TeamRecorder
+from simulator.obs import SimulatedOBS
+from simulator.reader import FakeReader
+from timeline import compile_macros, TimelineRunner
+
+# The simulator returns from a team list to the league list with B; the real
+# games' league_exit macro is set per version in config.yaml.
+SIMULATED_LEAGUE_EXIT = [{'press': 'B'}, {'settle': {'change_timeout': 0.5, 'settle_timeout': 1.0}}]
+
+async def run_once(args, config, catalog, ocr_regions, instance_count):
+    macros = compile_macros({**config['macros'], 'league_exit': SIMULATED_LEAGUE_EXIT}, config.get('timeline'))
+    manifest_dir = tempfile.TemporaryDirectory()
+    manifest = CaptureManifest(os.path.join(manifest_dir.name, 'manifest.json'))
+    jobs = build_jobs(catalog, navigation=config.get('navigation'))[:args.teams]
+
+    # The simulator renders the names as written in the list, slashes included.
+    names = catalog.names()
+    x1, y1, x2, y2 = ocr_regions['p1_team_select_text']
+    ocr = OCRService(FakeReader(names, region_size=(x2 - x1, y2 - y1), latency=args.ocr_latency, seed=args.seed))
+    ocr.start()
+    games = []
+    instances = []
+    for number in range(instance_count):
+        game = MenuGame(catalog.teams_config, ocr_regions, reaction_time=args.reaction_time, scroll_time=args.scroll_time,
+                        screen_time=args.screen_time)
+        obs = SimulatedOBS(game)
+        obs.start_capture()
+        pad = FakeGamepad(game)
+        assets = AssetWriter()
+        recorder = TeamRecorder(obs, assets, clip_length=args.clip_length, manifest=manifest)
+        runner = TimelineRunner(Gamepad(pad), settle=obs.wait_for_transition, stable=obs.wait_for_stable)
+        name = f"sim{number + 1}"
+        games.append(game)
+        instances.append(Instance(name, obs, pad, runner, ocr.channel(name), assets, recorder))
+
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            coordinator = Coordinator(instances, jobs, config, ocr_regions, catalog, macros, manifest,
+                                      intro=False, output_dir=output_dir)
+            started = time.perf_counter()
+            done = await coordinator.run()
+            elapsed = time.perf_counter() - started
+            for instance in instances:
+                await instance.assets.flush()
+    finally:
+        for instance in instances:
+            instance.assets.close()
+            instance.obs.stop_capture()
+        ocr.stop()
+        manifest_dir.cleanup()
+
+    captured = {}
+    for game in games:
+        for league, team, _ in game.captured_players:
+            captured[team] = captured.get(team, 0) + 1
+    incomplete = [job.team_name for job in jobs if captured.get(job.team_name, 0) < games[0].players_per_team]
+    return elapsed, done, coordinator.queue.stolen, incomplete
+
+async def run(args):
+    config, catalog, ocr_regions = load_configs(args.list, args.version)
+    if args.timeline_scale is not None:
+        config.setdefault('timeline', {})['scale'] = args.timeline_scale
+    baseline = None
+    for instance_count in args.instances:
+        elapsed, done, stolen, incomplete = await run_once(args, config, catalog, ocr_regions, instance_count)
+        rate = done / elapsed * 3600 if elapsed > 0 else 0.0
+        baseline = baseline or rate
+        print(f"instances {instance_count:2}  teams {done:4}  {elapsed:8.1f} s  {rate:7.1f} teams/hour  "
+              f"speed-up {rate / baseline if baseline else 0.0:5.2f}x  stolen {stolen:3}  incomplete {len(incomplete)}")
+        for team_name in incomplete:
+            print(f"    not fully captured: {team_name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the multi-instance coordinator against simulated game instances.")
+    parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
+    parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--instances", type=int, nargs='+', default=[1, 2, 4], help="Instance counts to compare.")
+    parser.add_argument("--teams", type=int, default=8, help="Capture the first N selectable teams of the list.")
+    parser.add_argument("--clip-length", type=float, default=0.2, help="Motion clip length used for the team captures.")
+    parser.add_argument("--timeline-scale", type=float, default=None, help="Override timeline.scale (gaps and waits of the menu macros).")
+    parser.add_argument("--reaction-time", type=float, default=0.03)
+    parser.add_argument("--scroll-time", type=float, default=0.08)
+    parser.add_argument("--screen-time", type=float, default=0.4)
+    parser.add_argument("--ocr-latency", type=float, default=0.03, help="Simulated OCR inference time per read.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-v", "--verbose", action='store_true', help="Show the bot's log output.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import random
+import statistics
+import string
+import time
+
+import yaml
+
+from ocr import FuzzyMatcher
+
+def reference_fuzzy_match(ocr_text, options_list, config):
+    # The original per-call pure-Python implementation, kept for comparison.
+    equivalences = config.get('ocr_corrections', {}).get('character_equivalences', {})
+
+    def get_substitution_cost(c1, c2):
+        if c1 == c2:
+            return 0
+        if equivalences.get(c1) and c2 in equivalences.get(c1):
+            return 0.1
+        if equivalences.get(c2) and c1 in equivalences.get(c2):
+            return 0.1
+        return 1
+
+    def levenshtein_distance(s1, s2):
+        if len(s1) < len(s2):
+            return levenshtein_distance(s2, s1)
+        if len(s2) == 0:
+            return len(s1)
+        previous_row = range(len(s2) + 1)
+        for i, c1 in enumerate(s1):
+            current_row = [i + 1]
+            for j, c2 in enumerate(s2):
+                insertions = previous_row[j + 1] + 1
+                deletions = current_row[j] + 1
+                substitutions = previous_row[j] + get_substitution_cost(c1, c2)
+                current_row.append(min(insertions, deletions, substitutions))
+            previous_row = current_row
+        return previous_row[-1]
+
+    ocr_text_lower = ocr_text.lower()
+    best_match = None
+    highest_similarity = 0
+    for option in options_list:
+        if option is None:
+            continue
+        option_lower = option.lower()
+        distance = levenshtein_distance(ocr_text_lower, option_lower)
+        max_len = max(len(ocr_text_lower), len(option_lower))
+        similarity = 1.0 if max_len == 0 else 1.0 - (distance / max_len)
+        if similarity > highest_similarity:
+            highest_similarity = similarity
+            best_match = option
+    return best_match if highest_similarity > 0.6 else None
+
+def random_name(rng):
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(rng.randint(1, 3))]
+    return ' '.join(words).title()
+
+def misread(rng, name):
+    chars = list(name.lower())
+    for _ in range(rng.randint(0, 2)):
+        position = rng.randrange(len(chars))
+        chars[position] = rng.choice('gl5o01ik')
+    return ''.join(chars)
+
+def timed(function, queries):
+    timings = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(function(query))
+        timings.append(time.perf_counter() - started)
+    return timings, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy matching of OCR text against team lists of various sizes.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[200, 1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--reference-limit", type=int, default=5000, help="Skip the reference implementation above this list size.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open("config.yaml", 'r') as f:
+        config = yaml.safe_load(f)
+    rng = random.Random(args.seed)
+
+    for size in args.sizes:
+        options = [random_name(rng) for _ in range(size)]
+        queries = [misread(rng, rng.choice(options)) for _ in range(args.queries)]
+
+        started = time.perf_counter()
+        matcher = FuzzyMatcher(options, config)
+        build_time = time.perf_counter() - started
+        timings, results = timed(matcher.match, queries)
+        print(f"{size:6} names  FuzzyMatcher  build {build_time * 1000:7.1f} ms  "
+              f"mean {statistics.mean(timings) * 1000:8.2f} ms  max {max(timings) * 1000:8.2f} ms")
+
+        if size <= args.reference_limit:
+            reference_timings, reference_results = timed(lambda q: reference_fuzzy_match(q, options, config), queries)
+            agreement = sum(a == b for a, b in zip(results, reference_results))
+            print(f"{size:6} names  reference     "
+                  f"mean {statistics.mean(reference_timings) * 1000:8.2f} ms  max {max(reference_timings) * 1000:8.2f} ms  "
+                  f"agreement {agreement}/{len(queries)}")
+
+if __name__ == "__main__":
+    main()
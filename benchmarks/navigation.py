@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from simulator import FakeGamepad, MenuGame, install_fake_vgamepad
+
+# The bot's modules import vgamepad, which is only available with ViGEmBus.
+install_fake_vgamepad()
+
+from asset_writer import AssetWriter
+from game_pads import Gamepad
+from benchmarks import percentile
+from helpers import SelectionState, load_configs, select_league, select_team
+from main import capture_team
+from menu_graph import MenuModel, MenuNavigator
+from ocr import OCRService, TemplateRecognizer
+from recording import TeamRecorder
+from screen_capture import CaptureProfile
+from simulator.obs import SimulatedOBS
+from simulator.reader import FakeReader
+from timeline import compile_macros, TimelineRunner
+from timing import TRACER, configure_timing
+
+def simulated_menu(config, cursor_persists, wrap=True):
+    # The simulator's lists wrap around unless --no-list-wrap and its player menu
+    # keeps the cursor only with --menu-cursor-persists; the screens are told
+    # apart by their layouts.
+    menu = dict(config['menu'])
+    screens = {name: dict(screen) for name, screen in menu['screens'].items()}
+    screens['players'].update(wrap=wrap, identity=[40, 140, 640, 1040])
+    screens['player_menu'].update(wrap=wrap, cursor='keep' if cursor_persists else 'reset', identity=[640, 200, 1280, 760])
+    screens['motion'].update(identity=[40, 40, 200, 90])
+    menu['screens'] = screens
+    return MenuModel(menu)
+
+def report(name, timings, presses, failures, dropped):
+    if not timings and not failures:
+        return
+    if not timings:
+        print(f"{name:14} no successful runs ({failures} failed)")
+        return
+    print(f"{name:14} runs {len(timings):4}  mean {statistics.mean(timings):7.2f} s  "
+          f"p50 {percentile(timings, 50):7.2f} s  p95 {percentile(timings, 95):7.2f} s  max {max(timings):7.2f} s  "
+          f"presses {statistics.mean(presses):6.1f}/run  dropped {dropped}  failed {failures}")
+
+async def timed_run(game, coroutine, timeout):
+    presses, dropped = game.presses, game.dropped
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        return None, game.presses - presses, game.dropped - dropped
+    return time.perf_counter() - started, game.presses - presses, game.dropped - dropped
+
+async def run(args):
+    config, catalog, ocr_regions = load_configs(args.list, args.version)
+    if args.press_gap is not None:
+        config['navigation']['press_gap'] = args.press_gap
+    # The bot is told the lists wrap, as they do in the simulator; with
+    # --no-list-wrap it has to find out they do not.
+    config['navigation']['wrap'] = True
+    if args.timeline_scale is not None:
+        config.setdefault('timeline', {})['scale'] = args.timeline_scale
+    macros = compile_macros(config['macros'], config.get('timeline'))
+    rng = random.Random(args.seed)
+
+    game = MenuGame(catalog.teams_config, ocr_regions, reaction_time=args.reaction_time, scroll_time=args.scroll_time,
+                    screen_time=args.screen_time, min_press_gap=args.min_press_gap, menu_cursor_persists=args.menu_cursor_persists,
+                    wrap=not args.no_list_wrap)
+    names = catalog.names()
+    obs = SimulatedOBS(game, polling=CaptureProfile('jpeg', args.poll_scale, -1))
+    x1, y1, x2, y2 = ocr_regions['p1_team_select_text']
+    ocr = OCRService(FakeReader(names, region_size=(x2 - x1, y2 - y1), latency=args.ocr_latency, error_rate=args.ocr_error_rate,
+                                seed=args.seed, scale=obs.poll_scale))
+    # The game renders at full size; the bot reads the (possibly downscaled) polling frames.
+    ocr_regions = obs.scale_regions(ocr_regions)
+    if obs.poll_scale < 1.0:
+        config.setdefault('ocr', {})['upscale'] = 1.0 / obs.poll_scale
+    ocr.start()
+    recognizer = TemplateRecognizer() if args.templates else None
+    obs.start_capture()
+    gamepad = FakeGamepad(game)
+    runner = TimelineRunner(Gamepad(gamepad), settle=obs.wait_for_transition, stable=obs.wait_for_stable)
+    state = SelectionState()
+    navigator = None
+    if args.menu_graph:
+        # --menu-model-cursor overrides what the model assumes, to exercise the re-planning.
+        cursor_persists = args.menu_cursor_persists if args.menu_model_cursor is None else args.menu_model_cursor == 'keep'
+        navigator = MenuNavigator(simulated_menu(config, cursor_persists, not args.no_list_wrap), runner, obs)
+
+    leagues = [league for league in game.leagues if game.teams[league]]
+    try:
+        timings, presses, failures, dropped = [], [], 0, 0
+        for _ in range(args.runs):
+            target = rng.choice(leagues)
+            game.reset('league', league_index=rng.randrange(len(game.leagues)))
+            elapsed, pressed, lost = await timed_run(
+                game, select_league(obs, gamepad, ocr, ocr_regions, config, game.leagues, target, state, recognizer), args.timeout)
+            await asyncio.sleep(args.screen_time + 0.1)
+            if elapsed is None or game.state()['screen'] != 'team' or game.league != target:
+                failures += 1
+            else:
+                timings.append(elapsed)
+                presses.append(pressed)
+            dropped += lost
+        report("select_league", timings, presses, failures, dropped)
+
+        timings, presses, failures, dropped = [], [], 0, 0
+        for run_index in range(args.runs):
+            if run_index == args.slow_runs:
+                # The game has caught up; the bot should win back its press gap penalty.
+                game.min_press_gap = 0.0
+            league_index = game.leagues.index(rng.choice(leagues))
+            league_teams = game.teams[game.leagues[league_index]]
+            target = rng.choice(league_teams)
+            game.reset('team', league_index=league_index, team_index=rng.randrange(len(league_teams)))
+            all_teams = [name[1:-1] if name.startswith('/') and name.endswith('/') else name for name in league_teams]
+            elapsed, pressed, lost = await timed_run(
+                game, select_team(obs, gamepad, ocr, ocr_regions, config, all_teams, target, state, recognizer), args.timeout)
+            await asyncio.sleep(args.screen_time + 0.1)
+            if elapsed is None or game.state()['screen'] != 'players' or game.team != target:
+                failures += 1
+            else:
+                timings.append(elapsed)
+                presses.append(pressed)
+            dropped += lost
+        report("select_team", timings, presses, failures, dropped)
+
+        timings, presses, failures, dropped = [], [], 0, 0
+        with tempfile.TemporaryDirectory() as output_dir:
+            assets = AssetWriter()
+            recorder = TeamRecorder(obs, assets, clip_length=args.clip_length)
+            for run_index in range(args.team_runs):
+                league_index = game.leagues.index(rng.choice(leagues))
+                game.reset('players', league_index=league_index, team_index=rng.randrange(len(game.teams[game.leagues[league_index]])))
+                team_folder = Path(output_dir) / f"team{run_index}"
+                team_folder.mkdir()
+                elapsed, pressed, lost = await timed_run(
+                    game, capture_team(obs, runner, macros, game.team, run_index, team_folder, assets, recorder, navigator=navigator),
+                    args.timeout * 23)
+                if elapsed is None or len(game.captured_players) != game.players_per_team:
+                    failures += 1
+                else:
+                    timings.append(elapsed)
+                    presses.append(pressed)
+                dropped += lost
+            assets.close()
+        report("capture_team", timings, presses, failures, dropped)
+        if navigator is not None:
+            print(f"{'menu graph':14} presses {navigator.presses}  re-plans {navigator.replans}")
+    finally:
+        obs.stop_capture()
+        ocr.stop()
+        if args.trace:
+            TRACER.log_summary()
+            TRACER.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Time league/team selection and a full team capture against the menu simulator.")
+    parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
+    parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--runs", type=int, default=20, help="League and team selections to time.")
+    parser.add_argument("--team-runs", type=int, default=1, help="Full team captures to time.")
+    parser.add_argument("--clip-length", type=float, default=0.5, help="Motion clip length used for the team captures.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a selection counts as failed.")
+    parser.add_argument("--press-gap", type=float, default=None, help="Override navigation.press_gap.")
+    parser.add_argument("--timeline-scale", type=float, default=None, help="Override timeline.scale (gaps and waits of the menu macros).")
+    parser.add_argument("--poll-scale", type=float, default=0.5, help="Size of the polling frames relative to the canvas (capture.poll_scale).")
+    parser.add_argument("--reaction-time", type=float, default=0.03)
+    parser.add_argument("--scroll-time", type=float, default=0.08)
+    parser.add_argument("--screen-time", type=float, default=0.4)
+    parser.add_argument("--min-press-gap", type=float, default=0.0, help="Simulated game drops presses sent faster than this.")
+    parser.add_argument("--slow-runs", type=int, default=None, help="Only drop presses during the league selections and the first N team selections.")
+    parser.add_argument("--no-list-wrap", action='store_true', help="Simulated lists stop at their ends although navigation.wrap says they wrap.")
+    parser.add_argument("--menu-graph", action='store_true', help="Capture teams with the menu navigator instead of the player macros.")
+    parser.add_argument("--menu-cursor-persists", action='store_true', help="Simulated player menu keeps its cursor between players.")
+    parser.add_argument("--menu-model-cursor", choices=['keep', 'reset'], help="Cursor behaviour the menu model assumes, if not the simulator's.")
+    parser.add_argument("--ocr-latency", type=float, default=0.03, help="Simulated OCR inference time per read.")
+    parser.add_argument("--ocr-error-rate", type=float, default=0.0)
+    parser.add_argument("--templates", action='store_true', help="Use the OCR template recognizer as the bot does.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", help="Write a timing trace (JSON lines) of the bot's spans to this file and log their summary.")
+    parser.add_argument("-v", "--verbose", action='store_true', help="Show the bot's log output.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    if args.trace:
+        configure_timing(trace_path=args.trace)
+        logging.getLogger('timing').setLevel(logging.INFO)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+
+from obs_async import AsyncOBSConnection, OBSRequestError
+from obs_mock import MockOBSServer
+from screen_capture import OBSClient
+
+# Light and heavy requests mixed, so the mock answers them out of order.
+LATENCY_BY_REQUEST = {'GetVersion': 0.01, 'GetCurrentProgramScene': 0.03, 'GetRecordDirectory': 0.05}
+
+def check(results, name, ok, detail):
+    results.append(ok)
+    print(f"{name:22} {'ok  ' if ok else 'FAIL'}  {detail}")
+
+async def check_pipelining(results, port, requests):
+    # The same requests awaited one after another and all in flight at once;
+    # every response has to come back to the request that asked for it.
+    connection = AsyncOBSConnection(port=port)
+    await connection.connect()
+    try:
+        request_types = [list(LATENCY_BY_REQUEST)[i % len(LATENCY_BY_REQUEST)] for i in range(requests)]
+        started = time.perf_counter()
+        for request_type in request_types:
+            await connection.call(request_type)
+        sequential = time.perf_counter() - started
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(connection.call(request_type) for request_type in request_types))
+        pipelined = time.perf_counter() - started
+    finally:
+        await connection.disconnect()
+    fields = {'GetVersion': 'obsVersion', 'GetCurrentProgramScene': 'currentProgramSceneName', 'GetRecordDirectory': 'recordDirectory'}
+    matched = sum(1 for request_type, response in zip(request_types, responses) if fields[request_type] in response)
+    check(results, "pipelined requests", matched == requests,
+          f"{requests} requests: sequential {sequential * 1000:6.1f} ms, pipelined {pipelined * 1000:6.1f} ms "
+          f"({sequential / pipelined:4.1f}x), {matched}/{requests} responses matched")
+
+async def check_authentication(results, port, password):
+    connection = AsyncOBSConnection(port=port, password=password)
+    await connection.connect()
+    version = await connection.call('GetVersion')
+    await connection.disconnect()
+    check(results, "authentication", version.get('rpcVersion') == 1, "right password accepted")
+
+    connection = AsyncOBSConnection(port=port, password=password + 'x')
+    try:
+        await connection.connect()
+    except ConnectionError as e:
+        check(results, "authentication failure", True, f"wrong password refused: {e}")
+    else:
+        await connection.disconnect()
+        check(results, "authentication failure", False, "wrong password accepted")
+
+async def check_stop_record(results, server, finalize_delay):
+    # begin_stop_record returns on the STOPPING event; the StopRecord response
+    # only comes once the mock has finalized the file.
+    obs = OBSClient(port=server.port)
+    stopped = []
+
+    def on_record_state(data):
+        if data.get('outputState') == 'OBS_WEBSOCKET_OUTPUT_STOPPED':
+            stopped.append(data)
+
+    obs.aio.subscribe('RecordStateChanged', on_record_state)
+    await obs.connect_async()
+    try:
+        await obs.request('StartRecord')
+        started = time.perf_counter()
+        stop_task = await obs.begin_stop_record()
+        returned = time.perf_counter() - started
+        response = await stop_task
+        finalized = time.perf_counter() - started
+        try:
+            await obs.request('StopRecord')
+            refused = False
+        except OBSRequestError:
+            refused = True
+    finally:
+        await obs.disconnect_async()
+    same_path = bool(stopped) and stopped[-1].get('outputPath') == response.get('outputPath')
+    check(results, "StopRecord event", returned < finalize_delay / 2 and same_path,
+          f"returned after {returned * 1000:6.1f} ms, file finalized after {finalized * 1000:6.1f} ms, "
+          f"STOPPED event {'has' if same_path else 'lacks'} the response's outputPath")
+    check(results, "StopRecord when idle", refused, "refused with OBSRequestError" if refused else "accepted")
+
+async def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as record_directory:
+        async with MockOBSServer(port=0, latency_by_request=LATENCY_BY_REQUEST, record_finalize_delay=args.finalize_delay) as server:
+            server.record_directory = record_directory
+            await check_pipelining(results, server.port, args.requests)
+            await check_stop_record(results, server, args.finalize_delay)
+        async with MockOBSServer(port=0, password=args.password) as server:
+            await check_authentication(results, server.port, args.password)
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the asyncio OBS client against obs_mock.py: pipelined requests, "
+                                                 "authentication and the StopRecord events.")
+    parser.add_argument("--requests", type=int, default=60, help="Requests sent one by one and then all at once.")
+    parser.add_argument("--finalize-delay", type=float, default=0.5, help="Seconds the mock takes to finalize a recording.")
+    parser.add_argument("--password", default="benchmark")
+    args = parser.parse_args()
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
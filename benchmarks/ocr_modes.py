@@ -0,0 +1,61 @@
+import argparse
+import logging
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import easyocr
+
+from benchmarks import percentile
+from helpers import load_configs
+from ocr import build_allowlist, run_ocr_in_region
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call latency of the OCR detect and recognize modes.")
+    parser.add_argument("images", nargs='+', help="Screenshots (or folders of screenshots) captured from the game.")
+    parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
+    parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--runs", type=int, default=5, help="Recognitions per crop and mode.")
+    parser.add_argument("--no-allowlist", action='store_true', help="Do not restrict characters to the teams list.")
+    args = parser.parse_args()
+
+    config, catalog, ocr_regions = load_configs(args.list, args.version)
+    allowlist = None
+    if not args.no_allowlist:
+        allowlist = build_allowlist(catalog.names())
+
+    paths = []
+    for image in args.images:
+        path = Path(image)
+        paths.extend(sorted(path.glob('*.png')) if path.is_dir() else [path])
+    frames = [frame for frame in (cv2.imread(str(p)) for p in paths) if frame is not None]
+    if not frames:
+        logging.error("No readable images given.")
+        return
+    logging.info(f"Benchmarking {len(frames)} frames x {len(ocr_regions)} regions x {args.runs} runs.")
+
+    reader = easyocr.Reader(['en'])
+    for region_name, (x1, y1, x2, y2) in ocr_regions.items():
+        preprocess = region_name in ['p1_team_select_text']
+        timings = {}
+        texts = {}
+        for mode in ('detect', 'recognize'):
+            timings[mode] = []
+            texts[mode] = []
+            for frame in frames:
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    text = run_ocr_in_region(frame, x1, y1, x2, y2, reader, preprocess=preprocess, allowlist=allowlist, mode=mode)
+                    timings[mode].append(time.perf_counter() - started)
+                texts[mode].append(text)
+        for mode, values in timings.items():
+            print(f"{region_name:24} {mode:10} mean {statistics.mean(values) * 1000:8.1f} ms  "
+                  f"p50 {percentile(values, 50) * 1000:8.1f} ms  p95 {percentile(values, 95) * 1000:8.1f} ms")
+        agreement = sum(a.lower() == b.lower() for a, b in zip(texts['detect'], texts['recognize']))
+        print(f"{region_name:24} modes agree on {agreement}/{len(frames)} frames")
+
+if __name__ == "__main__":
+    main()
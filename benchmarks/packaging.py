@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from packager import TeamPackager
+
+# Assets of one player: the main view screenshot and the motion clip.
+PLAYER_FILES = ("{player:02d} - 0 - mainview.png", "{player:02d} - 2 - motion.mp4")
+
+def make_teams(root, teams, players, screenshot_size, clip_size, duplicates):
+    # Random bytes stand in for PNGs and videos, which do not compress either.
+    total = 0
+    for team in range(teams):
+        folder = os.path.join(root, f"Team {team + 1:03d}")
+        os.makedirs(folder)
+        for player in range(players):
+            for pattern, size in zip(PLAYER_FILES, (screenshot_size, clip_size)):
+                with open(os.path.join(folder, f"T{team:03d}" + pattern.format(player=player + 1)), 'wb') as f:
+                    f.write(os.urandom(size))
+                total += size
+        # A few players captured twice, as after a wrong menu cursor.
+        for player in range(min(duplicates, players - 1)):
+            source = os.path.join(folder, f"T{team:03d}" + PLAYER_FILES[0].format(player=player + 1))
+            shutil.copyfile(source, os.path.join(folder, f"T{team:03d}" + PLAYER_FILES[0].format(player=players - player)))
+    return total
+
+def folders(root):
+    return [entry.path for entry in sorted(os.scandir(root), key=lambda entry: entry.name) if entry.is_dir()]
+
+def time_make_archive(root, output_dir):
+    # Zipping every team folder by hand, with deflate.
+    started = time.perf_counter()
+    for folder in folders(root):
+        shutil.make_archive(os.path.join(output_dir, os.path.basename(folder)), 'zip', folder)
+    return time.perf_counter() - started, 0.0
+
+async def time_packager(root, output_dir, archive_format, dedupe, capture_time):
+    # Teams are submitted `capture_time` apart, as the bot finishes them; the
+    # wait left at the end is what packaging adds to the run.
+    packager = TeamPackager(output_dir=output_dir, archive_format=archive_format, dedupe=dedupe)
+    try:
+        started = time.perf_counter()
+        for folder in folders(root):
+            packager.submit_team(folder)
+            await asyncio.sleep(capture_time)
+        captured = time.perf_counter()
+        await packager.finish()
+        finished = time.perf_counter()
+    finally:
+        packager.close()
+    return finished - started, finished - captured
+
+def archive_size(output_dir):
+    return sum(entry.stat().st_size for entry in os.scandir(output_dir) if entry.name.endswith(('.zip', '.tar')))
+
+async def run(args):
+    with tempfile.TemporaryDirectory(dir=args.dir) as work:
+        root = os.path.join(work, 'screenshots')
+        total = make_teams(root, args.teams, args.players, int(args.screenshot_mb * 1e6), int(args.clip_mb * 1e6), args.duplicates)
+        print(f"{args.teams} teams, {args.teams * args.players * 2} files, {total / 1e6:.0f} MB")
+        modes = [('make_archive', None)] + [(f"{archive_format}{' dedupe' if dedupe else ''}", (archive_format, dedupe))
+                                            for archive_format in ('zip', 'tar') for dedupe in (False, True)]
+        for name, mode in modes:
+            output_dir = os.path.join(work, name.replace(' ', '_'))
+            os.makedirs(output_dir)
+            if mode is None:
+                elapsed, tail = time_make_archive(root, output_dir)
+            else:
+                elapsed, tail = await time_packager(root, output_dir, *mode, args.capture_time if args.overlap else 0.0)
+            if args.overlap and mode is not None:
+                # The elapsed time is mostly the simulated captures.
+                speed = f"wait after last team {tail:5.2f} s"
+            else:
+                speed = f"{elapsed:7.2f} s  {total / 1e6 / elapsed:7.1f} MB/s"
+            print(f"{name:14} {speed}  archives {archive_size(output_dir) / 1e6:7.1f} MB")
+            shutil.rmtree(output_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time packaging team folders into archives against zipping them by hand.")
+    parser.add_argument("--teams", type=int, default=8)
+    parser.add_argument("--players", type=int, default=23)
+    parser.add_argument("--screenshot-mb", type=float, default=1.5, help="Size of each synthetic screenshot.")
+    parser.add_argument("--clip-mb", type=float, default=4.0, help="Size of each synthetic motion clip.")
+    parser.add_argument("--duplicates", type=int, default=1, help="Screenshots per team that repeat another one.")
+    parser.add_argument("--overlap", action='store_true', help="Submit teams --capture-time apart, as during a run.")
+    parser.add_argument("--capture-time", type=float, default=2.0, help="Seconds between finished teams with --overlap.")
+    parser.add_argument("--dir", help="Where to write the test files (default: the system temp folder).")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from recording import split_clips
+
+def write_video(path, frames, fps, size, fourcc):
+    # Each frame carries its index in the pixel values, so the clips can be
+    # checked for where they were cut.
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        raise IOError(f"Could not write {path} with fourcc '{fourcc}'")
+    for index in range(frames):
+        writer.write(np.full((size[1], size[0], 3), index % 256, dtype=np.uint8))
+    writer.release()
+
+def expected_frames(start, end, frames, fps):
+    return sum(1 for index in range(frames) if start <= index / fps < end)
+
+def read_frames(path):
+    capture = cv2.VideoCapture(path)
+    count = 0
+    while capture.read()[0]:
+        count += 1
+    capture.release()
+    return count
+
+def check_split(root, args, windows, label):
+    source = os.path.join(root, f"{label}.mp4")
+    write_video(source, args.frames, args.fps, tuple(args.size), args.fourcc)
+    clips = [(os.path.join(root, f"{label} clip {number}.mp4"), start, end) for number, (start, end) in enumerate(windows)]
+    started = time.perf_counter()
+    results = split_clips(source, clips, args.fourcc, remove_source=True)
+    elapsed = time.perf_counter() - started
+    failures = []
+    for (output_path, start, end), (_, written) in zip(clips, results):
+        expected = expected_frames(start, end, args.frames, args.fps)
+        if written != expected:
+            failures.append(f"{os.path.basename(output_path)}: {written} frames written, expected {expected}")
+        elif written and read_frames(output_path) != written:
+            failures.append(f"{os.path.basename(output_path)}: {read_frames(output_path)} frames in the file, {written} written")
+    # The source may only go once every clip has frames.
+    keep_source = any(written == 0 for _, written in results)
+    if os.path.exists(source) != keep_source:
+        failures.append(f"source {'deleted' if keep_source else 'kept'} with {sum(written == 0 for _, written in results)} empty clips")
+    print(f"{label:10} {len(clips)} clips  {sum(written for _, written in results):5} frames  {elapsed * 1000:7.1f} ms  "
+          f"{'ok' if not failures else 'FAILED'}")
+    for failure in failures:
+        print(f"    {failure}")
+    return not failures
+
+def run(args):
+    duration = args.frames / args.fps
+    step = duration / (args.clips + 1)
+    windows = [(step * (number + 0.5), step * (number + 0.5) + args.clip_length) for number in range(args.clips)]
+    with tempfile.TemporaryDirectory() as root:
+        ok = check_split(root, args, windows, 'inside')
+        # A window past the end of the recording, as after a late StartRecord.
+        ok = check_split(root, args, windows + [(duration + 1.0, duration + 1.0 + args.clip_length)], 'outside') and ok
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a synthetic recording with split_clips and check the frames of every clip.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames in the synthetic recording.")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--size", type=int, nargs=2, default=[320, 180], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument("--clips", type=int, default=4, help="Windows to cut out of the recording.")
+    parser.add_argument("--clip-length", type=float, default=1.0)
+    parser.add_argument("--fourcc", default='mp4v')
+    args = parser.parse_args()
+    if not run(args):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+
+import yaml
+
+from helpers import DPAD_BUTTONS, clean_team_text, NameIndex, press_key
+from ocr import StaleOCRRequest
+from timeline import compile_macro
+from timing import percentile, span
+
+logger = logging.getLogger(__name__)
+
+def profile_path(version, directory='profiles'):
+    # Profiles are per game version and per machine: capture rigs differ in how
+    # fast the game reacts to inputs.
+    return os.path.join(directory, f"{version}-{socket.gethostname()}.yaml")
+
+def apply_profile(config, version):
+    # Merges the calibrated timings for this machine, if any, over config.yaml.
+    path = profile_path(version, config.get('calibration', {}).get('profile_dir', 'profiles'))
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        profile = yaml.safe_load(f) or {}
+    for section in ('navigation', 'timeline'):
+        if profile.get(section):
+            config[section] = {**config.get(section, {}), **profile[section]}
+    # Measured gaps of single macro steps, by macro name and step index. Only
+    # press steps take one, so a macro edited since the calibration keeps its
+    # own gaps where the steps moved.
+    measured_steps = 0
+    macros = config.get('macros') or {}
+    for name, gaps in (profile.get('macros') or {}).items():
+        if not macros.get(name):
+            continue
+        steps = list(macros[name])
+        for index, gap in gaps.items():
+            if index < len(steps) and isinstance(steps[index], dict) and 'press' in steps[index]:
+                steps[index] = {**steps[index], 'gap': gap}
+                measured_steps += 1
+        macros[name] = steps
+    logger.info(f"Loaded timing profile {path}: press_gap {config['navigation'].get('press_gap')}s, "
+                f"press_time {config['navigation'].get('press_time')}s, {measured_steps} measured macro step gaps.")
+    return path
+
+def save_profile(path, profile):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write("# Written by main.py --calibrate. Delete this file to go back to the config.yaml timings.\n")
+        yaml.safe_dump(profile, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+async def measure_reaction(obs, gamepad, region, press_time, samples, threshold, timeout=2.0, press=None, settle_time=None):
+    # Time from a DPAD press to the first captured frame in which the list box
+    # changed. Frame timestamps are taken when the screenshot arrives, so this
+    # includes the OBS screenshot latency and is accurate to one capture interval.
+    # `press` replaces the DPAD press with another input (a coroutine function).
+    # With `settle_time`, the time runs to the last change before the region
+    # stayed still that long, i.e. to the end of the transition the input started.
+    reactions = []
+    direction = 'DOWN'
+    label = 'the input' if press is not None else None
+    for _ in range(samples):
+        reference = await obs.wait_for_stable(region=region, timeout=1.0, stable_time=0.1)
+        latest = obs.latest()
+        seq = latest.seq if latest is not None else 0
+        pressed = time.monotonic()
+        if press is None:
+            label = direction
+            pressing = asyncio.ensure_future(press_key(gamepad, DPAD_BUTTONS[direction], press_time))
+        else:
+            pressing = asyncio.ensure_future(press())
+        reacted = None
+        previous = None
+        settled = False
+        while not settled and time.monotonic() < pressed + timeout:
+            captured = await obs.frame_after(seq, timeout=timeout)
+            if captured is None:
+                break
+            seq = captured.seq
+            if previous is None:
+                if obs.region_difference(captured.image, reference, region) > threshold:
+                    reacted = captured.timestamp - pressed
+                    previous = captured
+                    settled = settle_time is None
+                continue
+            if obs.region_difference(captured.image, previous.image, region) > threshold:
+                reacted = captured.timestamp - pressed
+            previous = captured
+            settled = captured.timestamp - pressed - reacted >= settle_time
+        await pressing
+        if reacted is None:
+            logger.warning(f"Calibration: no reaction to {label} within {timeout}s.")
+        elif not settled:
+            logger.warning(f"Calibration: the screen was still changing {timeout}s after {label}.")
+        else:
+            reactions.append(reacted)
+        # Alternate so lists without wrap-around never hit their ends.
+        direction = 'UP' if direction == 'DOWN' else 'DOWN'
+    return reactions
+
+class BurstTester:
+    # Presses bursts of DPAD presses on the team list with given timings and
+    # checks with OCR that the highlighted team moved by exactly the burst length.
+    def __init__(self, obs, gamepad, ocr, region_name, ocr_regions, config, options, recognizer=None, settle_timeout=1.0):
+        self.obs = obs
+        self.gamepad = gamepad
+        self.ocr = ocr
+        self.region_name = region_name
+        self.region = ocr_regions[region_name]
+        self.ocr_regions = ocr_regions
+        self.config = config
+        self.options = options if isinstance(options, NameIndex) else NameIndex(options)
+        self.recognizer = recognizer
+        self.settle_timeout = settle_timeout
+        self.wrap = config.get('navigation', {}).get('wrap', False)
+        self.bursts = 0
+
+    async def read_index(self, frame=None):
+        for _ in range(3):
+            if frame is None:
+                frame = await self.obs.wait_for_stable(region=self.region, timeout=1.0, stable_time=0.1)
+            try:
+                current, text = await self.ocr.read_name(frame, self.region_name, self.ocr_regions, self.config, self.options, self.recognizer,
+                                                         clean_text=lambda text: clean_team_text(text, self.config))
+            except StaleOCRRequest:
+                current = None
+            position = self.options.find(current) if current is not None else None
+            if position is not None:
+                return position, frame
+            frame = None
+        return None, None
+
+    async def burst(self, count, press_time, press_gap):
+        index, frame = await self.read_index()
+        if index is None:
+            logger.warning("Calibration: could not read the highlighted team.")
+            return False
+        direction = 'DOWN'
+        if not self.wrap and index + count >= len(self.options):
+            direction = 'UP'
+        self.bursts += 1
+        with span('calibration.burst', count=count, press_time=press_time, press_gap=press_gap):
+            for _ in range(count):
+                await press_key(self.gamepad, DPAD_BUTTONS[direction], press_time, press_gap)
+        settled = await self.obs.wait_for_transition(region=self.region, change_timeout=0.5, settle_timeout=self.settle_timeout,
+                                                     stable_time=0.15, reference=frame)
+        landed, _ = await self.read_index(settled)
+        if landed is None:
+            logger.warning("Calibration: could not read the highlighted team after a burst.")
+            return False
+        moved = landed - index if direction == 'DOWN' else index - landed
+        if self.wrap:
+            moved %= len(self.options)
+        if moved != count:
+            logger.info(f"Calibration: {count} presses at {press_time:.3f}s/{press_gap:.3f}s moved {moved}.")
+        return moved == count
+
+    async def passes(self, count, press_time, press_gap, trials):
+        # A timing only passes if no trial dropped a single press.
+        for _ in range(trials):
+            if not await self.burst(count, press_time, press_gap):
+                return False
+        return True
+
+async def search_minimum(low, high, passes_at, resolution, limit):
+    # Binary search for the smallest value that still passes. If `high` itself
+    # fails it is doubled (up to `limit`) until one passes.
+    while not await passes_at(high):
+        if high >= limit:
+            logger.error(f"Calibration: still dropping presses at {high:.3f}s.")
+            return None
+        low, high = high, min(max(high * 2, resolution), limit)
+    while high - low > resolution:
+        middle = (low + high) / 2
+        if await passes_at(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+async def calibrate(obs, gamepad, ocr, ocr_regions, config, options, version, recognizer=None):
+    # Runs on the team list of a league with enough teams. Returns the profile.
+    calibration_config = config.get('calibration', {})
+    navigation = config.get('navigation', {})
+    region_name = 'p1_team_select_text'
+    region = ocr_regions[region_name]
+    trials = calibration_config.get('trials', 3)
+    count = min(calibration_config.get('burst', 8), len(options) - 1)
+    resolution = calibration_config.get('resolution', 0.01)
+    margin = calibration_config.get('margin', 0.02)
+    if count < 2:
+        raise ValueError("Calibration needs a league with at least 3 teams.")
+    if not obs.capturing:
+        obs.start_capture()
+
+    logger.info("Calibration: measuring how fast the game reacts to inputs...")
+    reactions = await measure_reaction(obs, gamepad, region, navigation.get('press_time', 0.2),
+                                       calibration_config.get('reaction_samples', 10), calibration_config.get('change_threshold', 3.0))
+    if not reactions:
+        raise RuntimeError("The game did not react to any input; is the team list on screen?")
+    reaction_p95 = percentile(reactions, 95)
+    logger.info(f"Calibration: reaction p50 {percentile(reactions, 50) * 1000:.0f}ms, p95 {reaction_p95 * 1000:.0f}ms "
+                f"over {len(reactions)} presses.")
+
+    tester = BurstTester(obs, gamepad, ocr, region_name, ocr_regions, config, options, recognizer,
+                         settle_timeout=max(1.0, reaction_p95 * 4))
+    default_time = navigation.get('press_time', 0.2)
+    default_gap = navigation.get('press_gap', 0.1)
+
+    logger.info(f"Calibration: searching the shortest gap between presses ({count}-press bursts, {trials} trials each)...")
+    press_gap = await search_minimum(calibration_config.get('min_press_gap', 0.0), default_gap,
+                                     lambda gap: tester.passes(count, default_time, gap, trials),
+                                     resolution, calibration_config.get('max_press_gap', 0.4))
+    if press_gap is None:
+        raise RuntimeError("No press gap up to calibration.max_press_gap avoided dropped inputs.")
+    press_gap = round(press_gap + margin, 3)
+
+    logger.info(f"Calibration: press gap {press_gap:.3f}s; searching the shortest press...")
+    press_time = await search_minimum(calibration_config.get('min_press_time', 0.04), default_time,
+                                      lambda hold: tester.passes(count, hold, press_gap, trials),
+                                      resolution, calibration_config.get('max_press_time', 0.4))
+    if press_time is None:
+        raise RuntimeError("No press time up to calibration.max_press_time registered reliably.")
+    press_time = round(press_time + margin, 3)
+
+    logger.info(f"Calibration: press_time {press_time:.3f}s, press_gap {press_gap:.3f}s ({tester.bursts} bursts).")
+    return {
+        'calibrated': datetime.now().isoformat(timespec='seconds'),
+        'machine': socket.gethostname(),
+        'measured': {
+            'bursts': tester.bursts,
+            'reaction_max': round(max(reactions), 4),
+            'reaction_p50': round(percentile(reactions, 50), 4),
+            'reaction_p95': round(reaction_p95, 4),
+        },
+        'navigation': {'press_gap': press_gap, 'press_time': press_time},
+        'version': version,
+    }
+
+async def drive_macro(obs, runner, name, macros, config, reactions):
+    # Plays macro `name` one step at a time. Every press is timed until the
+    # screen settles (see measure_reaction); `reactions` counts its presses and
+    # collects its reactions under (macro, step index) of the macro that defines it.
+    # The other steps are played as they are.
+    calibration_config = config.get('calibration', {})
+    defaults = config.get('timeline', {})
+    for index, step in enumerate(macros[name] or []):
+        if isinstance(step, dict) and 'macro' in step:
+            await drive_macro(obs, runner, step['macro'], macros, config, reactions)
+        elif isinstance(step, dict) and 'press' in step:
+            single = compile_macro('press', {'press': [{'press': step['press'], 'hold': step.get('hold', defaults.get('hold', 0.2)), 'gap': 0.0}]})
+            measured = await measure_reaction(obs, None, None, None, step.get('repeat', 1), calibration_config.get('change_threshold', 3.0),
+                                              timeout=calibration_config.get('step_timeout', 4.0), press=lambda: runner.run_segments(single),
+                                              settle_time=calibration_config.get('settle_time', 0.3))
+            timed = reactions.setdefault((name, index), [0, []])
+            timed[0] += step.get('repeat', 1)
+            timed[1].extend(measured)
+        else:
+            await runner.run_segments(compile_macro('step', {'step': [step]}, defaults))
+
+async def calibrate_macros(obs, runner, config):
+    # Runs on a team's player list. Plays the macros of calibration.macros
+    # (a player's capture cycle by default) for calibration.macro_cycles players
+    # and returns the gap of every press step that reacted each time it was
+    # pressed: the p95 time from the press to the settled screen, minus the hold,
+    # plus the margin. Steps that did not react every time keep their gaps.
+    calibration_config = config.get('calibration', {})
+    defaults = config.get('timeline', {})
+    macros = config.get('macros') or {}
+    names = calibration_config.get('macros', ['player_open', 'player_close'])
+    cycles = calibration_config.get('macro_cycles', 3)
+    margin = calibration_config.get('margin', 0.02)
+    min_gap = calibration_config.get('min_press_gap', 0.0)
+    if not obs.capturing:
+        obs.start_capture()
+    logger.info(f"Calibration: timing the steps of {', '.join(names)} on {cycles} players...")
+    reactions = {}
+    for _ in range(cycles):
+        for name in names:
+            if name in macros:
+                await drive_macro(obs, runner, name, macros, config, reactions)
+    gaps = {}
+    for (name, index), (presses, measured) in sorted(reactions.items()):
+        step = macros[name][index]
+        if len(measured) < presses:
+            logger.info(f"Calibration: {name} step {index} ({step['press']}) reacted to {len(measured)} of {presses} presses; gap left at "
+                        f"{step.get('gap', defaults.get('gap', 0.1))}s.")
+            continue
+        hold = step.get('hold', defaults.get('hold', 0.2))
+        gap = round(max(percentile(measured, 95) - hold, min_gap) + margin, 3)
+        logger.info(f"Calibration: {name} step {index} ({step['press']}) settles after {percentile(measured, 95) * 1000:.0f}ms (p95); "
+                    f"gap {step.get('gap', defaults.get('gap', 0.1))}s -> {gap}s.")
+        gaps.setdefault(name, {})[index] = gap
+    return gaps
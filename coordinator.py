@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import vgamepad as vg
+
+from asset_writer import AssetWriter
+from calibration import apply_profile
+from game_pads import Gamepad
+from game_watchdog import Watchdog
+from helpers import load_configs, plan_visits, press_key, select_league, select_team, SelectionState
+from main import capture_team
+from manifest import CaptureManifest
+from menu_graph import menu_model_from_config, MenuNavigator
+from ocr import configure_ocr_cache, load_easyocr_reader, ocr_languages, OCRService, TemplateRecognizer
+from packager import packager_from_config
+from qa import quality_checker_from_config
+from recording import ClipSplitter, TeamRecorder
+from screen_capture import capture_profiles, OBSClient
+from timeline import compile_macros, MacroError, TimelineRunner
+from timing import TRACER, configure_timing
+
+# One team to capture.
+Job = collections.namedtuple('Job', ['league', 'team_name', 'team_id'])
+
+def build_jobs(catalog, manifest=None, resume=False, navigation=None):
+    # Jobs follow the planned route, so each instance's contiguous block is a
+    # short walk down its part of the list.
+    navigation = navigation or {}
+    teams_map = {}
+    for league, teams in catalog.selectable.items():
+        remaining = [team_name for team_name in teams if not (resume and manifest is not None and manifest.team_complete(team_name))]
+        if remaining:
+            teams_map[league] = remaining
+    if teams_map and navigation.get('plan_route', True):
+        teams_map, planned_presses, list_presses = plan_visits(catalog, teams_map, navigation.get('wrap', False))
+        logging.info(f"Route: {planned_presses} DPAD presses planned for one instance ({list_presses} in list order).")
+    return [Job(league, team_name, catalog.team_id(team_name)) for league, teams in teams_map.items() for team_name in teams]
+
+class WorkQueue:
+    # Jobs are split into one contiguous run per worker, in list order, so each
+    # worker mostly stays in the same league. Workers take jobs from the front of
+    # their own deque; an idle worker steals the back half of the fullest deque,
+    # which also drains the jobs of workers that stopped. All workers run on one
+    # event loop, so no locking is needed.
+    def __init__(self, jobs, workers):
+        self.deques = []
+        start = 0
+        for index in range(workers):
+            end = start + (len(jobs) - start) // (workers - index)
+            self.deques.append(collections.deque(jobs[start:end]))
+            start = end
+        self.attempts = collections.Counter()
+        self.stolen = 0
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self.deques)
+
+    def take(self, worker):
+        own = self.deques[worker]
+        if not own:
+            victim = max(range(len(self.deques)), key=lambda index: len(self.deques[index]))
+            count = (len(self.deques[victim]) + 1) // 2
+            if not count:
+                return None
+            stolen = [self.deques[victim].pop() for _ in range(count)]
+            own.extend(reversed(stolen))
+            self.stolen += count
+            logging.info(f"Worker {worker} stole {count} teams from worker {victim}.")
+        job = own.popleft()
+        self.attempts[job] += 1
+        return job
+
+    def retry(self, worker, job, max_attempts):
+        # Puts a failed job back for another worker to steal. False once it has
+        # failed `max_attempts` times.
+        if self.attempts[job] >= max_attempts:
+            return False
+        self.deques[worker].appendleft(job)
+        return True
+
+class Instance:
+    # One game instance and everything that drives it: its OBS connection (and
+    # scene), virtual pad, macro runner, OCR channel, asset writer and recorder.
+    def __init__(self, name, obs, gamepad, runner, ocr, assets, recorder, watchdog=None, navigator=None):
+        self.name = name
+        self.obs = obs
+        self.gamepad = gamepad
+        self.runner = runner
+        self.ocr = ocr
+        self.assets = assets
+        self.recorder = recorder
+        self.navigator = navigator
+        self.watchdog = watchdog
+
+class Coordinator:
+    def __init__(self, instances, jobs, config, ocr_regions, catalog, macros, manifest=None,
+                 recognizer=None, resume=False, intro=True, max_attempts=2, output_dir='screenshots', quality=None, packager=None):
+        self.instances = instances
+        self.queue = WorkQueue(jobs, len(instances))
+        self.config = config
+        self.ocr_regions = ocr_regions
+        self.catalog = catalog
+        self.macros = macros
+        self.manifest = manifest
+        self.recognizer = recognizer
+        self.resume = resume
+        self.intro = intro
+        self.max_attempts = max_attempts
+        self.output_dir = output_dir
+        self.quality = quality
+        self.packager = packager
+        self.completed = collections.Counter()
+        self.failed = []
+
+    async def run(self):
+        started = time.monotonic()
+        await asyncio.gather(*(self._worker(index, instance) for index, instance in enumerate(self.instances)))
+        elapsed = time.monotonic() - started
+        done = sum(self.completed.values())
+        logging.info(f"Coordinator: {done} teams in {elapsed:.0f}s with {len(self.instances)} instances "
+                     f"({done / elapsed * 3600 if elapsed > 0 else 0.0:.1f} teams/hour), {self.queue.stolen} stolen, "
+                     f"{len(self.failed)} failed, {len(self.queue)} left.")
+        for instance in self.instances:
+            logging.info(f"  {instance.name}: {self.completed[instance.name]} teams")
+        return done
+
+    async def _worker(self, index, instance):
+        try:
+            if await self._work(index, instance):
+                await instance.runner.run('finalization', self.macros)
+        except asyncio.CancelledError:
+            if instance.watchdog is None or instance.watchdog.event is None:
+                raise
+            logging.error(f"{instance.name}: stopping: {instance.watchdog.event.message}")
+        finally:
+            if instance.watchdog is not None:
+                await instance.watchdog.stop()
+
+    async def _work(self, index, instance):
+        # Returns False if the instance had to stop; its jobs are left to the others.
+        state = SelectionState()
+        if self.intro:
+            await instance.runner.run('intro', self.macros)
+        # The shared OCR model loads during the intro; the watchdog starts once it
+        # has, as the menu stays still while the first read waits for it.
+        await instance.ocr.wait_ready()
+        if instance.watchdog is not None:
+            instance.watchdog.start(asyncio.current_task())
+        league = None
+        job = None
+        try:
+            while True:
+                job = self.queue.take(index)
+                if job is None:
+                    return True
+                if job.league != league:
+                    if league is not None and 'league_exit' in self.macros:
+                        await instance.runner.run('league_exit', self.macros)
+                    await select_league(instance.obs, instance.gamepad, instance.ocr, self.ocr_regions, self.config,
+                                        self.catalog.leagues, job.league, state, self.recognizer)
+                    league = job.league
+                await select_team(instance.obs, instance.gamepad, instance.ocr, self.ocr_regions, self.config,
+                                  self.catalog.league_teams(job.league), job.team_name, state, self.recognizer)
+                logging.info(f"{instance.name}: processing team {job.team_name}")
+                team_folder = Path(self.output_dir) / job.team_name.strip('/')
+                team_folder.mkdir(parents=True, exist_ok=True)
+                if instance.watchdog is not None:
+                    instance.watchdog.reset_player_frames()
+                await capture_team(instance.obs, instance.runner, self.macros,
+                                   job.team_name, job.team_id, team_folder, instance.assets, instance.recorder,
+                                   instance.watchdog, self.manifest, self.resume, instance.navigator)
+                if self.recognizer is not None:
+                    self.recognizer.save()
+                if self.quality is not None:
+                    self.quality.submit_team(str(team_folder))
+                if self.packager is not None:
+                    self.packager.submit_team(str(team_folder), instance.recorder.split)
+                await press_key(instance.gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_B) # Back out to team select
+                self.completed[instance.name] += 1
+                job = None
+        except asyncio.CancelledError:
+            # The watchdog cancels this task on a frozen game, a dead process or
+            # an unreachable OBS; the team in progress goes to another instance.
+            if instance.watchdog is None or instance.watchdog.event is None:
+                raise
+            logging.error(f"{instance.name}: stopping{f' on team {job.team_name}' if job else ''}: {instance.watchdog.event.message}")
+            self._stop_instance(index, instance, job)
+            return False
+        except (Exception, SystemExit) as e:
+            # capture_team exits on a frozen game; here that only stops this instance.
+            logging.error(f"{instance.name}: stopping after an error{f' on team {job.team_name}' if job else ''}: {e!r}")
+            self._stop_instance(index, instance, job)
+            return False
+
+    def _stop_instance(self, index, instance, job):
+        # Lets go of any button, trigger or stick the interrupted macro was holding
+        # and hands the unfinished job back to the queue.
+        try:
+            instance.gamepad.reset()
+            instance.gamepad.update()
+        except Exception as e:
+            logging.warning(f"{instance.name}: could not release the gamepad: {e}")
+        if job is not None and not self.queue.retry(index, job, self.max_attempts):
+            logging.error(f"Team {job.team_name} failed {self.max_attempts} times, giving up on it.")
+            self.failed.append(job)
+
+def build_instances(config, ocr, manifest, splitter, menu=None):
+    # Instances from the coordinator section of config.yaml, each with its own
+    # OBS connection and virtual pad. Pads are created in the order listed, which
+    # is the order their game instances have to be bound to them.
+    obs_defaults = config.get('obs', {})
+    capture_config = config.get('capture', {})
+    assets_config = config.get('assets', {})
+    recording_config = config.get('recording', {})
+    watchdog_config = config.get('watchdog', {})
+    polling_profile, archival_profile = capture_profiles(capture_config)
+    instances = []
+    for number, instance_config in enumerate(config.get('coordinator', {}).get('instances') or []):
+        name = instance_config.get('name', f"instance{number + 1}")
+        obs_config = {**obs_defaults, **(instance_config.get('obs') or {})}
+        obs = OBSClient(
+            host=obs_config.get('host', 'localhost'),
+            port=obs_config.get('port', 4455),
+            password=obs_config.get('password', ''),
+            buffer_size=capture_config.get('buffer_size', 4),
+            capture_interval=capture_config.get('interval', 0.05),
+            polling=polling_profile,
+            archival=archival_profile
+        )
+        if instance_config.get('scene'):
+            obs.capture_scene_name = instance_config['scene']
+        if number:
+            time.sleep(0.5) # Give ViGEmBus time to register the previous pad.
+        gamepad = vg.VX360Gamepad()
+        logging.info(f"{name}: virtual gamepad {number + 1} created, OBS at {obs_config.get('host', 'localhost')}:{obs_config.get('port', 4455)}.")
+        assets = AssetWriter(
+            image_format=assets_config.get('format', 'png'),
+            png_compression=assets_config.get('png_compression', 1),
+            webp_quality=assets_config.get('webp_quality', 101),
+            max_pending=assets_config.get('max_pending', 8),
+            workers=assets_config.get('workers', 2)
+        )
+        recorder = TeamRecorder(
+            obs,
+            assets,
+            mode=recording_config.get('mode', 'per_player'),
+            clip_length=recording_config.get('clip_length', 3.0),
+            splitter=splitter,
+            keep_source=recording_config.get('keep_source', False),
+            start_offset=recording_config.get('start_offset', 0.0),
+            manifest=manifest
+        )
+        watchdog = Watchdog(
+            obs,
+            process_name=instance_config.get('process_name'),
+            interval=watchdog_config.get('interval', 1.0),
+            freeze_timeout=watchdog_config.get('freeze_timeout', 8.0),
+            obs_timeout=watchdog_config.get('obs_timeout', 5.0)
+        )
+        runner = TimelineRunner(Gamepad(gamepad), settle=obs.wait_for_transition, stable=obs.wait_for_stable)
+        navigator = MenuNavigator(menu, runner, obs) if menu is not None else None
+        instances.append(Instance(name, obs, gamepad, runner, ocr.channel(name), assets, recorder, watchdog, navigator))
+    return instances
+
+async def main():
+    parser = argparse.ArgumentParser(description="Capture a teams list with several game instances at once.")
+    parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
+    parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--resume", action="store_true", help="Skip teams and players already captured according to screenshots/manifest.json.")
+    parser.add_argument("--verify-hashes", action="store_true", help="With --resume, check the SHA-256 of every captured file instead of only its size.")
+    args = parser.parse_args()
+
+    instances = []
+    OCR = None
+    SPLITTER = None
+    QA = None
+    PACKAGER = None
+    MANIFEST = None
+    try:
+        CONFIG, CATALOG, OCR_REGIONS = load_configs(args.list, args.version)
+        apply_profile(CONFIG, args.version)
+        if not CONFIG.get('coordinator', {}).get('instances'):
+            logging.error("No instances configured under coordinator.instances in config.yaml.")
+            sys.exit(1)
+
+        timing_config = CONFIG.get('timing', {})
+        trace_path = None
+        if timing_config.get('trace', True):
+            trace_path = os.path.join(timing_config.get('trace_dir', 'traces'), f"{datetime.now():%Y%m%d-%H%M%S}-{args.version}-coordinator.jsonl")
+        configure_timing(timing_config.get('enabled', True), trace_path)
+
+        try:
+            MACROS = compile_macros(CONFIG['macros'], CONFIG.get('timeline'))
+            MENU = menu_model_from_config(CONFIG)
+        except MacroError as e:
+            logging.error(f"Invalid input macros or menu model in config.yaml: {e}")
+            sys.exit(1)
+
+        # One OCR reader is shared by all instances; each reads on its own channels.
+        ocr_config = CONFIG.setdefault('ocr', {})
+        MANIFEST = CaptureManifest(os.path.join('screenshots', 'manifest.json'))
+        if args.resume:
+            MANIFEST.verify(deep=args.verify_hashes)
+        jobs = build_jobs(CATALOG, MANIFEST, args.resume, CONFIG.get('navigation'))
+        ocr_langs = ocr_config.get('languages') or ocr_languages(CATALOG.names())
+        OCR = OCRService(reader_factory=lambda: load_easyocr_reader(ocr_langs, warmup=ocr_config.get('warmup', True)))
+        OCR.start()
+        configure_ocr_cache(ocr_config.get('cache_size', 64))
+        RECOGNIZER = None
+        if ocr_config.get('templates', True):
+            RECOGNIZER = TemplateRecognizer(
+                path=os.path.join(ocr_config.get('templates_dir', 'ocr_templates'), f"{args.version}.npz"),
+                threshold=ocr_config.get('template_threshold', 0.9)
+            )
+
+        recording_config = CONFIG.get('recording', {})
+        if recording_config.get('mode', 'per_player') == 'per_team' and recording_config.get('split', True):
+            SPLITTER = ClipSplitter(workers=recording_config.get('split_workers', 2), fourcc=recording_config.get('fourcc', 'mp4v'))
+
+        QA = quality_checker_from_config(CONFIG)
+        PACKAGER = packager_from_config(CONFIG)
+        instances = build_instances(CONFIG, OCR, MANIFEST, SPLITTER, MENU)
+        for instance in instances:
+            instance.obs.connect()
+            if not instance.obs.ws:
+                logging.error(f"{instance.name}: failed to connect to OBS.")
+                sys.exit(1)
+            await instance.obs.connect_async()
+            if CONFIG.get('capture', {}).get('background', True):
+                instance.obs.start_capture()
+            if instance.watchdog.process_name and not instance.watchdog.resolve_process():
+                logging.error(f"{instance.name}: game process '{instance.watchdog.process_name}' not found. Exiting.")
+                sys.exit(1)
+        # All instances read the same (scaled) OCR regions, so their polling frames must match.
+        poll_scales = {instance.obs.poll_scale for instance in instances}
+        if len(poll_scales) > 1:
+            logging.error(f"The instances poll at different scales ({', '.join(map(str, sorted(poll_scales)))}); check the OBS canvas sizes.")
+            sys.exit(1)
+        OCR_REGIONS = instances[0].obs.scale_regions(OCR_REGIONS)
+        if instances[0].obs.poll_scale < 1.0:
+            # EasyOCR reads the names at canvas size again.
+            ocr_config['upscale'] = 1.0 / instances[0].obs.poll_scale
+
+        logging.info(f"Capturing {len(jobs)} teams with {len(instances)} instances.")
+        coordinator = Coordinator(instances, jobs, CONFIG, OCR_REGIONS, CATALOG, MACROS, MANIFEST, RECOGNIZER,
+                                  resume=args.resume, max_attempts=CONFIG.get('coordinator', {}).get('max_attempts', 2), quality=QA, packager=PACKAGER)
+        try:
+            await coordinator.run()
+        except RuntimeError as e:
+            # The shared OCR reader failed to load.
+            logging.error(str(e))
+            sys.exit(1)
+        if coordinator.failed:
+            logging.error(f"Not captured: {', '.join(job.team_name for job in coordinator.failed)}")
+    finally:
+        if OCR:
+            OCR.stop()
+        for instance in instances:
+            await instance.assets.flush()
+            instance.assets.close()
+        if SPLITTER:
+            logging.info("Waiting for motion clips to be split...")
+            await SPLITTER.wait()
+            SPLITTER.close()
+        if MANIFEST:
+            # Folds the assets recorded since the last team into manifest.json.
+            MANIFEST.save()
+        if QA:
+            await QA.finish()
+            QA.close()
+        if PACKAGER:
+            await PACKAGER.finish()
+            PACKAGER.close()
+        for instance in instances:
+            if instance.obs.aio.connected:
+                await instance.obs.disconnect_async()
+            if instance.obs.ws:
+                instance.obs.disconnect()
+        if TRACER.enabled:
+            TRACER.log_summary()
+            TRACER.close()
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.info("Script interrupted by user.")
@@ -5,8 +5,9 @@ import asyncio
 logger = logging.getLogger(__name__)
 
 class Gamepad:
-    def __init__(self):
-        self._pad = vg.VX360Gamepad()
+    def __init__(self, pad=None):
+        # Pass an existing VX360Gamepad to drive the same virtual controller from async code.
+        self._pad = pad if pad is not None else vg.VX360Gamepad()
         self._lock = asyncio.Lock()
 
     async def press_button(self, button):
@@ -27,12 +28,30 @@ class Gamepad:
             await asyncio.to_thread(self._pad.left_trigger, value=value)
             await asyncio.to_thread(self._pad.update)
 
+    async def left_trigger_float(self, value_float):
+        logger.debug(f"Gamepad: Setting left trigger to {value_float}")
+        async with self._lock:
+            await asyncio.to_thread(self._pad.left_trigger_float, value_float=value_float)
+            await asyncio.to_thread(self._pad.update)
+
+    async def right_trigger_float(self, value_float):
+        logger.debug(f"Gamepad: Setting right trigger to {value_float}")
+        async with self._lock:
+            await asyncio.to_thread(self._pad.right_trigger_float, value_float=value_float)
+            await asyncio.to_thread(self._pad.update)
+
     async def left_joystick_float(self, x_value_float, y_value_float):
         logger.debug(f"Gamepad: Setting left joystick to ({x_value_float}, {y_value_float})")
         async with self._lock:
             await asyncio.to_thread(self._pad.left_joystick_float, x_value_float=x_value_float, y_value_float=y_value_float)
             await asyncio.to_thread(self._pad.update)
 
+    async def right_joystick_float(self, x_value_float, y_value_float):
+        logger.debug(f"Gamepad: Setting right joystick to ({x_value_float}, {y_value_float})")
+        async with self._lock:
+            await asyncio.to_thread(self._pad.right_joystick_float, x_value_float=x_value_float, y_value_float=y_value_float)
+            await asyncio.to_thread(self._pad.update)
+
     async def release_all_buttons(self):
         logger.debug("Gamepad: Releasing all buttons and resetting joysticks/triggers.")
         async with self._lock:
@@ -0,0 +1,149 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+
+import cv2
+import numpy as np
+import psutil
+
+from helpers import find_process
+
+logger = logging.getLogger(__name__)
+
+PROCESS_GONE = 'process_gone'
+FROZEN = 'frozen'
+OBS_UNREACHABLE = 'obs_unreachable'
+
+WatchdogEvent = collections.namedtuple('WatchdogEvent', ['kind', 'message', 'timestamp'])
+
+class WatchdogError(Exception):
+    def __init__(self, event):
+        super().__init__(event.message)
+        self.event = event
+
+def frame_fingerprint(frame, size=(64, 36)):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+class Watchdog:
+    # Background liveness checks for the game and OBS. The game process is looked
+    # up once and then polled by PID; freezes are detected from a short history of
+    # tiny frame fingerprints taken from the OBS frame buffer. On the first problem
+    # the watched task is cancelled and the event is kept in `self.event`.
+    # Freeze detection can be paused around waits where the screen is expected
+    # to stay still. Without the background producer, the watchdog grabs a
+    # frame itself on every check.
+    def __init__(self, obs, process_name='PES20', interval=1.0, freeze_timeout=8.0, obs_timeout=5.0):
+        self.obs = obs
+        self.process_name = process_name
+        self.interval = interval
+        self.freeze_timeout = freeze_timeout
+        self.obs_timeout = obs_timeout
+        self.event = None
+        self._process = None
+        self._history = collections.deque(maxlen=16)
+        self._unchanged_since = None
+        self._last_seq = None
+        self._last_player_frame = None
+        self._paused = 0
+        self._task = None
+        self._watched = None
+
+    def resolve_process(self):
+        self._process = find_process(self.process_name)
+        if self._process is None:
+            return False
+        logger.info(f"Watching game process '{self._process.name()}' (PID {self._process.pid}).")
+        return True
+
+    def start(self, watched_task=None):
+        self._watched = watched_task
+        if not self.obs.capturing:
+            logger.info(f"Background capture is off; the watchdog grabs a frame from OBS every {self.interval}s.")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @contextlib.contextmanager
+    def paused(self):
+        # Suspends freeze detection (process and OBS checks keep running); the
+        # still screen of the wait does not count towards a freeze afterwards.
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+            self._unchanged_since = None
+
+    def _raise_event(self, kind, message):
+        self.event = WatchdogEvent(kind, message, time.monotonic())
+        logger.error(f"Watchdog: {message}")
+        if self._watched is not None and not self._watched.done():
+            self._watched.cancel()
+
+    def check(self):
+        if self.event is not None:
+            raise WatchdogError(self.event)
+
+    def _process_alive(self):
+        if self._process is None:
+            return True
+        try:
+            return self._process.is_running() and self._process.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    async def _check_frames(self):
+        if not self.obs.capturing:
+            # Nothing else refreshes the buffer during long waits. A failed grab
+            # leaves the last frame in place, which then ages past obs_timeout.
+            await self.obs.get_frame_async()
+        captured = self.obs.latest()
+        now = time.monotonic()
+        if captured is None or now - captured.timestamp > self.obs_timeout:
+            age = "never" if captured is None else f"{now - captured.timestamp:.1f}s ago"
+            self._raise_event(OBS_UNREACHABLE, f"No frame received from OBS (last frame {age}).")
+            return
+        if self._paused:
+            self._unchanged_since = None
+            return
+        if self.freeze_timeout <= 0 or captured.seq == self._last_seq:
+            return
+        self._last_seq = captured.seq
+        fingerprint = frame_fingerprint(captured.image)
+        if self._history and not np.array_equal(self._history[-1][1], fingerprint):
+            self._unchanged_since = captured.timestamp
+        elif self._unchanged_since is None:
+            self._unchanged_since = captured.timestamp
+        self._history.append((captured.timestamp, fingerprint))
+        if captured.timestamp - self._unchanged_since >= self.freeze_timeout:
+            self._raise_event(FROZEN, f"PES seems to have frozen: the screen has not changed for {self.freeze_timeout}s.")
+
+    async def _run(self):
+        while self.event is None:
+            if not self._process_alive():
+                self._raise_event(PROCESS_GONE, f"Game process '{self.process_name}' is no longer running.")
+                break
+            await self._check_frames()
+            await asyncio.sleep(self.interval)
+
+    def check_player_frame(self, frame):
+        # True if the frame is identical to the previous player's screenshot, which
+        # means the game did not move on to the next player. The full frames are
+        # compared: two players on the same layout can share a small fingerprint.
+        repeated = self._last_player_frame is not None and np.array_equal(frame, self._last_player_frame)
+        self._last_player_frame = frame
+        return repeated
+
+    def reset_player_frames(self):
+        self._last_player_frame = None
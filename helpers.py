@@ -1,14 +1,38 @@
 import asyncio
+import hashlib
+import json
 import logging
+import os
 import sys
+import time
 import psutil
 import vgamepad as vg
 import yaml
-from ocr import fuzzy_match, ocr_region
+from ocr import StaleOCRRequest
+from timing import span, timed
+
+DPAD_BUTTONS = {
+    'UP': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP,
+    'DOWN': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN,
+}
+
+# Bursts in a row that have to land as planned before the press gap penalty is
+# lowered by one step again. Doubled (up to the maximum) whenever lowering it
+# brought the dropped presses back.
+PENALTY_RECOVERY_BURSTS = 10
+MAX_PENALTY_RECOVERY_BURSTS = 160
 
 class SelectionState:
     def __init__(self):
         self.player_last_direction = 'DOWN'
+        # Extra gap added between burst presses after the game dropped inputs.
+        self.press_gap_penalty = 0.0
+        # Bursts in a row that landed as planned since the penalty last changed.
+        self.landed_bursts = 0
+        self.recovery_bursts = PENALTY_RECOVERY_BURSTS
+        self.penalty_lowered = False
+        # OCR regions whose list turned out not to wrap around despite navigation.wrap.
+        self.no_wrap = set()
 
 def load_configs(teams_config_path, version):
     with open("config.yaml", 'r') as f:
@@ -20,26 +44,221 @@ def load_configs(teams_config_path, version):
         
     version_config = config.get(version, {})
     
-    with open(teams_config_path, 'r') as f:
-        teams_config = yaml.safe_load(f)
+    catalog_config = config.get('teams', {})
+    try:
+        catalog = load_catalog(teams_config_path, catalog_config.get('cache_dir', 'teams_cache') if catalog_config.get('cache', True) else None)
+    except CatalogError as e:
+        for problem in e.problems:
+            logging.error(f"{teams_config_path}: {problem}")
+        sys.exit(1)
         
     ocr_regions = version_config.get('ocr_regions', {})
-    return config, teams_config, ocr_regions
+    # Per-version press timings override the defaults.
+    config['navigation'] = {**config.get('navigation', {}), **version_config.get('navigation', {})}
+    # Shared input macros, with the version's own macros added or replacing them by name.
+    config['macros'] = {**(config.get('macros') or {}), **(version_config.get('macros') or {})}
+    # The menu model, with the version's settings (e.g. its own screens) replacing the shared ones.
+    config['menu'] = {**(config.get('menu') or {}), **(version_config.get('menu') or {})}
+    return config, catalog, ocr_regions
 
-def check_process_running(process_name_pattern):
+def normalize_name(name):
+    # The form OCR readings and list entries are compared in: no surrounding
+    # slashes, no case.
+    name = name.strip()
+    if len(name) > 1 and name.startswith('/') and name.endswith('/'):
+        name = name[1:-1]
+    return name.casefold()
+
+class NameIndex(tuple):
+    # An immutable list of names with O(1) position lookups, by exact and by
+    # normalized name. The hash is computed once so it can key matcher caches.
+    def __new__(cls, names=()):
+        self = super().__new__(cls, names)
+        self._positions = {}
+        self._normalized = {}
+        for position, name in enumerate(self):
+            self._positions.setdefault(name, position)
+            self._normalized.setdefault(normalize_name(name), position)
+        self._hash = tuple.__hash__(self)
+        return self
+
+    def __hash__(self):
+        return self._hash
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def index(self, name):
+        position = self._positions.get(name)
+        if position is None:
+            raise ValueError(f"{name!r} is not in the list")
+        return position
+
+    def find(self, name):
+        # Position of `name`, or of the entry it reads as; None if there is none.
+        position = self._positions.get(name)
+        if position is None:
+            position = self._normalized.get(normalize_name(name))
+        return position
+
+class CatalogError(ValueError):
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+class TeamsCatalog:
+    # The teams list compiled once: per-league lists of the names shown in the
+    # game (without the surrounding slashes) with O(1) positions, the teams to
+    # capture per league, and the team ids.
+    def __init__(self, entries, leagues):
+        # `entries` are (league, name, id, selectable) in list order.
+        self.entries = [tuple(entry) for entry in entries]
+        self.leagues = NameIndex(leagues)
+        teams_by_league = {league: [] for league in leagues}
+        self.selectable = {}
+        self.team_ids = {}
+        self._by_name = {}
+        for league, name, team_id, selectable in self.entries:
+            teams_by_league[league].append(name.strip('/') if name.startswith('/') and name.endswith('/') else name)
+            if team_id is not None:
+                self.team_ids[name] = team_id
+            if selectable:
+                self.selectable.setdefault(league, []).append(name)
+            self._by_name.setdefault(normalize_name(name), (league, name))
+        # Leagues without any teams have no list to navigate.
+        self.all_teams_by_league = {league: NameIndex(names) for league, names in teams_by_league.items() if names}
+
+    @classmethod
+    def from_config(cls, teams_config):
+        entries = []
+        for league, teams in (teams_config or {}).items():
+            for team in teams or []:
+                # A bare name is a team that is listed but not captured.
+                if not isinstance(team, dict):
+                    team = {'name': team}
+                if team.get('name'):
+                    entries.append((league, str(team['name']), team.get('id'), team.get('selectable') is True))
+        catalog = cls(entries, list((teams_config or {}).keys()))
+        problems = catalog.validate()
+        if problems:
+            raise CatalogError(problems)
+        return catalog
+
+    def validate(self):
+        problems = []
+        seen_in_league = {}
+        selectable_names = {}
+        ids = {}
+        for league, name, team_id, selectable in self.entries:
+            key = (league, normalize_name(name))
+            if key in seen_in_league:
+                problems.append(f"'{name}' is listed twice in {league} (as '{seen_in_league[key]}').")
+            seen_in_league[key] = name
+            if not selectable:
+                continue
+            if team_id is None:
+                problems.append(f"Selectable team '{name}' in {league} has no id.")
+            elif team_id in ids:
+                problems.append(f"Teams '{ids[team_id]}' and '{name}' have the same id {team_id}.")
+            else:
+                ids[team_id] = name
+            if name in selectable_names and selectable_names[name] != league:
+                problems.append(f"Selectable team '{name}' is in both {selectable_names[name]} and {league}.")
+            selectable_names.setdefault(name, league)
+        return problems
+
+    def league_teams(self, league):
+        return self.all_teams_by_league.get(league, NameIndex())
+
+    def selectable_teams(self):
+        # A fresh copy per run, so resuming can drop teams from it.
+        return {league: list(names) for league, names in self.selectable.items()}
+
+    def team_id(self, name):
+        team_id = self.team_ids.get(name)
+        if team_id is None and normalize_name(name) in self._by_name:
+            team_id = self.team_ids.get(self._by_name[normalize_name(name)][1])
+        return team_id
+
+    def find_team(self, name):
+        # (league, name as written in the list) for a name in any form, or None.
+        return self._by_name.get(normalize_name(name))
+
+    def names(self):
+        # League and team names as written in the list, for the OCR languages and allowlist.
+        return list(self.leagues) + [name for _, name, _, _ in self.entries]
+
+    @property
+    def teams_config(self):
+        # The list in its YAML shape, for the tools that take one.
+        teams_config = {league: [] for league in self.leagues}
+        for league, name, team_id, selectable in self.entries:
+            team = {'name': name, 'selectable': selectable}
+            if team_id is not None:
+                team['id'] = team_id
+            teams_config[league].append(team)
+        return teams_config
+
+    def __len__(self):
+        return len(self.entries)
+
+# Bump when the compiled form changes, so old cache files are ignored.
+CATALOG_FORMAT = 1
+
+def load_catalog(path, cache_dir='teams_cache'):
+    # Parsing a long teams list is the slow part, so the compiled catalog is
+    # cached as JSON next to the other run files, keyed by the hash of the YAML.
+    with open(path, 'rb') as f:
+        data = f.read()
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}.json")
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('format') == CATALOG_FORMAT:
+                return TeamsCatalog(cached['entries'], cached['leagues'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring teams cache {cache_path}: {e}")
+    catalog = TeamsCatalog.from_config(yaml.safe_load(data))
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'format': CATALOG_FORMAT, 'leagues': list(catalog.leagues), 'entries': catalog.entries}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not write teams cache {cache_path}: {e}")
+    return catalog
+
+def find_process(process_name_pattern):
     for proc in psutil.process_iter(['name']):
-        if process_name_pattern in proc.info['name']:
-            return True
-    return False
+        if proc.info['name'] and process_name_pattern in proc.info['name']:
+            return proc
+    return None
 
-async def press_key(gamepad, button, sleep_time=0.2):
+def check_process_running(process_name_pattern):
+    return find_process(process_name_pattern) is not None
+
+def process_uptime():
+    # Seconds since this process was created, including interpreter start-up and
+    # the PyInstaller bootloader.
+    return time.time() - psutil.Process().create_time()
+
+@timed('pad.press')
+async def press_key(gamepad, button, sleep_time=0.2, release_time=0.1):
     gamepad.press_button(button=button)
     gamepad.update()
     await asyncio.sleep(sleep_time)
     gamepad.release_button(button=button)
     gamepad.update()
-    await asyncio.sleep(0.1)
+    await asyncio.sleep(release_time)
 
+@timed('pad.analog')
 async def press_left_analog(gamepad, direction, sleep_time=0.2):
     if direction == 'UP':
         y_val = -1.0
@@ -61,101 +280,210 @@ async def press_left_analog(gamepad, direction, sleep_time=0.2):
     gamepad.update()
     await asyncio.sleep(0.1)
 
-async def select_league(obs, gamepad, ocr_reader, ocr_regions, config, leagues, target_league, state):
-    logging.info(f"Starting league selection for '{target_league}'.")
-    while True:
-        await asyncio.sleep(1 / 10) # Read screen 10 times a second
-        frame = obs.get_frame()
-        if frame is None:
-            continue
+def plan_list_moves(current_index, target_index, length, wrap=False):
+    # Direction and number of presses to move the cursor between two list positions.
+    delta = target_index - current_index
+    if wrap and length:
+        down = delta % length
+        up = length - down if down else 0
+        return ('DOWN', down) if down <= up else ('UP', up)
+    return ('DOWN', delta) if delta >= 0 else ('UP', -delta)
 
-        p1_league_text = ocr_region(frame, 'p1_league_text', ocr_regions, ocr_reader)
-        p1_current_league = fuzzy_match(p1_league_text, leagues, config)
+def route_presses(order, length, start=0, wrap=False):
+    # DPAD presses to visit list positions in the given order, the cursor staying
+    # where it was left between visits.
+    presses = 0
+    for position in order:
+        presses += plan_list_moves(start, position, length, wrap)[1]
+        start = position
+    return presses
 
-        if p1_current_league is None:
-            logging.warning(f"TEAM_SELECT: Could not match OCR text '{p1_league_text}'. Repeating last action: {state.player_last_direction}.")
-            if state.player_last_direction == 'UP':
-                await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP, 0.2)
-            else:
-                await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2)
-            continue
+def plan_route(positions, length, start=0, wrap=False):
+    # Order of visiting the positions that needs the fewest presses: sweep one
+    # way, or sweep one way and turn back once. With wrap-around the best turning
+    # point is found in one pass over the positions sorted by distance.
+    targets = sorted(set(positions))
+    if not targets:
+        return [], 0
+    if not (wrap and length):
+        above = [position for position in targets if position >= start]
+        below = [position for position in reversed(targets) if position < start]
+        order = min((above + below, below + above), key=lambda order: route_presses(order, length, start))
+        return order, route_presses(order, length, start)
+    distances = sorted((position - start) % length for position in targets)
+    head = [0] if distances[0] == 0 else []
+    distances = distances[len(head):]
+    best = None
+    # The first `split` positions (by DOWN distance) are reached going DOWN, the
+    # others going UP; whichever side comes first is walked back over.
+    for split in range(len(distances) + 1):
+        down = distances[split - 1] if split else 0
+        up = length - distances[split] if split < len(distances) else 0
+        for cost, down_first in ((2 * down + up, True), (2 * up + down, False)):
+            if best is None or cost < best[0]:
+                best = (cost, split, down_first)
+    _, split, down_first = best
+    down_side = distances[:split]
+    up_side = list(reversed(distances[split:]))
+    order = head + (down_side + up_side if down_first else up_side + down_side)
+    order = [(start + distance) % length for distance in order]
+    return order, route_presses(order, length, start, wrap)
 
-        if p1_current_league == target_league:
-            logging.info(f"LEAGUE_SELECT: On target league '{target_league}'.")
-            await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            break
+def plan_visits(catalog, teams_map, wrap=False, league_start=0):
+    # Visit order of the leagues and of the teams inside them with the fewest
+    # DPAD presses. A team list opens on its first team and stays on the last
+    # team picked after backing out of it; the league list stays on the last
+    # league. Returns the planned {league: teams}, its presses and the presses
+    # of `teams_map` in its own order.
+    league_order, league_presses = plan_route([catalog.leagues.find(league) for league in teams_map], len(catalog.leagues), league_start, wrap)
+    given_presses = route_presses([catalog.leagues.find(league) for league in teams_map], len(catalog.leagues), league_start, wrap)
+    planned = {}
+    presses = league_presses
+    for league_position in league_order:
+        league = catalog.leagues[league_position]
+        options = catalog.league_teams(league)
+        by_position = {options.find(team): team for team in teams_map[league]}
+        order, team_presses = plan_route(by_position, len(options), 0, wrap)
+        planned[league] = [by_position[position] for position in order]
+        presses += team_presses
+        given_presses += route_presses([options.find(team) for team in teams_map[league]], len(options), 0, wrap)
+    return planned, presses, given_presses
+
+async def press_burst(gamepad, direction, count, navigation, state):
+    press_time = navigation.get('press_time', 0.2)
+    press_gap = navigation.get('press_gap', 0.1) + state.press_gap_penalty
+    with span('pad.burst', direction=direction, count=count):
+        for _ in range(count):
+            await press_key(gamepad, DPAD_BUTTONS[direction], press_time, press_gap)
+
+async def navigate_list(obs, gamepad, region_name, ocr_regions, options, target, state, read, config, label):
+    # Reads the highlighted entry, presses the whole burst of DPAD presses implied
+    # by the index distance, then reads once more to verify and correct overshoot.
+    # Gives up with a RuntimeError after `navigation.max_attempts` reads.
+    navigation = config.get('navigation', {})
+    wrap = navigation.get('wrap', False) and region_name not in state.no_wrap
+    max_burst = navigation.get('max_burst', 30)
+    max_attempts = navigation.get('max_attempts', 40)
+    region = ocr_regions[region_name]
+    if not isinstance(options, NameIndex):
+        options = NameIndex(options)
+    frame = None
+    expected = None
+    burst = None  # (start index, direction, presses) of the last burst
+    for _ in range(max_attempts):
+        # Only read the text once the highlighted entry has finished moving.
+        if frame is None:
+            frame = await obs.wait_for_stable(region=region, timeout=1.0, stable_time=0.1)
         else:
-            try:
-                current_index = leagues.index(p1_current_league)
-                target_index = leagues.index(target_league)
-                if current_index < target_index:
-                    logging.info(f"LEAGUE_SELECT: Current '{p1_current_league}' is before '{target_league}', pressing DOWN.")
-                    state.player_last_direction = 'DOWN'
-                    await self.press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2) # fix for Vigem windows users
-                else:
-                    logging.info(f"LEAGUE_SELECT: Current '{p1_current_league}' is after '{target_league}', pressing UP.")
-                    state.player_last_direction = 'UP'
-                    await self.press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP, 0.2) # fix for Vigem windows users
-            except ValueError:
-                logging.error(f"League '{target_league}' or '{p1_current_league}' not in list. Skipping.")
-                state.player_last_direction = 'DOWN'
-                await self.press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2) # fix for Vigem windows users
-
-async def select_team(obs, gamepad, ocr_reader, ocr_regions, config, all_teams, desired_team, state):
-    logging.info(f"Starting team selection for '{desired_team}'.")
-    desired_team_lower = desired_team.lower().strip('/')
-    
-    while True:
-        await asyncio.sleep(1 / 10)
-        frame = obs.get_frame()
+            frame = await obs.wait_for_transition(region=region, change_timeout=0.5, settle_timeout=1.0, stable_time=0.1, reference=frame)
         if frame is None:
             continue
 
-        player1_text = ocr_region(frame, 'p1_team_select_text', ocr_regions, ocr_reader)
-        
-        processed_text = player1_text.lower()
-        
-        slash_like_chars = config.get('ocr_corrections', {}).get('slash_like_characters', [])
-        if slash_like_chars and len(processed_text) > 1:
-            if processed_text[0] in slash_like_chars:
-                processed_text = '/' + processed_text[1:]
-            if processed_text[-1] in slash_like_chars:
-                processed_text = processed_text[:-1] + '/'
-        
-        if processed_text.startswith('/') and processed_text.endswith('/'):
-            processed_text = processed_text[1:-1]
-            
-        current_team = fuzzy_match(processed_text, all_teams, config)
-
-        if current_team is None:
-            logging.warning(f"TEAM_SELECT: Could not match OCR text '{player1_text}'. Repeating last action: {state.player_last_direction}.")
-            if state.player_last_direction == 'UP':
-                await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP, 0.2)
-            else:
-                await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2)
+        # The target is never taken from a template alone: pressing A on a wrong team
+        # costs a whole capture, so it is confirmed by EasyOCR unless every option
+        # has a template (see ocr.read_name).
+        trusted = options[expected] if expected is not None and options[expected].lower() != target.lower() else None
+        try:
+            current, text = await read(frame, trusted)
+        except StaleOCRRequest:
+            frame = None
             continue
-        
-        logging.debug(f"TEAM_SELECT OCR: '{player1_text}' -> Matched: '{current_team}'")
+        if current is None:
+            logging.warning(f"{label}: Could not match OCR text '{text}'. Repeating last action: {state.player_last_direction}.")
+            expected = None
+            burst = None
+            await press_key(gamepad, DPAD_BUTTONS[state.player_last_direction], navigation.get('press_time', 0.2))
+            continue
+
+        if state.press_gap_penalty and burst is not None and burst[2] > 1 and expected == options.find(current):
+            # Bursts that keep landing where planned win back one step of the
+            # penalty, so a few early drops do not slow down the rest of the run.
+            state.landed_bursts += 1
+            if state.landed_bursts >= state.recovery_bursts:
+                state.press_gap_penalty = round(max(state.press_gap_penalty - 0.05, 0.0), 2)
+                state.landed_bursts = 0
+                state.penalty_lowered = True
+                logging.info(f"{label}: {state.recovery_bursts} bursts landed as planned. Press gap penalty now {state.press_gap_penalty:.2f}s.")
 
-        desired_team_name = desired_team.strip('/')
-        if current_team.lower() == desired_team_name.lower():
-            logging.info(f"TEAM_SELECT: Desired team '{desired_team}' found, pressing A.")
+        if current.lower() == target.lower():
+            logging.info(f"{label}: On target '{target}'.")
             await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            break
-        else:
-            try:
-                current_index = all_teams.index(current_team)
-                target_index = all_teams.index(desired_team_name)
-
-                if current_index < target_index:
-                    logging.info(f"TEAM_SELECT: Navigating DOWN for '{desired_team}'. Current: '{current_team}'.")
-                    state.player_last_direction = 'DOWN'
-                    await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2) # fix for Vigem windows users
-                else: # current_index > target_index
-                    logging.info(f"TEAM_SELECT: Navigating UP for '{desired_team}'. Current: '{current_team}'.")
-                    state.player_last_direction = 'UP'
-                    await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP, 0.2) # fix for Vigem windows users
-            except ValueError:
-                logging.error(f"Team '{desired_team_name}' or '{current_team}' not in list. Defaulting to DOWN.")
-                state.player_last_direction = 'DOWN'
-                await press_key(gamepad, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2) # fix for Vigem windows users
\ No newline at end of file
+            return
+
+        current_index = options.find(current)
+        target_index = options.find(target)
+        if current_index is None or target_index is None:
+            logging.error(f"{label}: '{target}' or '{current}' not in list. Defaulting to DOWN.")
+            state.player_last_direction = 'DOWN'
+            expected = None
+            burst = None
+            await press_key(gamepad, DPAD_BUTTONS['DOWN'], navigation.get('press_time', 0.2))
+            continue
+
+        if wrap and burst is not None and expected != current_index:
+            # A burst planned across the end of the list that stopped at that end
+            # (or did not move at all): the list does not wrap around, and going
+            # round again would never get there.
+            start, direction, count = burst
+            edge = 0 if direction == 'UP' else len(options) - 1
+            crossed = start - count < 0 if direction == 'UP' else start + count >= len(options)
+            if crossed and current_index in (edge, start):
+                wrap = False
+                state.no_wrap.add(region_name)
+                expected = None
+                logging.warning(f"{label}: '{current}' did not wrap around going {direction}; navigating this list without wrap-around.")
+
+        if expected is not None and expected != current_index:
+            # The last burst did not land where planned, most likely because the game
+            # dropped presses. Space out later bursts a little more.
+            state.press_gap_penalty = min(state.press_gap_penalty + 0.05, 0.3)
+            state.landed_bursts = 0
+            if state.penalty_lowered:
+                # The game still needs the wider gap; wait longer before trying again.
+                state.recovery_bursts = min(state.recovery_bursts * 2, MAX_PENALTY_RECOVERY_BURSTS)
+                state.penalty_lowered = False
+            logging.info(f"{label}: Burst landed on '{current}' instead of '{options[expected]}'. Press gap penalty now {state.press_gap_penalty:.2f}s.")
+
+        direction, steps = plan_list_moves(current_index, target_index, len(options), wrap)
+        steps = min(steps, max_burst)
+        logging.info(f"{label}: Current '{current}', pressing {direction} x{steps} towards '{target}'.")
+        state.player_last_direction = direction
+        offset = steps if direction == 'DOWN' else -steps
+        expected = (current_index + offset) % len(options) if wrap else current_index + offset
+        burst = (current_index, direction, steps)
+        await press_burst(gamepad, direction, steps, navigation, state)
+    raise RuntimeError(f"{label}: could not reach '{target}' after {max_attempts} attempts.")
+
+@timed('phase.select_league')
+async def select_league(obs, gamepad, ocr, ocr_regions, config, leagues, target_league, state, recognizer=None):
+    # `ocr` is an OCRService; recognition runs on its worker thread.
+    logging.info(f"Starting league selection for '{target_league}'.")
+
+    def read(frame, expected=None):
+        return ocr.read_name(frame, 'p1_league_text', ocr_regions, config, leagues, recognizer, expected=expected)
+
+    await navigate_list(obs, gamepad, 'p1_league_text', ocr_regions, leagues, target_league, state, read, config, "LEAGUE_SELECT")
+
+def clean_team_text(text, config):
+    processed_text = text.lower()
+
+    slash_like_chars = config.get('ocr_corrections', {}).get('slash_like_characters', [])
+    if slash_like_chars and len(processed_text) > 1:
+        if processed_text[0] in slash_like_chars:
+            processed_text = '/' + processed_text[1:]
+        if processed_text[-1] in slash_like_chars:
+            processed_text = processed_text[:-1] + '/'
+
+    if processed_text.startswith('/') and processed_text.endswith('/'):
+        processed_text = processed_text[1:-1]
+    return processed_text
+
+@timed('phase.select_team')
+async def select_team(obs, gamepad, ocr, ocr_regions, config, all_teams, desired_team, state, recognizer=None):
+    logging.info(f"Starting team selection for '{desired_team}'.")
+
+    def read(frame, expected=None):
+        return ocr.read_name(frame, 'p1_team_select_text', ocr_regions, config, all_teams, recognizer,
+                             clean_text=lambda text: clean_team_text(text, config), expected=expected)
+
+    await navigate_list(obs, gamepad, 'p1_team_select_text', ocr_regions, all_teams, desired_team.strip('/'), state, read, config, "TEAM_SELECT")
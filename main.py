@@ -1,6 +1,8 @@
 
 import asyncio
+import contextlib
 import logging
+import multiprocessing
 import os
 import platform
 import argparse
@@ -9,282 +11,434 @@ import time
 from datetime import datetime
 from pathlib import Path
 
-import cv2
-import easyocr
-import numpy as np
-import psutil
 import vgamepad as vg
 import yaml
-from obswebsocket import requests as obs_requests
 from obswebsocket import exceptions as obs_exceptions
-from screen_capture import OBSClient
+from screen_capture import capture_profiles, OBSClient
+from asset_writer import AssetWriter
+from game_watchdog import Watchdog
+from recording import ClipSplitter, TeamRecorder
+from manifest import CaptureManifest
+from game_pads import Gamepad
+from menu_graph import menu_model_from_config, MenuNavigator
+from calibration import apply_profile, calibrate, calibrate_macros, profile_path, save_profile
+from packager import packager_from_config
+from qa import quality_checker_from_config
+from timeline import compile_macros, MacroError, TimelineRunner
+from timing import TRACER, configure_timing, span, timed
 
 from helpers import (
     load_configs,
-    check_process_running,
+    plan_visits,
+    process_uptime,
     press_key,
-    press_left_analog,
     select_league,
     select_team,
     SelectionState,
 )
-from ocr import ocr_region, fuzzy_match
+from ocr import build_allowlist, configure_ocr_cache, get_ocr_cache_stats, load_easyocr_reader, ocr_languages, OCRService, TemplateRecognizer
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Global Variables ---
-LAST_SCREENSHOT = None
+@timed('phase.team')
+async def capture_team(obs, runner, macros, team_name, team_id, team_folder, assets, recorder, watchdog=None, manifest=None, resume=False,
+                       navigator=None):
+    # Captures the screenshot and motion clip of all 23 players, starting on the
+    # team's player list. Backing out to the team list is left to the caller.
+    # The menu inputs come from the version's compiled macros (see timeline.py),
+    # or, with a navigator, from the menu model's shortest paths (see menu_graph.py).
+    if navigator is not None:
+        navigator.enter('players')
+    try:
+        await recorder.start_team(team_folder, team_id, team_name)
+    except Exception as e:
+        logging.error(f"An error occurred while preparing the OBS recording: {e}")
+
+    for i in range(23):
+        player_started = time.monotonic()
+        # Wait for the player view to finish loading instead of sleeping the worst case.
+        if i == 0:
+            frame = await obs.wait_for_transition(change_timeout=1.0, settle_timeout=2.6)
+        else:
+            frame = await obs.wait_for_transition(change_timeout=0.5, settle_timeout=1.6)
+        player_id = f"{i+1:02d}"
+        if resume and manifest is not None and manifest.player_complete(team_name, player_id):
+            logging.info(f"Resuming: player {i+1}/23 of {team_name} already captured, skipping.")
+            if navigator is not None:
+                await navigator.goto('players', {'players': min(i + 1, 22)})
+            else:
+                await runner.run('player_skip', macros)
+            continue
+        logging.info(f"Processing player {i+1}/23 for team {team_name}")
+
+        if frame is None:
+            logging.error("Could not get frame from OBS. Exiting.")
+            sys.exit(1)
+
+        # Save screenshot. The polling frames are downscaled, so the saved one is
+        # fetched again at full resolution.
+        archival = await obs.grab_archival()
+        if archival is None:
+            logging.warning(f"Could not get a full-resolution screenshot of player {i+1}; saving the polling frame.")
+        else:
+            frame = archival
+        screenshot_filename = f"{team_id}{player_id} - 0 - mainview.png"
+        screenshot_path = team_folder / screenshot_filename
+        on_done = None
+        if manifest is not None:
+            on_done = lambda path, player_id=player_id: manifest.record_asset(team_name, team_id, player_id, 'screenshot', path)
+        screenshot_path = await assets.save_image(screenshot_path, frame, on_done=on_done)
+
+        # Compare with previous screenshot
+        if watchdog is not None and watchdog.check_player_frame(frame):
+            logging.error(f"PES seems to have frozen on player {i}. Exiting.")
+            sys.exit(1)
+        logging.info(f"Screenshot queued for {screenshot_path}")
+        # --- Gamepad Actions ---
+        # Opens the motion view and starts holding the version's motion input.
+        if navigator is not None:
+            await navigator.goto('motion', {'players': i})
+            await runner.run('motion_start', macros)
+        else:
+            await runner.run('player_open', macros)
+
+        logging.info(f"Starting {recorder.clip_length}-second video capture...")
+        stop_task = None
+        try:
+            with span('phase.record_clip'):
+                stop_task = await recorder.record_player(player_id)
+        except Exception as e:
+            logging.error(f"An error occurred during OBS recording: {e}")
+        # Releases the hold and backs out to the next player.
+        if navigator is not None:
+            await runner.run('motion_stop', macros)
+            await navigator.goto('players', {'players': i + 1} if i < 22 else None)
+        else:
+            await runner.run('player_close', macros)
+
+        try:
+            with span('phase.finish_clip'):
+                await recorder.finish_player(player_id, stop_task)
+        except Exception as e:
+            logging.error(f"An error occurred while finalizing the OBS recording: {e}")
+        TRACER.record('phase.player', player_started, time.monotonic() - player_started, team=team_name, player=player_id)
+
+    # Stopping the recording and writing the last assets can keep the screen
+    # still for longer than the freeze timeout.
+    with watchdog.paused() if watchdog is not None else contextlib.nullcontext():
+        try:
+            await recorder.finish_team()
+        except Exception as e:
+            logging.error(f"An error occurred while finalizing the team recording: {e}")
+        with span('assets.flush'):
+            failed_assets = await assets.flush()
+    if manifest is not None:
+        # Once per team, not per asset: rewriting the whole manifest every time
+        # grows with the run.
+        manifest.save()
+    if failed_assets:
+        logging.error(f"{failed_assets} screenshots/videos of team {team_name} could not be written.")
+    TRACER.count('teams')
+    logging.info(f"Team {team_name} is OK.")
 
 async def main():
     parser = argparse.ArgumentParser(description="Automated PES Aesthetic ATF")
     parser.add_argument("--list", required=True, help="Path to the teams list YAML file.")
     parser.add_argument("--version", required=True, help="The version of the game/mod.")
+    parser.add_argument("--resume", action="store_true", help="Skip teams and players already captured according to screenshots/manifest.json.")
+    parser.add_argument("--calibrate", action="store_true", help="Measure the shortest safe press timings on this machine and write a timing profile instead of capturing.")
+    parser.add_argument("--verify-hashes", action="store_true", help="With --resume, check the SHA-256 of every captured file instead of only its size.")
     args = parser.parse_args()
 
     OBS = None # Initialize OBS to None for graceful error handling
+    ASSETS = None
+    WATCHDOG = None
+    SPLITTER = None
+    OCR = None
+    QA = None
+    PACKAGER = None
+    MANIFEST = None
     try:
         # --- Initialization ---
-        CONFIG, TEAMS_CONFIG, OCR_REGIONS = load_configs(args.list, args.version)
-        
+        CONFIG, CATALOG, OCR_REGIONS = load_configs(args.list, args.version)
+        if not args.calibrate:
+            apply_profile(CONFIG, args.version)
+
+        timing_config = CONFIG.get('timing', {})
+        trace_path = None
+        if timing_config.get('trace', True):
+            trace_path = os.path.join(timing_config.get('trace_dir', 'traces'), f"{datetime.now():%Y%m%d-%H%M%S}-{args.version}.jsonl")
+        configure_timing(timing_config.get('enabled', True), trace_path)
+
+        # The OCR model loads (and warms up) on the OCR worker thread while we
+        # connect to OBS and play the intro; the first menu read waits for it.
+        ocr_config = CONFIG.setdefault('ocr', {})
+        ocr_langs = ocr_config.get('languages') or ocr_languages(CATALOG.names())
+        OCR = OCRService(reader_factory=lambda: load_easyocr_reader(ocr_langs, warmup=ocr_config.get('warmup', True)))
+        OCR.start()
+        logging.info(f"Loading the EasyOCR reader ({', '.join(ocr_langs)}) in the background.")
+
+        try:
+            MACROS = compile_macros(CONFIG['macros'], CONFIG.get('timeline'))
+        except MacroError as e:
+            logging.error(f"Invalid input macros in config.yaml: {e}")
+            sys.exit(1)
+        try:
+            MENU = menu_model_from_config(CONFIG)
+        except MacroError as e:
+            logging.error(f"Invalid menu model in config.yaml: {e}")
+            sys.exit(1)
+        required_macros = ('intro', 'player_open', 'player_close', 'player_skip', 'finalization')
+        if MENU is not None:
+            required_macros += ('motion_start', 'motion_stop')
+        for name in required_macros:
+            if name not in MACROS:
+                logging.error(f"config.yaml has no '{name}' macro for {args.version}.")
+                sys.exit(1)
+
         GAMEPAD = vg.VX360Gamepad()
         logging.info("Virtual gamepad initialized.")
         
         obs_config = CONFIG.get('obs', {})
+        capture_config = CONFIG.get('capture', {})
+        polling_profile, archival_profile = capture_profiles(capture_config)
         OBS = OBSClient(
             host=obs_config.get('host', 'localhost'),
             port=obs_config.get('port', 4455),
-            password=obs_config.get('password', '')
+            password=obs_config.get('password', ''),
+            buffer_size=capture_config.get('buffer_size', 4),
+            capture_interval=capture_config.get('interval', 0.05),
+            polling=polling_profile,
+            archival=archival_profile
         )
         try:
             OBS.connect()
             if not OBS.ws:
                 logging.error("Failed to connect to OBS.")
                 sys.exit(1)
+            await OBS.connect_async()
             logging.info("Connected to OBS.")
-        except obs_exceptions.ConnectionFailure as e:
+            # Menu reads run on the smaller polling frames.
+            OCR_REGIONS = OBS.scale_regions(OCR_REGIONS)
+            if OBS.poll_scale < 1.0:
+                # EasyOCR reads the names at canvas size again.
+                ocr_config['upscale'] = 1.0 / OBS.poll_scale
+            if capture_config.get('background', True):
+                OBS.start_capture()
+        except (obs_exceptions.ConnectionFailure, OSError) as e:
             logging.error(f"Failed to connect to OBS: {e}")
             logging.error("Please ensure OBS is running and the WebSocket server is enabled in OBS settings (Tools -> WebSocket Server Settings).")
             sys.exit(1)
+        # Menu macros play on the same virtual pad through the async wrapper.
+        TIMELINE = TimelineRunner(Gamepad(GAMEPAD), settle=OBS.wait_for_transition, stable=OBS.wait_for_stable)
+        NAVIGATOR = MenuNavigator(MENU, TIMELINE, OBS) if MENU is not None else None
 
-        OCR_READER = easyocr.Reader(['en', 'ja'])
-        logging.info("EasyOCR reader initialized.")
+        watchdog_config = CONFIG.get('watchdog', {})
+        WATCHDOG = Watchdog(
+            OBS,
+            process_name=watchdog_config.get('process_name', 'PES20'),
+            interval=watchdog_config.get('interval', 1.0),
+            freeze_timeout=watchdog_config.get('freeze_timeout', 8.0),
+            obs_timeout=watchdog_config.get('obs_timeout', 5.0)
+        )
+        if not WATCHDOG.resolve_process():
+            logging.error(f"Game process '{WATCHDOG.process_name}**.exe' not found. Exiting.")
+            sys.exit(1)
+
+        configure_ocr_cache(ocr_config.get('cache_size', 64))
+        if ocr_config.get('allowlist_from_teams'):
+            ocr_config['allowlist'] = build_allowlist(CATALOG.names())
+            logging.info(f"OCR allowlist built from teams list: {len(ocr_config['allowlist'])} characters.")
+        RECOGNIZER = None
+        if ocr_config.get('templates', True):
+            templates_dir = ocr_config.get('templates_dir', 'ocr_templates')
+            RECOGNIZER = TemplateRecognizer(
+                path=os.path.join(templates_dir, f"{args.version}.npz"),
+                threshold=ocr_config.get('template_threshold', 0.9)
+            )
 
         selection_state = SelectionState()
 
+        assets_config = CONFIG.get('assets', {})
+        ASSETS = AssetWriter(
+            image_format=assets_config.get('format', 'png'),
+            png_compression=assets_config.get('png_compression', 1),
+            webp_quality=assets_config.get('webp_quality', 101),
+            max_pending=assets_config.get('max_pending', 8),
+            workers=assets_config.get('workers', 2)
+        )
+
+        MANIFEST = CaptureManifest(os.path.join('screenshots', 'manifest.json'))
+        if args.resume:
+            MANIFEST.verify(deep=args.verify_hashes)
+
+        recording_config = CONFIG.get('recording', {})
+        recording_mode = recording_config.get('mode', 'per_player')
+        if recording_mode == 'per_team' and recording_config.get('split', True):
+            SPLITTER = ClipSplitter(workers=recording_config.get('split_workers', 2), fourcc=recording_config.get('fourcc', 'mp4v'))
+        RECORDER = TeamRecorder(
+            OBS,
+            ASSETS,
+            mode=recording_mode,
+            clip_length=recording_config.get('clip_length', 3.0),
+            splitter=SPLITTER,
+            keep_source=recording_config.get('keep_source', False),
+            start_offset=recording_config.get('start_offset', 0.0),
+            manifest=MANIFEST
+        )
+        QA = None if args.calibrate else quality_checker_from_config(CONFIG)
+        PACKAGER = None if args.calibrate else packager_from_config(CONFIG)
+
         # --- Initial Actions ---
-        logging.info("Starting initial sequence...")
-        if args.version == "pes15":
-            await press_left_analog(GAMEPAD, 'LEFT')
-            await asyncio.sleep(1)
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-            logging.info("Waiting for 5 seconds...")
-            await asyncio.sleep(5)
-        if args.version == "pes17":
-            await asyncio.sleep(0.6)
-            await press_left_analog(GAMEPAD, 'LEFT')
-            await asyncio.sleep(0.6)
-            await press_left_analog(GAMEPAD, 'LEFT')
-            await asyncio.sleep(0.6)
-            await press_left_analog(GAMEPAD, 'UP')
-            await asyncio.sleep(0.6)
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-            logging.info("Waiting for 5 seconds...")
-            await asyncio.sleep(5)
-        if args.version == "pes21":
-            for _ in range(3):
-                await press_left_analog(GAMEPAD, 'RIGHT')
-                await asyncio.sleep(0.2)
-            for _ in range(2):
-                await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.25)
-                await asyncio.sleep(0.3)
-            for _ in range(2):
-                await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.25)
-                await asyncio.sleep(3)
-        await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-        await asyncio.sleep(1)
-        await press_left_analog(GAMEPAD, 'DOWN')
-        await asyncio.sleep(0.2)
-        await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-        await asyncio.sleep(0.2)
+        intro_started = time.monotonic()
+        logging.info(f"Starting initial sequence ({process_uptime():.1f}s after start, OCR reader {'ready' if OCR.ready else 'still loading'}).")
+        await TIMELINE.run('intro', MACROS)
         logging.info("Initial sequence complete.")
-        await asyncio.sleep(0.5)
+        TRACER.record('phase.intro', intro_started, time.monotonic() - intro_started)
+        # The menu stays still while the first read waits for the model, so the
+        # watchdog only starts once it has loaded.
+        ocr_wait_started = time.monotonic()
+        try:
+            await OCR.wait_ready()
+        except RuntimeError as e:
+            logging.error(str(e))
+            sys.exit(1)
+        logging.info(f"OCR reader ready ({time.monotonic() - ocr_wait_started:.1f}s waited after the intro).")
+        WATCHDOG.start(asyncio.current_task())
         # --- Team and Player Loop ---
-        leagues = list(TEAMS_CONFIG.keys())
-        all_teams_by_league = {}
-        selectable_teams_map = {}
-        team_name_to_id_map = {}
-        for league_name, teams_list in TEAMS_CONFIG.items():
-            if teams_list:
-                if league_name not in all_teams_by_league:
-                    all_teams_by_league[league_name] = []
-                for team_data in teams_list:
-                    team_name = team_data.get("name")
-                    team_id = team_data.get("id")
-                    if team_name:
-                        if team_id:
-                            team_name_to_id_map[team_name] = team_id
-                        
-                        team_name_for_list = team_name
-                        if team_name_for_list.startswith('/') and team_name_for_list.endswith('/'):
-                            team_name_for_list = team_name_for_list[1:-1]
-                        all_teams_by_league[league_name].append(team_name_for_list)
-
-                        if team_data.get("selectable") is True:
-                            if league_name not in selectable_teams_map:
-                                selectable_teams_map[league_name] = []
-                            selectable_teams_map[league_name].append(team_name)
-
-        for league, teams in selectable_teams_map.items():
-            await select_league(OBS, GAMEPAD, OCR_READER, OCR_REGIONS, CONFIG, leagues, league, selection_state)
+        leagues = CATALOG.leagues
+        all_teams_by_league = CATALOG.all_teams_by_league
+        selectable_teams_map = CATALOG.selectable_teams()
+
+        if args.resume:
+            for league in list(selectable_teams_map.keys()):
+                remaining = [team_name for team_name in selectable_teams_map[league] if not MANIFEST.team_complete(team_name)]
+                skipped = len(selectable_teams_map[league]) - len(remaining)
+                if skipped:
+                    logging.info(f"Resuming: skipping {skipped} already captured teams in {league}.")
+                if remaining:
+                    selectable_teams_map[league] = remaining
+                else:
+                    del selectable_teams_map[league]
+
+        if args.calibrate:
+            # Calibrate on the team list of the biggest league, then go straight to finalization.
+            league = max(all_teams_by_league, key=lambda name: len(all_teams_by_league[name]))
+            try:
+                await select_league(OBS, GAMEPAD, OCR, OCR_REGIONS, CONFIG, leagues, league, selection_state, RECOGNIZER)
+                profile = await calibrate(OBS, GAMEPAD, OCR, OCR_REGIONS, CONFIG, all_teams_by_league[league], args.version, RECOGNIZER)
+                # The macro steps are timed on the player list of the league's first team.
+                await select_team(OBS, GAMEPAD, OCR, OCR_REGIONS, CONFIG, all_teams_by_league[league], all_teams_by_league[league][0],
+                                  selection_state, RECOGNIZER)
+                profile['macros'] = await calibrate_macros(OBS, TIMELINE, CONFIG)
+                await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B) # Back out to team select
+            except (RuntimeError, ValueError) as e:
+                logging.error(f"Calibration failed: {e}")
+                sys.exit(1)
+            path = profile_path(args.version, CONFIG.get('calibration', {}).get('profile_dir', 'profiles'))
+            save_profile(path, profile)
+            logging.info(f"Timing profile written to {path}; later runs on this machine will use it.")
+            selectable_teams_map = {}
+
+        navigation_config = CONFIG.get('navigation', {})
+        if selectable_teams_map and navigation_config.get('plan_route', True):
+            selectable_teams_map, planned_presses, list_presses = plan_visits(CATALOG, selectable_teams_map, navigation_config.get('wrap', False))
+            logging.info(f"Route: {sum(map(len, selectable_teams_map.values()))} teams in {len(selectable_teams_map)} leagues, "
+                         f"{planned_presses} DPAD presses planned ({list_presses} in list order).")
+
+        # Navigation gives up with a RuntimeError (see helpers.navigate_list and
+        # menu_graph.MenuNavigator); the menus are then in an unknown state.
+        position = None
+        try:
+            for league_number, (league, teams) in enumerate(selectable_teams_map.items()):
+                if league_number and 'league_exit' in MACROS:
+                    await TIMELINE.run('league_exit', MACROS)
+                position = f"league {league}"
+                await select_league(OBS, GAMEPAD, OCR, OCR_REGIONS, CONFIG, leagues, league, selection_state, RECOGNIZER)
             
-            teams_in_current_league = all_teams_by_league.get(league, [])
+                teams_in_current_league = CATALOG.league_teams(league)
             
-            for team_name in teams:
-                await select_team(OBS, GAMEPAD, OCR_READER, OCR_REGIONS, CONFIG, teams_in_current_league, team_name, selection_state)
+                for team_name in teams:
+                    position = f"team {team_name}"
+                    await select_team(OBS, GAMEPAD, OCR, OCR_REGIONS, CONFIG, teams_in_current_league, team_name, selection_state, RECOGNIZER)
                 
-                logging.info(f"Processing team: {team_name}")
-                team_folder = Path(f"screenshots/{team_name.strip('/')}")
-                team_folder.mkdir(parents=True, exist_ok=True)
-                global LAST_SCREENSHOT
-                LAST_SCREENSHOT = None
-
-                for i in range(23):
-                    await asyncio.sleep(1.5)
-                    logging.info(f"Processing player {i+1}/23 for team {team_name}")
-                    if not check_process_running("PES20"):
-                        logging.error("Game process 'PES20**.exe' not found. Exiting.")
-                        sys.exit(1)
-
-                    await asyncio.sleep(1/10)
-                    if i == 0:
-                        await asyncio.sleep(1)
-                    frame = OBS.get_frame()
-                    if frame is None:
-                        logging.error("Could not get frame from OBS. Exiting.")
-                        sys.exit(1)
-
-                    # Save screenshot
-                    player_id = f"{i+1:02d}"
-                    team_id = team_name_to_id_map.get(team_name)
-                    if team_id is None:
-                        logging.error(f"Could not find team ID for team {team_name}. Exiting.")
-                        sys.exit(1)
-                    screenshot_filename = f"{team_id}{player_id} - 0 - mainview.png"
-                    screenshot_path = team_folder / screenshot_filename
-                    cv2.imwrite(str(screenshot_path), frame)
-
-                    # Compare with previous screenshot
-                    if i > 0 and LAST_SCREENSHOT is not None:
-                        if np.array_equal(frame, LAST_SCREENSHOT):
-                            logging.error(f"PES seems to have frozen on player {i}. Exiting.")
-                            sys.exit(1)
-                    LAST_SCREENSHOT = frame
-                    logging.info(f"Screenshot saved at {screenshot_path}")
-                    # --- Gamepad Actions ---
-                    await asyncio.sleep(0.2)
-                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-                    await asyncio.sleep(0.2)
-                    for _ in range(7):
-                        await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.16) #fix for vigem windows users
-                        await asyncio.sleep(0.15)
-                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A, 0.2)
-                    await asyncio.sleep(1)
-                    if args.version == "pes15":
-                        GAMEPAD.left_trigger_float(1.0)
-                        GAMEPAD.update()
-                    if args.version == "pes17" or args.version == "pes21":
-                        GAMEPAD.right_joystick_float(x_value_float=1.0, y_value_float=0.0)
-                        GAMEPAD.update()
-                    await asyncio.sleep(0.25)
-                    
-                    logging.info("Starting 3-second video capture...")
-                    try:
-                        # Set recording directory to the team's screenshot folder
-                        recording_path = str(team_folder.resolve())
-                        OBS.ws.call(obs_requests.SetRecordDirectory(recordDirectory=recording_path))
-
-                        # We will rename the file after recording, so we can ignore SetFilenameFormatting
-                        
-                        # Start recording
-                        OBS.ws.call(obs_requests.StartRecord())
-                        logging.info(f"Recording started for player {i+1:02d} in folder '{recording_path}'")
-
-                        # Record for 5 seconds
-                        await asyncio.sleep(3)
-
-                        # Stop recording
-                        response = OBS.ws.call(obs_requests.StopRecord())
-                        logging.info("Recording stopped.")
-
-                        # OBS v28+ returns outputPath in the response. We will rename this file.
-                        output_path = response.datain.get('outputPath')
-                        if output_path and os.path.exists(output_path):
-                            file_extension = os.path.splitext(output_path)[1]
-                            desired_filename = f"{team_id}{player_id} - 2 - motion{file_extension}"
-                            desired_path = os.path.join(os.path.dirname(output_path), desired_filename)
-                            
-                            try:
-                                # If the desired file already exists, remove it.
-                                if os.path.exists(desired_path):
-                                    os.remove(desired_path)
-                                os.rename(output_path, desired_path)
-                                logging.info(f"Renamed video to: {desired_path}")
-                            except OSError as e:
-                                logging.error(f"Error renaming video file: {e}")
-                        elif output_path:
-                            logging.warning(f"OBS reported video path that does not exist: {output_path}")
-                        else:
-                            logging.warning("Could not get output path from OBS. File may not have been saved or may require manual renaming.")
-
-                    except Exception as e:
-                        logging.error(f"An error occurred during OBS recording: {e}")
-                    GAMEPAD.left_trigger_float(0.0)
-                    GAMEPAD.right_joystick_float(x_value_float=0.0, y_value_float=0.0)
-                    GAMEPAD.update()
-                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B, 0.25)
-                    await asyncio.sleep(0.7)
-                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B, 0.25)
-                    await asyncio.sleep(0.7)
-                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, 0.2)
-                    await asyncio.sleep(0.2)
-
-                logging.info(f"Team {team_name} is OK.")
-                await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B) # Back out to team select
+                    logging.info(f"Processing team: {team_name}")
+                    team_folder = Path(f"screenshots/{team_name.strip('/')}")
+                    team_folder.mkdir(parents=True, exist_ok=True)
+                    WATCHDOG.reset_player_frames()
+                    team_id = CATALOG.team_id(team_name)
+                    await capture_team(OBS, TIMELINE, MACROS, team_name, team_id, team_folder, ASSETS, RECORDER, WATCHDOG, MANIFEST, args.resume, NAVIGATOR)
+                    if RECOGNIZER is not None:
+                        RECOGNIZER.save()
+                    if QA:
+                        QA.submit_team(str(team_folder))
+                    if PACKAGER:
+                        PACKAGER.submit_team(str(team_folder), RECORDER.split)
+                    await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B) # Back out to team select
+        except RuntimeError as e:
+            logging.error(f"Stopping at {position}: {e}")
+            try:
+                # Stops a team recording that is still running; the clips of the
+                # players captured so far are split as usual.
+                await RECORDER.finish_team()
+            except Exception as stop_error:
+                logging.error(f"Could not stop the team recording: {stop_error}")
+            sys.exit(1)
 
         # --- Finalization ---
         logging.info("All teams processed. Starting finalization sequence.")
-        for _ in range(5):
-            await asyncio.sleep(0.2)
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B, 0.2)
-            await asyncio.sleep(0.1)
-        await asyncio.sleep(2)
-        await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_B, 0.2)
-        await asyncio.sleep(0.5)
-        if args.version == "pes15" or args.version == "pes17":
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT)
-        if args.version == "pes21":
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT)
-        await asyncio.sleep(0.2)
-        await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-        await asyncio.sleep(6)
-        if args.version == "pes15": # to return to initial mainmenu
-            await press_key(GAMEPAD, vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT) 
-        if args.version == "pes17": # to return to initial mainmenu
-            for _ in range(2):
-                await asyncio.sleep(0.5)
-                await press_left_analog(GAMEPAD, 'RIGHT')
-        if args.version == "pes21":
-            for _ in range(3):
-                await press_left_analog(GAMEPAD, 'LEFT')
-                await asyncio.sleep(0.2)
-        
+        finalization_started = time.monotonic()
+        await TIMELINE.run('finalization', MACROS)
+        TRACER.record('phase.finalization', finalization_started, time.monotonic() - finalization_started)
+
+        cache_stats = get_ocr_cache_stats()
+        logging.info(f"OCR cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate).")
+        logging.info(f"Input timeline: worst event lateness {TIMELINE.max_lateness * 1000:.1f}ms.")
+        if NAVIGATOR is not None:
+            logging.info(f"Menu navigation: {NAVIGATOR.presses} presses, {NAVIGATOR.replans} re-plans after unexpected screens.")
+        logging.info(f"OCR worker: {OCR.completed} reads, {OCR.dropped} stale requests dropped.")
+        if RECOGNIZER is not None:
+            logging.info(f"OCR templates: {RECOGNIZER.hits} matches, {RECOGNIZER.misses} fallbacks to EasyOCR, {len(RECOGNIZER)} templates known.")
         logging.info("Script finished.")
+    except asyncio.CancelledError:
+        if WATCHDOG and WATCHDOG.event:
+            logging.error(f"Stopping: {WATCHDOG.event.message}")
+            sys.exit(1)
+        raise
     finally:
+        if WATCHDOG:
+            await WATCHDOG.stop()
+        if OCR:
+            OCR.stop()
+        if ASSETS:
+            await ASSETS.flush()
+            ASSETS.close()
+        if SPLITTER:
+            logging.info("Waiting for motion clips to be split...")
+            await SPLITTER.wait()
+            SPLITTER.close()
+        if MANIFEST:
+            # Folds the assets recorded since the last team into manifest.json.
+            MANIFEST.save()
+        if QA:
+            # Runs after the splitter so the per-team clips are checked too.
+            await QA.finish()
+            QA.close()
+        if PACKAGER:
+            await PACKAGER.finish()
+            PACKAGER.close()
+        if OBS and OBS.aio.connected:
+            await OBS.disconnect_async()
         if OBS and OBS.ws:
             OBS.disconnect()
+        if TRACER.enabled:
+            TRACER.log_summary()
+            TRACER.close()
 
 if __name__ == "__main__":
+    # Needed for the clip splitter's process pool in PyInstaller builds.
+    multiprocessing.freeze_support()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
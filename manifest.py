@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ASSET_KINDS = ('screenshot', 'motion')
+PLAYERS_PER_TEAM = 23
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class CaptureManifest:
+    # Per-team/per-player record of the captured screenshot and motion clip, with
+    # file sizes and SHA-256 hashes, kept as JSON next to the output folders.
+    # Each recorded asset is appended as one line to a journal next to the JSON,
+    # so recording stays cheap however many assets there are; the journal is
+    # folded into the JSON when the manifest is loaded or verified.
+    # Assets are recorded from the writer threads, so all access is locked.
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self._lock = threading.Lock()
+        self.data = {'version': 1, 'teams': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.data = json.load(f)
+                logger.info(f"Loaded capture manifest {path} ({len(self.data.get('teams', {}))} teams).")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read capture manifest {path}, starting a new one: {e}")
+        if os.path.exists(self.journal_path):
+            replayed = self._replay_journal()
+            logger.info(f"Replayed {replayed} assets from {self.journal_path}.")
+            self.save()
+
+    def _store_locked(self, team_name, team_id, player_id, kind, entry):
+        team = self.data['teams'].setdefault(team_name, {'team_id': team_id, 'players': {}})
+        team['players'].setdefault(player_id, {})[kind] = entry
+
+    def _replay_journal(self):
+        replayed = 0
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line of a run that was killed mid-write.
+                        logger.warning(f"Skipping a truncated line in {self.journal_path}.")
+                        continue
+                    self._store_locked(record['team'], record['team_id'], record['player'], record['kind'], record['entry'])
+                    replayed += 1
+        except OSError as e:
+            logger.warning(f"Could not read capture manifest journal {self.journal_path}: {e}")
+        return replayed
+
+    def _save_locked(self):
+        # Writes the whole manifest and empties the journal it now contains.
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def record_asset(self, team_name, team_id, player_id, kind, path):
+        # Hashes the file and stores it. Safe to call from worker threads.
+        entry = {
+            'path': os.path.abspath(path),
+            'size': os.path.getsize(path),
+            'sha256': file_digest(path),
+            'recorded_at': time.time(),
+        }
+        line = json.dumps({'team': team_name, 'team_id': team_id, 'player': player_id, 'kind': kind, 'entry': entry}, sort_keys=True)
+        with self._lock:
+            self._store_locked(team_name, team_id, player_id, kind, entry)
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            with open(self.journal_path, 'a') as f:
+                f.write(line + '\n')
+
+    def _entry_valid(self, entry, deep):
+        path = entry.get('path')
+        if not path or not os.path.exists(path) or os.path.getsize(path) != entry.get('size'):
+            return False
+        return not deep or file_digest(path) == entry.get('sha256')
+
+    def verify(self, deep=False):
+        # Drops every entry whose file is missing or changed on disk. With `deep`
+        # the SHA-256 of every file is checked as well, not just its size.
+        removed = 0
+        kept = 0
+        with self._lock:
+            for team in self.data['teams'].values():
+                for player in team['players'].values():
+                    for kind in list(player.keys()):
+                        if self._entry_valid(player[kind], deep):
+                            kept += 1
+                        else:
+                            removed += 1
+                            del player[kind]
+            self._save_locked()
+        logger.info(f"Capture manifest verified: {kept} assets on disk, {removed} missing or changed.")
+        return kept, removed
+
+    def player_complete(self, team_name, player_id):
+        with self._lock:
+            player = self.data['teams'].get(team_name, {}).get('players', {}).get(player_id, {})
+            return all(kind in player for kind in ASSET_KINDS)
+
+    def team_complete(self, team_name, players=PLAYERS_PER_TEAM):
+        return all(self.player_complete(team_name, f"{i+1:02d}") for i in range(players))
+
+    def incomplete_players(self, team_name, players=PLAYERS_PER_TEAM):
+        return [f"{i+1:02d}" for i in range(players) if not self.player_complete(team_name, f"{i+1:02d}")]
@@ -0,0 +1,334 @@
+import collections
+import logging
+import time
+
+from timeline import check_control, MacroError, TimelineEvent, TimelineSegment
+from timing import TRACER, span
+
+logger = logging.getLogger(__name__)
+
+# Where the menus are: the current screen and the cursor of every list screen,
+# in MenuModel.lists order. A cursor is None when it is not known.
+MenuState = collections.namedtuple('MenuState', ['screen', 'cursors'])
+# One input of a planned path and the state it should lead to. `link` is the
+# link taken, or None for a cursor move.
+MenuStep = collections.namedtuple('MenuStep', ['control', 'state', 'link'])
+# A press that changes screens, possibly only from one cursor position (`item`).
+MenuLink = collections.namedtuple('MenuLink', ['control', 'target', 'item'])
+
+class MenuModelError(MacroError):
+    pass
+
+class MenuScreen:
+    def __init__(self, name, config):
+        self.name = name
+        self.items = config.get('items', 0)
+        self.wrap = config.get('wrap', False)
+        # 'reset': the cursor is on `start` every time the screen opens.
+        # 'keep': the game remembers where it was left.
+        self.cursor = config.get('cursor', 'reset')
+        self.start = config.get('start', 0)
+        if self.cursor not in ('reset', 'keep'):
+            raise MenuModelError(f"Menu screen '{name}': cursor must be 'reset' or 'keep', got {self.cursor!r}.")
+        default_moves = {'DPAD_DOWN': 1, 'DPAD_UP': -1} if self.items else {}
+        # Cursor moves by control, e.g. {DPAD_DOWN: 1, RB: 5} for a shoulder button that pages.
+        self.moves = {check_control(control): step for control, step in (config.get('moves') or default_moves).items()}
+        self.links = []
+        for link in config.get('links') or []:
+            item = link.get('item')
+            if item is not None and not 0 <= item < self.items:
+                raise MenuModelError(f"Menu screen '{name}': link item {item} is outside its {self.items} items.")
+            self.links.append(MenuLink(check_control(link['press']), link['to'], item))
+        # Keyword arguments for the wait after a link into this screen.
+        self.settle = dict(config.get('settle') or {})
+        # Canvas region that tells this screen apart from the others; None for the whole frame.
+        self.identity = config.get('identity')
+
+    def move(self, cursor, step):
+        if self.wrap:
+            return (cursor + step) % self.items
+        return min(max(cursor + step, 0), self.items - 1)
+
+class MenuModel:
+    # The game's menus around the player list as a graph: screens with their
+    # items and cursor behaviour, cursor moves, and the links between screens.
+    # Built from the `menu` section of config.yaml.
+    def __init__(self, config):
+        screens = config.get('screens') or {}
+        if not screens:
+            raise MenuModelError("The menu model has no screens.")
+        self.screens = {name: MenuScreen(name, screen or {}) for name, screen in screens.items()}
+        for screen in self.screens.values():
+            for link in screen.links:
+                if link.target not in self.screens:
+                    raise MenuModelError(f"Menu screen '{screen.name}' links to unknown screen '{link.target}'.")
+        self.lists = tuple(name for name, screen in self.screens.items() if screen.items)
+        self.back = check_control(config.get('back', 'B'))
+        self.hold = config.get('hold', 0.16)
+        self.gap = config.get('gap', 0.25)
+        self.identity_threshold = config.get('identity_threshold', 8.0)
+
+    def initial_state(self, screen):
+        # Every list at its start position, as when the game opens the menus.
+        return MenuState(screen, tuple(self.screens[name].start for name in self.lists))
+
+    def cursor(self, state, screen=None):
+        screen = screen or state.screen
+        return state.cursors[self.lists.index(screen)] if screen in self.lists else None
+
+    def with_cursor(self, state, screen, cursor):
+        cursors = list(state.cursors)
+        cursors[self.lists.index(screen)] = cursor
+        return state._replace(cursors=tuple(cursors))
+
+    def steps(self, state):
+        # Every (control, link, next state) possible from `state`.
+        screen = self.screens[state.screen]
+        cursor = self.cursor(state)
+        if cursor is not None:
+            for control, step in screen.moves.items():
+                yield control, None, self.with_cursor(state, screen.name, screen.move(cursor, step))
+        for link in screen.links:
+            if link.item is not None and link.item != cursor:
+                continue
+            yield link.control, link, self.opened(state, link.target, back=link.control == self.back)
+
+    def opened(self, state, screen, back=False):
+        # The state once `screen` opens: a 'reset' list starts over, unless it is
+        # only being returned to with the back button.
+        target = self.screens[screen]
+        state = state._replace(screen=screen)
+        if target.items and target.cursor == 'reset' and not back:
+            state = self.with_cursor(state, screen, target.start)
+        return state
+
+    def shortest_path(self, state, screen, cursors=None):
+        # Breadth-first search for the fewest inputs from `state` to `screen` with
+        # the given {screen: cursor} positions. None if it cannot be reached, e.g.
+        # because a cursor on the way is unknown.
+        cursors = cursors or {}
+
+        def reached(candidate):
+            return candidate.screen == screen and all(self.cursor(candidate, name) == cursor for name, cursor in cursors.items())
+
+        if reached(state):
+            return []
+        previous = {state: None}
+        queue = collections.deque([state])
+        while queue:
+            current = queue.popleft()
+            for control, link, following in self.steps(current):
+                if following in previous:
+                    continue
+                previous[following] = (current, MenuStep(control, following, link))
+                if reached(following):
+                    path = []
+                    while previous[following] is not None:
+                        following, step = previous[following]
+                        path.append(step)
+                    return path[::-1]
+                queue.append(following)
+        return None
+
+class MenuNavigator:
+    # Moves through the menus along the model's shortest paths and checks the
+    # screen after every link: a link that changed nothing was dropped and is
+    # sent again; a link that led somewhere unexpected is backed out of and the
+    # path is planned again from the screen actually seen. Screens are told
+    # apart by comparing a region with the frame seen on the first visit (per
+    # cursor position for lists).
+    def __init__(self, model, runner, obs, max_replans=4):
+        self.model = model
+        self.runner = runner
+        self.obs = obs
+        self.max_replans = max_replans
+        self.state = None
+        self.references = {}
+        self.presses = 0
+        self.replans = 0
+
+    def enter(self, screen):
+        # The caller has just opened `screen` (e.g. a team's player list); other
+        # screens keep the cursors seen so far.
+        if self.state is None:
+            self.state = self.model.initial_state(screen)
+            return
+        self.state = self.model.opened(self.state, screen)
+
+    def _segments(self, controls):
+        events = []
+        offset = 0.0
+        for control in controls:
+            events.append(TimelineEvent(offset, 'down', control))
+            events.append(TimelineEvent(offset + self.model.hold, 'up', control))
+            offset += self.model.hold + self.model.gap
+        return [TimelineSegment(events, offset, None)]
+
+    async def _press(self, controls):
+        if controls:
+            self.presses += len(controls)
+            await self.runner.run_segments(self._segments(controls))
+
+    def _fingerprint(self, frame, screen):
+        region = self.model.screens[screen].identity
+        if region is not None:
+            # Regions are canvas coordinates, like the OCR regions.
+            region = self.obs.scale_regions({screen: region})[screen]
+        return self.obs.region_fingerprint(frame, region)
+
+    def _key(self, state):
+        # A list looks different with its cursor elsewhere, so each position has its own reference.
+        return state.screen, self.model.cursor(state)
+
+    def _matches(self, frame, key):
+        if key not in self.references or frame is None:
+            return None
+        difference = self.obs.fingerprint_difference(self._fingerprint(frame, key[0]), self.references[key])
+        return difference <= self.model.identity_threshold
+
+    def _identify(self, frame):
+        # The known (screen, cursor) the frame looks most like, or None.
+        best = None
+        fingerprints = {}
+        for key, reference in self.references.items():
+            screen = key[0]
+            if screen not in fingerprints:
+                fingerprints[screen] = self._fingerprint(frame, screen)
+            difference = self.obs.fingerprint_difference(fingerprints[screen], reference)
+            if difference <= self.model.identity_threshold and (best is None or difference < best[0]):
+                best = (difference, key)
+        return best[1] if best else None
+
+    def _describe(self, key):
+        screen, cursor = key
+        return f"the '{screen}' screen" + (f" on item {cursor}" if cursor is not None else '')
+
+    async def _settle(self, screen, reference):
+        # (changed, frame) after a link into `screen`.
+        settle = self.model.screens[screen].settle
+        changed = await self.obs.wait_for_change(timeout=settle.get('change_timeout', 0.5), reference=reference)
+        if changed is None:
+            return False, await self.obs.get_frame_async()
+        frame = await self.obs.wait_for_stable(timeout=settle.get('settle_timeout', 1.0), stable_time=settle.get('stable_time', 0.15))
+        return True, frame
+
+    async def _home(self, screen):
+        # Puts a cursor that was lost back on a known position: without
+        # wrap-around, enough presses towards the top always end on the first item.
+        menu_screen = self.model.screens[screen]
+        if not menu_screen.moves:
+            raise RuntimeError(f"Lost the cursor on the '{screen}' screen, which has no cursor moves.")
+        if menu_screen.wrap:
+            await self._probe(screen)
+            return
+        control = min(menu_screen.moves, key=lambda control: menu_screen.moves[control])
+        presses = -(-(menu_screen.items - 1) // abs(menu_screen.moves[control]))
+        logger.info(f"Menu: moving the '{screen}' cursor back to the top ({presses} x {control}).")
+        await self._press([control] * presses)
+        self.state = self.model.with_cursor(self.state, screen, 0)
+
+    async def _probe(self, screen):
+        # A wrapping list has no top to run into: try an item's link from every
+        # position until it opens the screen it leads to, which must have been
+        # seen before.
+        menu_screen = self.model.screens[screen]
+        link = found = None
+        for candidate in menu_screen.links:
+            if candidate.item is not None:
+                state = self.model.with_cursor(self.state, screen, candidate.item)
+                state = self.model.opened(state, candidate.target, back=candidate.control == self.model.back)
+                if self._key(state) in self.references:
+                    link, found = candidate, state
+                    break
+        control = next((control for control, step in menu_screen.moves.items() if step == 1), None)
+        if link is None or control is None:
+            raise RuntimeError(f"Lost the cursor on the '{screen}' screen, which wraps around; cannot find it again.")
+        logger.info(f"Menu: probing for the '{screen}' cursor with {link.control}.")
+        for offset in range(menu_screen.items):
+            reference = await self.obs.get_frame_async()
+            await self._press([link.control])
+            changed, frame = await self._settle(link.target, reference)
+            if changed and self._matches(frame, self._key(found)):
+                # Found: we are now past the link, and the cursor was on its item.
+                self.state = found
+                return
+            if changed:
+                await self._press([self.model.back])
+                await self._settle(screen, frame)
+            await self._press([control])
+        raise RuntimeError(f"Could not find the '{screen}' cursor after trying all {menu_screen.items} items.")
+
+    async def _follow(self, path):
+        # Plays a path up to its first link that did not end where planned.
+        moves = []
+        for step in path:
+            if step.link is None:
+                moves.append(step.control)
+                self.state = step.state
+                continue
+            await self._press(moves)
+            moves = []
+            reference = await self.obs.get_frame_async()
+            await self._press([step.control])
+            changed, frame = await self._settle(step.link.target, reference)
+            if not changed:
+                logger.warning(f"Menu: {step.control} on '{self.state.screen}' changed nothing; sending it again.")
+                return False
+            expected = self._key(step.state)
+            matches = self._matches(frame, expected)
+            seen = self._identify(frame) if frame is not None and not matches else None
+            if matches is None and frame is not None and (seen is None or seen[0] == expected[0]):
+                # First visit: remember what this screen looks like, unless its cursor is lost.
+                # Neighbouring items of a long list can look alike, so a close match
+                # with another item is not taken as a wrong cursor here.
+                if expected[1] is not None or expected[0] not in self.model.lists:
+                    self.references[expected] = self._fingerprint(frame, expected[0])
+                matches = True
+            if matches:
+                self.state = step.state
+                continue
+            source = self.state.screen
+            logger.warning(f"Menu: expected {self._describe(expected)} after {step.control} on '{source}', "
+                           f"found {self._describe(seen) if seen else 'an unknown screen'}.")
+            if step.link.item is not None:
+                # The cursor was not where it was thought to be.
+                self.state = self.model.with_cursor(self.state, source, None)
+            if seen is not None:
+                self.state = self.state._replace(screen=seen[0])
+                if seen[1] is not None:
+                    self.state = self.model.with_cursor(self.state, seen[0], seen[1])
+            else:
+                reference = frame
+                await self._press([self.model.back])
+                await self._settle(source, reference)
+            return False
+        await self._press(moves)
+        return True
+
+    async def goto(self, screen, cursors=None):
+        started = time.monotonic()
+        with span('menu.goto', screen=screen):
+            for _ in range(self.max_replans + 1):
+                if self.state.screen in self.model.lists and self.model.cursor(self.state) is None:
+                    await self._home(self.state.screen)
+                path = self.model.shortest_path(self.state, screen, cursors)
+                if path is None:
+                    # A cursor on the way was lost: go to that screen first and find it again.
+                    lost = [name for name in self.model.lists if self.model.cursor(self.state, name) is None]
+                    path = next((detour for detour in (self.model.shortest_path(self.state, name) for name in lost) if detour is not None), None)
+                    if path is None:
+                        raise RuntimeError(f"No way from the '{self.state.screen}' screen to '{screen}' {cursors or ''} in the menu model.")
+                    await self._follow(path)
+                    self.replans += 1
+                    continue
+                if await self._follow(path):
+                    TRACER.record('menu.path', started, time.monotonic() - started, presses=len(path))
+                    return
+                self.replans += 1
+        raise RuntimeError(f"Could not reach the '{screen}' screen after {self.max_replans} re-plans.")
+
+def menu_model_from_config(config):
+    menu_config = config.get('menu') or {}
+    if not menu_config.get('enabled', False) or not menu_config.get('screens'):
+        return None
+    return MenuModel(menu_config)
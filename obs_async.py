@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# obs-websocket v5 opcodes
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+
+# Event subscription flags (see the obs-websocket v5 protocol description)
+EVENT_GENERAL = 1 << 0
+EVENT_SCENES = 1 << 2
+EVENT_OUTPUTS = 1 << 6
+DEFAULT_EVENT_SUBSCRIPTIONS = EVENT_GENERAL | EVENT_SCENES | EVENT_OUTPUTS
+
+RPC_VERSION = 1
+
+class OBSRequestError(Exception):
+    def __init__(self, request_type, code, comment):
+        super().__init__(f"{request_type} failed with code {code}: {comment}")
+        self.request_type = request_type
+        self.code = code
+        self.comment = comment
+
+def authentication_string(password, salt, challenge):
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode()).digest()).decode()
+    return base64.b64encode(hashlib.sha256((secret + challenge).encode()).digest()).decode()
+
+class AsyncOBSConnection:
+    # Native asyncio client for the obs-websocket v5 protocol. Any number of
+    # requests can be in flight at once; responses are matched to callers by
+    # request ID, and events are dispatched to subscribers and waiters.
+    def __init__(self, host="localhost", port=4455, password="", event_subscriptions=DEFAULT_EVENT_SUBSCRIPTIONS):
+        self.url = f"ws://{host}:{port}"
+        self.password = password
+        self.event_subscriptions = event_subscriptions
+        self.obs_websocket_version = None
+        self._ws = None
+        self._reader = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._subscribers = {}
+        self._waiters = []
+
+    @property
+    def connected(self):
+        return self._reader is not None and not self._reader.done()
+
+    async def connect(self):
+        self._ws = await websockets.connect(self.url, subprotocols=['obswebsocket.json'], max_size=None)
+        try:
+            await self._identify()
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError(f"OBS closed the connection during identification (wrong password?): {e}") from e
+        self._reader = asyncio.create_task(self._read_messages())
+        logger.info(f"Connected to obs-websocket {self.obs_websocket_version} at {self.url}")
+
+    async def _identify(self):
+        hello = json.loads(await self._ws.recv())
+        if hello.get('op') != OP_HELLO:
+            raise ConnectionError(f"Expected Hello from OBS, got op {hello.get('op')}")
+        hello_data = hello['d']
+        self.obs_websocket_version = hello_data.get('obsWebSocketVersion')
+
+        identify = {'rpcVersion': RPC_VERSION, 'eventSubscriptions': self.event_subscriptions}
+        auth = hello_data.get('authentication')
+        if auth:
+            identify['authentication'] = authentication_string(self.password, auth['salt'], auth['challenge'])
+        await self._ws.send(json.dumps({'op': OP_IDENTIFY, 'd': identify}))
+
+        identified = json.loads(await self._ws.recv())
+        if identified.get('op') != OP_IDENTIFIED:
+            raise ConnectionError(f"OBS did not accept the identification (op {identified.get('op')})")
+
+    async def disconnect(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            try:
+                await self._reader
+            except Exception:
+                pass
+        self._ws = None
+        self._reader = None
+
+    async def _read_messages(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                op = message.get('op')
+                data = message.get('d', {})
+                if op == OP_REQUEST_RESPONSE:
+                    future = self._pending.pop(data.get('requestId'), None)
+                    if future is not None and not future.done():
+                        future.set_result(data)
+                elif op == OP_EVENT:
+                    self._dispatch_event(data.get('eventType'), data.get('eventData') or {})
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            error = ConnectionError("Connection to OBS closed")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            for _, _, future in self._waiters:
+                if not future.done():
+                    future.set_exception(error)
+            self._waiters.clear()
+
+    def _dispatch_event(self, event_type, event_data):
+        for callback in list(self._subscribers.get(event_type, [])):
+            try:
+                callback(event_data)
+            except Exception as e:
+                logger.error(f"Error in OBS event handler for {event_type}: {e}")
+        remaining = []
+        for waiter_type, predicate, future in self._waiters:
+            if future.done():
+                continue
+            if waiter_type == event_type and (predicate is None or predicate(event_data)):
+                future.set_result(event_data)
+            else:
+                remaining.append((waiter_type, predicate, future))
+        self._waiters = remaining
+
+    def subscribe(self, event_type, callback):
+        self._subscribers.setdefault(event_type, []).append(callback)
+
+    def unsubscribe(self, event_type, callback):
+        callbacks = self._subscribers.get(event_type, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def expect_event(self, event_type, predicate=None):
+        # Registers interest in an event before the request that triggers it is
+        # sent, so the event cannot be missed. Returns a future with the event data.
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((event_type, predicate, future))
+        return future
+
+    async def wait_for_event(self, event_type, predicate=None, timeout=None):
+        return await asyncio.wait_for(self.expect_event(event_type, predicate), timeout)
+
+    async def call(self, request_type, request_data=None, timeout=30.0):
+        if not self.connected:
+            raise ConnectionError("Not connected to OBS")
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {'op': OP_REQUEST, 'd': {'requestType': request_type, 'requestId': request_id}}
+        if request_data:
+            message['d']['requestData'] = request_data
+        try:
+            await self._ws.send(json.dumps(message))
+            response = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        status = response.get('requestStatus', {})
+        if not status.get('result'):
+            raise OBSRequestError(request_type, status.get('code'), status.get('comment'))
+        return response.get('responseData') or {}
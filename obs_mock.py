@@ -0,0 +1,217 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+import uuid
+
+import cv2
+import numpy as np
+import websockets
+
+from obs_async import (
+    EVENT_OUTPUTS,
+    OP_EVENT,
+    OP_HELLO,
+    OP_IDENTIFIED,
+    OP_IDENTIFY,
+    OP_REQUEST,
+    OP_REQUEST_RESPONSE,
+    RPC_VERSION,
+    authentication_string,
+)
+
+logger = logging.getLogger(__name__)
+
+# obs-websocket v5 request status codes used by the mock
+STATUS_SUCCESS = 100
+STATUS_UNKNOWN_REQUEST_TYPE = 204
+STATUS_OUTPUT_RUNNING = 500
+STATUS_OUTPUT_NOT_RUNNING = 501
+CLOSE_AUTHENTICATION_FAILED = 4009
+
+def blank_frame(width=1920, height=1080):
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+class MockOBSServer:
+    # A local stand-in for OBS that speaks the obs-websocket v5 protocol, for
+    # exercising the client code without OBS. Requests are handled concurrently,
+    # each after `request_latency` (or a per-request-type latency), so responses
+    # can arrive out of order just like with a busy OBS.
+    def __init__(self, host="127.0.0.1", port=0, password="", scene_name="Scene", frame_source=blank_frame,
+                 request_latency=0.0, latency_by_request=None, record_finalize_delay=0.2, record_extension='.mkv'):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.scene_name = scene_name
+        self.frame_source = frame_source
+        self.request_latency = request_latency
+        self.latency_by_request = latency_by_request or {}
+        self.record_finalize_delay = record_finalize_delay
+        self.record_extension = record_extension
+        self.record_directory = os.getcwd()
+        self.recording = False
+        self.record_started = None
+        self.requests = []
+        self._server = None
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port, subprotocols=['obswebsocket.json'])
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Mock OBS listening on ws://{self.host}:{self.port}")
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle(self, websocket, path=None):
+        hello = {'obsWebSocketVersion': '5.0.0-mock', 'rpcVersion': RPC_VERSION}
+        salt = challenge = None
+        if self.password:
+            salt, challenge = uuid.uuid4().hex, uuid.uuid4().hex
+            hello['authentication'] = {'salt': salt, 'challenge': challenge}
+        await websocket.send(json.dumps({'op': OP_HELLO, 'd': hello}))
+
+        identify = json.loads(await websocket.recv())
+        if identify.get('op') != OP_IDENTIFY:
+            await websocket.close()
+            return
+        data = identify.get('d', {})
+        if self.password and data.get('authentication') != authentication_string(self.password, salt, challenge):
+            await websocket.close(code=CLOSE_AUTHENTICATION_FAILED, reason="Authentication failed.")
+            return
+        client = {'ws': websocket, 'subscriptions': data.get('eventSubscriptions', 0)}
+        await websocket.send(json.dumps({'op': OP_IDENTIFIED, 'd': {'negotiatedRpcVersion': RPC_VERSION}}))
+
+        tasks = set()
+        try:
+            async for raw in websocket:
+                message = json.loads(raw)
+                if message.get('op') == OP_REQUEST:
+                    task = asyncio.create_task(self._respond(client, message['d']))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _respond(self, client, request):
+        request_type = request.get('requestType')
+        self.requests.append(request_type)
+        await asyncio.sleep(self.latency_by_request.get(request_type, self.request_latency))
+        handler = getattr(self, f"_request_{request_type}", None)
+        if handler is None:
+            code, response_data = STATUS_UNKNOWN_REQUEST_TYPE, None
+        else:
+            code, response_data = await handler(client, request.get('requestData') or {})
+        status = {'result': code == STATUS_SUCCESS, 'code': code}
+        if code != STATUS_SUCCESS:
+            status['comment'] = f"Mock OBS could not handle {request_type}."
+        payload = {'requestType': request_type, 'requestId': request.get('requestId'), 'requestStatus': status}
+        if response_data is not None:
+            payload['responseData'] = response_data
+        try:
+            await client['ws'].send(json.dumps({'op': OP_REQUEST_RESPONSE, 'd': payload}))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _emit(self, client, event_type, event_data, intent):
+        if not client['subscriptions'] & intent:
+            return
+        message = {'op': OP_EVENT, 'd': {'eventType': event_type, 'eventIntent': intent, 'eventData': event_data}}
+        try:
+            await client['ws'].send(json.dumps(message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _request_GetVersion(self, client, data):
+        return STATUS_SUCCESS, {'obsVersion': 'mock', 'obsWebSocketVersion': '5.0.0-mock', 'rpcVersion': RPC_VERSION}
+
+    async def _request_GetCurrentProgramScene(self, client, data):
+        return STATUS_SUCCESS, {'currentProgramSceneName': self.scene_name, 'sceneName': self.scene_name}
+
+    async def _request_GetVideoSettings(self, client, data):
+        height, width = self.frame_source().shape[:2]
+        return STATUS_SUCCESS, {'baseWidth': width, 'baseHeight': height, 'outputWidth': width, 'outputHeight': height,
+                                'fpsNumerator': 60, 'fpsDenominator': 1}
+
+    async def _request_GetSourceScreenshot(self, client, data):
+        frame = self.frame_source()
+        width, height = data.get('imageWidth'), data.get('imageHeight')
+        if width or height:
+            source_height, source_width = frame.shape[:2]
+            width = width or round(source_width * height / source_height)
+            height = height or round(source_height * width / source_width)
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        image_format = data.get('imageFormat', 'png')
+        params = []
+        quality = data.get('imageCompressionQuality', -1)
+        if image_format in ('jpg', 'jpeg') and quality >= 0:
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        ok, encoded = cv2.imencode(f".{'jpg' if image_format == 'jpeg' else image_format}", frame, params)
+        mime = 'jpeg' if image_format in ('jpg', 'jpeg') else image_format
+        image_data = f"data:image/{mime};base64," + base64.b64encode(encoded.tobytes()).decode()
+        return STATUS_SUCCESS, {'imageData': image_data}
+
+    async def _request_GetRecordDirectory(self, client, data):
+        return STATUS_SUCCESS, {'recordDirectory': self.record_directory}
+
+    async def _request_SetRecordDirectory(self, client, data):
+        self.record_directory = data['recordDirectory']
+        return STATUS_SUCCESS, None
+
+    async def _request_GetRecordStatus(self, client, data):
+        duration = int((time.monotonic() - self.record_started) * 1000) if self.recording else 0
+        return STATUS_SUCCESS, {'outputActive': self.recording, 'outputPaused': False, 'outputDuration': duration}
+
+    async def _request_StartRecord(self, client, data):
+        if self.recording:
+            return STATUS_OUTPUT_RUNNING, None
+        self.recording = True
+        self.record_started = time.monotonic()
+        await self._emit(client, 'RecordStateChanged', {'outputActive': False, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STARTING', 'outputPath': None}, EVENT_OUTPUTS)
+        await self._emit(client, 'RecordStateChanged', {'outputActive': True, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STARTED', 'outputPath': None}, EVENT_OUTPUTS)
+        return STATUS_SUCCESS, None
+
+    async def _request_StopRecord(self, client, data):
+        if not self.recording:
+            return STATUS_OUTPUT_NOT_RUNNING, None
+        self.recording = False
+        await self._emit(client, 'RecordStateChanged', {'outputActive': False, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STOPPING', 'outputPath': None}, EVENT_OUTPUTS)
+        # Simulate OBS finalizing the container before it answers.
+        await asyncio.sleep(self.record_finalize_delay)
+        os.makedirs(self.record_directory, exist_ok=True)
+        output_path = os.path.join(self.record_directory, time.strftime('%Y-%m-%d %H-%M-%S') + f"-{uuid.uuid4().hex[:6]}{self.record_extension}")
+        with open(output_path, 'wb') as f:
+            f.write(b'mock recording')
+        await self._emit(client, 'RecordStateChanged', {'outputActive': False, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STOPPED', 'outputPath': output_path}, EVENT_OUTPUTS)
+        return STATUS_SUCCESS, {'outputPath': output_path}
+
+async def _serve_forever(port, password):
+    async with MockOBSServer(port=port, password=password):
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a mock obs-websocket v5 server.")
+    parser.add_argument("--port", type=int, default=4455)
+    parser.add_argument("--password", default="")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(_serve_forever(args.port, args.password))
+    except KeyboardInterrupt:
+        pass
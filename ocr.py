@@ -1,60 +1,287 @@
+import asyncio
+import collections
+import hashlib
 import logging
+import os
+import threading
+import time
 import cv2
+import numpy as np
 
-def fuzzy_match(ocr_text, options_list, config):
-    equivalences = config.get('ocr_corrections', {}).get('character_equivalences', {})
-    
-    def get_substitution_cost(c1, c2):
+from timing import span, timed
+
+class OCRCache:
+    # Bounded LRU of recognized text keyed by a hash of the exact pixels handed
+    # to the reader, so unchanged regions between polls skip EasyOCR entirely.
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def make_key(self, region_name, image, *options):
+        # Exact pixels only: crops that differ in a few low bits can still hold
+        # different text, so they must not share a reading.
+        digest = hashlib.blake2b(np.ascontiguousarray(image).tobytes(), digest_size=16).digest()
+        return (region_name, image.shape, options, digest)
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, text):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+OCR_CACHE = OCRCache()
+
+def configure_ocr_cache(max_size):
+    OCR_CACHE.max_size = max_size
+    OCR_CACHE.clear()
+
+def get_ocr_cache_stats():
+    return OCR_CACHE.stats()
+
+class FuzzyMatcher:
+    # Matches OCR text against a fixed list of options. Built once per list: the
+    # options are lowercased and encoded up front, and candidates that can no
+    # longer beat the current best (or the threshold) are abandoned early.
+    def __init__(self, options_list, config, threshold=0.6, batch_threshold=512):
+        self.threshold = threshold
+        self.options = [option for option in options_list if option is not None]
+        self._normalized = [option.lower() for option in self.options]
+        self._exact = {}
+        for index, option_lower in enumerate(self._normalized):
+            self._exact.setdefault(option_lower, index)
+
+        equivalences = config.get('ocr_corrections', {}).get('character_equivalences', {}) or {}
+        self._equivalent_pairs = set()
+        for c1, others in equivalences.items():
+            for c2 in others or []:
+                self._equivalent_pairs.add((str(c1), str(c2)))
+                self._equivalent_pairs.add((str(c2), str(c1)))
+
+        self._batch = len(self.options) >= batch_threshold
+        if self._batch:
+            self._build_batch_tables()
+
+    def _substitution_cost(self, c1, c2):
         if c1 == c2:
             return 0
-        if equivalences.get(c1) and c2 in equivalences.get(c1):
-            return 0.1
-        if equivalences.get(c2) and c1 in equivalences.get(c2):
+        if (c1, c2) in self._equivalent_pairs:
             return 0.1
         return 1
 
-    def levenshtein_distance(s1, s2):
-        if len(s1) < len(s2):
-            return levenshtein_distance(s2, s1)
+    def _build_batch_tables(self):
+        alphabet = set(''.join(self._normalized))
+        for c1, c2 in self._equivalent_pairs:
+            alphabet.update((c1, c2))
+        self._codes = {c: i for i, c in enumerate(sorted(alphabet))}
+        unknown = len(self._codes)
+        # Row/column `unknown` stands for any character that no option contains.
+        size = unknown + 1
+        costs = np.ones((size, size), dtype=np.float64)
+        np.fill_diagonal(costs[:unknown, :unknown], 0)
+        for c1, c2 in self._equivalent_pairs:
+            if c1 != c2:
+                costs[self._codes[c1], self._codes[c2]] = 0.1
+        self._costs = costs
+        self._lengths = np.array([len(option) for option in self._normalized], dtype=np.int64)
+        max_len = int(self._lengths.max()) if len(self._lengths) else 0
+        self._option_codes = np.full((len(self._normalized), max_len), unknown, dtype=np.int64)
+        for row, option_lower in enumerate(self._normalized):
+            self._option_codes[row, :len(option_lower)] = [self._codes[c] for c in option_lower]
+
+    def _bounded_distance(self, s1, s2, limit):
+        # Levenshtein distance, or None as soon as it is certain to be >= limit.
+        # Every path through cell (i, j) costs at least |i - j|, so only a band of
+        # width `limit` around the diagonal is computed.
+        if abs(len(s1) - len(s2)) >= limit:
+            return None
         if len(s2) == 0:
             return len(s1)
-        previous_row = range(len(s2) + 1)
+        band = int(limit) + 1
+        infinity = float('inf')
+        previous_row = list(range(len(s2) + 1))
         for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
+            lo = max(0, i - band)
+            hi = min(len(s2), i + band + 1)
+            current_row = [infinity] * (len(s2) + 1)
+            current_row[0] = i + 1 if lo == 0 else infinity
+            row_min = current_row[0]
+            for j in range(lo, hi):
                 insertions = previous_row[j + 1] + 1
                 deletions = current_row[j] + 1
-                substitutions = previous_row[j] + get_substitution_cost(c1, c2)
-                current_row.append(min(insertions, deletions, substitutions))
+                substitutions = previous_row[j] + self._substitution_cost(c1, s2[j])
+                value = min(insertions, deletions, substitutions)
+                current_row[j + 1] = value
+                if value < row_min:
+                    row_min = value
+            if row_min >= limit:
+                return None
             previous_row = current_row
         return previous_row[-1]
 
-    ocr_text_lower = ocr_text.lower()
-    
-    best_match = None
-    highest_similarity = 0
+    def _match_sequential(self, ocr_text_lower):
+        best_index = None
+        highest_similarity = self.threshold
+        for index, option_lower in enumerate(self._normalized):
+            max_len = max(len(ocr_text_lower), len(option_lower))
+            if max_len == 0:
+                similarity = 1.0
+            else:
+                # Largest distance that could still beat the current best, with a
+                # little slack so float rounding never prunes a real winner.
+                limit = (1.0 - highest_similarity) * max_len + 1e-9
+                distance = self._bounded_distance(ocr_text_lower, option_lower, limit)
+                if distance is None:
+                    continue
+                similarity = 1.0 - (distance / max_len)
+            if similarity > highest_similarity:
+                highest_similarity = similarity
+                best_index = index
+        return best_index
 
-    for option in options_list:
-        if option is None:
-            continue
-        option_lower = option.lower()
-        distance = levenshtein_distance(ocr_text_lower, option_lower)
-        max_len = max(len(ocr_text_lower), len(option_lower))
-        if max_len == 0:
-            similarity = 1.0
+    def _match_batch(self, ocr_text_lower):
+        unknown = len(self._codes)
+        query = np.array([self._codes.get(c, unknown) for c in ocr_text_lower], dtype=np.int64)
+        query_len = len(query)
+        max_lens = np.maximum(self._lengths, query_len)
+        # Largest distance that can still clear the threshold, per option.
+        limits = (1.0 - self.threshold) * max_lens + 1e-9
+        distances = np.full(len(self._normalized), np.inf)
+        active = np.flatnonzero(np.abs(self._lengths - query_len) < limits)
+        if query_len == 0:
+            distances[active] = self._lengths[active]
+            active = active[:0]
+        empty = active[self._lengths[active] == 0]
+        distances[empty] = query_len
+        active = active[self._lengths[active] > 0]
+
+        # One DP row per remaining option, advanced over the options' characters in
+        # lockstep; options whose row minimum exceeds their limit are dropped.
+        previous_row = np.tile(np.arange(query_len + 1, dtype=np.float64), (len(active), 1))
+        i = 0
+        while len(active):
+            current_row = np.empty_like(previous_row)
+            current_row[:, 0] = i + 1
+            substitution_costs = self._costs[self._option_codes[active, i]][:, query]
+            for j in range(1, query_len + 1):
+                current_row[:, j] = np.minimum(
+                    np.minimum(previous_row[:, j] + 1, current_row[:, j - 1] + 1),
+                    previous_row[:, j - 1] + substitution_costs[:, j - 1])
+            finished = self._lengths[active] == i + 1
+            distances[active[finished]] = current_row[finished, query_len]
+            keep = ~finished & (current_row.min(axis=1) < limits[active])
+            active = active[keep]
+            previous_row = current_row[keep]
+            i += 1
+
+        similarities = np.where(max_lens == 0, 1.0, 1.0 - distances / np.maximum(max_lens, 1))
+        best_index = int(np.argmax(similarities))
+        if similarities[best_index] > self.threshold:
+            return best_index
+        return None
+
+    def exact(self, ocr_text):
+        index = self._exact.get(ocr_text.lower())
+        return self.options[index] if index is not None else None
+
+    @timed('ocr.fuzzy_match')
+    def match(self, ocr_text):
+        if not self.options:
+            return None
+        ocr_text_lower = ocr_text.lower()
+        exact_index = self._exact.get(ocr_text_lower)
+        if exact_index is not None:
+            return self.options[exact_index]
+        if self._batch:
+            best_index = self._match_batch(ocr_text_lower)
         else:
-            similarity = 1.0 - (distance / max_len)
+            best_index = self._match_sequential(ocr_text_lower)
+        return self.options[best_index] if best_index is not None else None
 
-        if similarity > highest_similarity:
-            highest_similarity = similarity
-            best_match = option
-    
-    if highest_similarity > 0.6:
-        return best_match
+_FUZZY_MATCHERS = collections.OrderedDict()
+
+def get_fuzzy_matcher(options_list, config):
+    # Catalog lists (helpers.NameIndex) are tuples with a cached hash, so the
+    # lookup does not rebuild and rehash the whole list on every read.
+    key = (options_list if isinstance(options_list, tuple) else tuple(options_list), id(config))
+    matcher = _FUZZY_MATCHERS.get(key)
+    if matcher is None:
+        matcher = FuzzyMatcher(options_list, config)
+        _FUZZY_MATCHERS[key] = matcher
+        while len(_FUZZY_MATCHERS) > 16:
+            _FUZZY_MATCHERS.popitem(last=False)
     else:
-        return None
+        _FUZZY_MATCHERS.move_to_end(key)
+    return matcher
+
+def fuzzy_match(ocr_text, options_list, config):
+    return get_fuzzy_matcher(options_list, config).match(ocr_text)
+
+OCR_MODES = ('detect', 'recognize')
+
+def build_allowlist(names):
+    # Every character that occurs in the given names, in both cases, so the
+    # recognizer can only produce text that could belong to a known name.
+    chars = set()
+    for name in names:
+        if not name:
+            continue
+        for c in str(name):
+            chars.add(c)
+            chars.add(c.lower())
+            chars.add(c.upper())
+    return ''.join(sorted(chars))
+
+def is_japanese_char(c):
+    return '\u3040' <= c <= '\u30ff' or '\u3400' <= c <= '\u9fff' or '\uff66' <= c <= '\uff9f'
+
+def ocr_languages(names):
+    # EasyOCR languages needed for the given names. The Japanese model is only
+    # loaded when a name actually contains kana or kanji.
+    for name in names:
+        if name and any(is_japanese_char(c) for c in str(name)):
+            return ['en', 'ja']
+    return ['en']
 
-def run_ocr_in_region(frame, x1, y1, x2, y2, ocr_reader, preprocess=False, allowlist=None, upscale=False):
+def load_easyocr_reader(languages, warmup=True):
+    # easyocr (and torch with it) is imported here so that callers can load the
+    # model on a background thread instead of at program start.
+    import easyocr
+    started = time.monotonic()
+    reader = easyocr.Reader(languages)
+    if warmup:
+        # The first inference is much slower than the next ones; get it out of the
+        # way before the first menu read.
+        blank = np.zeros((32, 128), dtype=np.uint8)
+        reader.recognize(blank, horizontal_list=[[0, 128, 0, 32]], free_list=[])
+        reader.readtext(blank)
+    logging.info(f"EasyOCR reader ({', '.join(languages)}) ready in {time.monotonic() - started:.1f}s.")
+    return reader
+
+def run_ocr_in_region(frame, x1, y1, x2, y2, ocr_reader, preprocess=False, allowlist=None, upscale=False, region_name=None, cache=None, mode='detect'):
     cropped_frame = frame[y1:y2, x1:x2]
     if cropped_frame.size == 0:
         logging.warning(f"Cannot OCR a region with zero size: {x1},{y1},{x2},{y2}")
@@ -65,20 +292,341 @@ def run_ocr_in_region(frame, x1, y1, x2, y2, ocr_reader, preprocess=False, allow
         gray = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2GRAY)
         processed_frame = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
 
+    cache_key = None
+    if cache is not None and cache.max_size > 0:
+        cache_key = cache.make_key(region_name, processed_frame, preprocess, upscale, allowlist, mode)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return cached_text
+
     frame_to_ocr = processed_frame
     if upscale:
-        scale_factor = 2
+        # True doubles the crop; a number is the factor, e.g. to bring a
+        # downscaled polling frame back to canvas size.
+        scale_factor = 2 if upscale is True else upscale
         frame_to_ocr = cv2.resize(processed_frame, (0, 0), fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
 
     easyocr_params = {}
     if allowlist:
         easyocr_params['allowlist'] = allowlist
     
-    result = ocr_reader.readtext(frame_to_ocr, **easyocr_params)
-    text = ' '.join([item[1] for item in result])
-    return text.strip()
+    if mode == 'recognize':
+        # The region already bounds the text, so skip the CRAFT detector and hand
+        # the whole crop to the recognizer as a single box.
+        if frame_to_ocr.ndim == 3:
+            frame_to_ocr = cv2.cvtColor(frame_to_ocr, cv2.COLOR_BGR2GRAY)
+        height, width = frame_to_ocr.shape[:2]
+        with span('ocr.easyocr', region=region_name, mode=mode):
+            result = ocr_reader.recognize(frame_to_ocr, horizontal_list=[[0, width, 0, height]], free_list=[], **easyocr_params)
+    else:
+        with span('ocr.easyocr', region=region_name, mode=mode):
+            result = ocr_reader.readtext(frame_to_ocr, **easyocr_params)
+    text = ' '.join([item[1] for item in result]).strip()
+    if cache_key is not None:
+        cache.put(cache_key, text)
+    return text
 
-def ocr_region(frame, region_name, ocr_regions, ocr_reader):
+def ocr_region(frame, region_name, ocr_regions, ocr_reader, config=None):
     x1, y1, x2, y2 = ocr_regions[region_name]
     preprocess = region_name in ['p1_team_select_text']
-    return run_ocr_in_region(frame, x1, y1, x2, y2, ocr_reader, preprocess=preprocess)
+    ocr_config = (config or {}).get('ocr', {})
+    mode = ocr_config.get('modes', {}).get(region_name, 'detect')
+    if mode not in OCR_MODES:
+        logging.warning(f"Unknown OCR mode '{mode}' for region '{region_name}', using 'detect'.")
+        mode = 'detect'
+    return run_ocr_in_region(frame, x1, y1, x2, y2, ocr_reader, preprocess=preprocess, allowlist=ocr_config.get('allowlist'),
+                             upscale=ocr_config.get('upscale', False), region_name=region_name, cache=OCR_CACHE, mode=mode)
+
+def crop_region(frame, region_name, ocr_regions):
+    x1, y1, x2, y2 = ocr_regions[region_name]
+    return frame[y1:y2, x1:x2]
+
+class TemplateRecognizer:
+    # Closed-vocabulary recognizer: stores a normalized, binarized crop per known
+    # name (learned from confident EasyOCR readings) and matches later crops
+    # against all of them at once with a single matrix product.
+    def __init__(self, path=None, size=(192, 24), threshold=0.9, margin=0.03):
+        self.path = path
+        self.size = size
+        self.threshold = threshold
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self._templates = {}  # region_name -> {name: (vector, count)}
+        self._matrices = {}   # region_name -> (names, matrix), rebuilt after learning
+        # learn() runs on the OCR worker thread while save() runs on the event
+        # loop, possibly while another instance's read is being learned.
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def normalize(self, crop):
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        # Text covers less of the strip than the background, so make it the foreground.
+        if cv2.countNonZero(binary) > binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        points = cv2.findNonZero(binary)
+        if points is None:
+            return None
+        x, y, w, h = cv2.boundingRect(points)
+        if w < 2 or h < 2:
+            return None
+        resized = cv2.resize(binary[y:y + h, x:x + w], self.size, interpolation=cv2.INTER_AREA)
+        # A light blur makes the correlation tolerant to one-pixel shifts of the strokes.
+        vector = cv2.GaussianBlur(resized, (5, 5), 0).astype(np.float32).ravel()
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    @timed('ocr.template')
+    def match(self, region_name, crop, options=None):
+        if region_name not in self._templates or crop.size == 0:
+            return None
+        vector = self.normalize(crop)
+        if vector is None:
+            return None
+        if region_name not in self._matrices:
+            entries = self._templates[region_name]
+            names = list(entries.keys())
+            matrix = np.stack([entries[name][0] for name in names])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrices[region_name] = (names, matrix)
+        names, matrix = self._matrices[region_name]
+        scores = matrix @ vector
+        if options is not None:
+            allowed = set(options)
+            scores = np.where([name in allowed for name in names], scores, -1.0)
+        order = np.argsort(scores)[::-1]
+        best = scores[order[0]]
+        runner_up = scores[order[1]] if len(order) > 1 else -1.0
+        if best >= self.threshold and best - runner_up >= self.margin:
+            self.hits += 1
+            return names[order[0]]
+        self.misses += 1
+        return None
+
+    def covers(self, region_name, options):
+        # Whether every option has a template: only then does the margin in
+        # match() compare the best name against all the names it could be.
+        entries = self._templates.get(region_name, {})
+        return len(entries) >= len(options) and all(name in entries for name in options)
+
+    def learn(self, region_name, name, crop):
+        vector = self.normalize(crop)
+        if vector is None:
+            return
+        with self._lock:
+            entries = self._templates.setdefault(region_name, {})
+            if name in entries:
+                previous, count = entries[name]
+                # Running mean, so a single odd frame does not replace a good template.
+                entries[name] = ((previous * count + vector) / (count + 1), min(count + 1, 20))
+            else:
+                entries[name] = (vector, 1)
+                logging.debug(f"Learned template for '{name}' in region '{region_name}'.")
+            self._matrices.pop(region_name, None)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._templates.values())
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path or not self._templates:
+            return
+        regions, names, counts, vectors = [], [], [], []
+        with self._lock:
+            for region_name, entries in self._templates.items():
+                for name, (vector, count) in entries.items():
+                    regions.append(region_name)
+                    names.append(name)
+                    counts.append(count)
+                    vectors.append(vector)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, size=np.array(self.size), regions=np.array(regions), names=np.array(names),
+                            counts=np.array(counts), vectors=np.stack(vectors))
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {len(names)} OCR templates to {path}.")
+
+    def load(self, path):
+        try:
+            data = np.load(path)
+            if tuple(data['size']) != tuple(self.size):
+                logging.warning(f"Ignoring OCR templates in {path}: template size {tuple(data['size'])} does not match {self.size}.")
+                return
+            for region_name, name, count, vector in zip(data['regions'], data['names'], data['counts'], data['vectors']):
+                self._templates.setdefault(str(region_name), {})[str(name)] = (vector.astype(np.float32), int(count))
+            self._matrices.clear()
+            logging.info(f"Loaded {len(self)} OCR templates from {path}.")
+        except Exception as e:
+            logging.warning(f"Could not load OCR templates from {path}: {e}")
+
+def read_name(frame, region_name, ocr_regions, ocr_reader, config, options, recognizer=None, clean_text=None, expected=None):
+    # Returns (matched name or None, raw text). Known templates are tried first;
+    # EasyOCR only runs when none of them is a confident match, and exact EasyOCR
+    # readings are fed back to the recognizer as new templates. Until every option
+    # has a template, a template match can be a confident wrong name (one whose
+    # look-alike was never learned), so it is only taken when it is the `expected`
+    # name, e.g. where the last burst of presses should have landed.
+    crop = None
+    if recognizer is not None:
+        crop = crop_region(frame, region_name, ocr_regions)
+        name = recognizer.match(region_name, crop, options)
+        if name is not None and (name == expected or recognizer.covers(region_name, options)):
+            return name, name
+    text = ocr_region(frame, region_name, ocr_regions, ocr_reader, config)
+    matcher = get_fuzzy_matcher(options, config)
+    # A reading that already is one of the options is taken as is: cleaning could
+    # turn a real leading 'i' or trailing '1' into a slash.
+    processed_text = text.strip()
+    name = matcher.exact(processed_text)
+    if name is None:
+        processed_text = clean_text(text) if clean_text else text
+        name = matcher.match(processed_text)
+    if recognizer is not None and name is not None and processed_text.lower() == name.lower():
+        recognizer.learn(region_name, name, crop)
+    return name, text
+
+class StaleOCRRequest(Exception):
+    pass
+
+class OCRService:
+    # Runs the OCR reader on a dedicated worker thread so inference never blocks
+    # the event loop (and with it gamepad timing and frame capture). Requests are
+    # queued per channel, usually the region name: a newer request replaces a
+    # queued one that has not started yet, whose awaiter gets StaleOCRRequest.
+    # `reader_factory` is called on the worker thread, so the model loads there.
+    def __init__(self, reader=None, reader_factory=None):
+        if reader is None and reader_factory is None:
+            raise ValueError("OCRService needs a reader or a reader factory.")
+        self._reader = reader
+        self._reader_factory = reader_factory
+        self._ready = threading.Event()
+        self._condition = threading.Condition()
+        self._requests = collections.OrderedDict()  # channel -> (function, future, loop)
+        self._thread = None
+        self._stopping = False
+        self.error = None
+        self.completed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ocr-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    async def wait_ready(self):
+        await asyncio.to_thread(self._ready.wait)
+        if self.error is not None:
+            raise RuntimeError(f"OCR reader failed to load: {self.error}")
+
+    def _load_reader(self):
+        if self._reader is None:
+            try:
+                self._reader = self._reader_factory()
+            except Exception as e:
+                logging.error(f"Could not load the OCR reader: {e}")
+                self.error = e
+        self._ready.set()
+
+    def _run(self):
+        self._load_reader()
+        while True:
+            with self._condition:
+                while not self._requests and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    pending = list(self._requests.values())
+                    self._requests.clear()
+                    break
+                _, (function, future, loop) = self._requests.popitem(last=False)
+            if future.done():
+                continue
+            try:
+                if self.error is not None:
+                    raise RuntimeError(f"OCR reader failed to load: {self.error}")
+                result = function(self._reader)
+            except Exception as e:
+                loop.call_soon_threadsafe(_settle_future, future, None, e)
+            else:
+                self.completed += 1
+                loop.call_soon_threadsafe(_settle_future, future, result, None)
+        for _, future, loop in pending:
+            loop.call_soon_threadsafe(_settle_future, future, None, StaleOCRRequest("OCR service stopped"))
+
+    def submit(self, channel, function):
+        # Schedules `function(reader)` on the worker thread. Returns a future.
+        if self._thread is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            previous = self._requests.pop(channel, None)
+            self._requests[channel] = (function, future, loop)
+            self._condition.notify()
+        if previous is not None and not previous[1].done():
+            self.dropped += 1
+            previous[1].set_exception(StaleOCRRequest(f"A newer OCR request for '{channel}' replaced this one"))
+        return future
+
+    async def ocr_region(self, frame, region_name, ocr_regions, config=None, channel=None):
+        return await self.submit(channel or region_name, lambda reader: ocr_region(frame, region_name, ocr_regions, reader, config))
+
+    async def read_name(self, frame, region_name, ocr_regions, config, options, recognizer=None, clean_text=None, channel=None, expected=None):
+        # Timed from submission, so time spent queued behind other reads counts too.
+        with span('ocr.read_name', region=region_name):
+            return await self.submit(
+                channel or region_name,
+                lambda reader: read_name(frame, region_name, ocr_regions, reader, config, options, recognizer, clean_text, expected)
+            )
+
+    def channel(self, name):
+        return OCRChannel(self, name)
+
+class OCRChannel:
+    # View of a shared OCRService for one of several bots (see coordinator.py):
+    # its requests get their own channels, so bots reading the same region do
+    # not replace each other's requests.
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+
+    @property
+    def ready(self):
+        return self.service.ready
+
+    async def wait_ready(self):
+        await self.service.wait_ready()
+
+    async def ocr_region(self, frame, region_name, ocr_regions, config=None):
+        return await self.service.ocr_region(frame, region_name, ocr_regions, config, channel=f"{self.name}:{region_name}")
+
+    async def read_name(self, frame, region_name, ocr_regions, config, options, recognizer=None, clean_text=None, expected=None):
+        return await self.service.read_name(frame, region_name, ocr_regions, config, options, recognizer, clean_text,
+                                            channel=f"{self.name}:{region_name}", expected=expected)
+
+def _settle_future(future, result, error):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from timing import timed
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tar': '.tar',
+}
+MANIFEST_FORMAT = 1
+CHUNK_SIZE = 1 << 20
+
+class HashingReader:
+    # Hashes a file while the archive copies it, so every file is read once.
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+class ZipWriter:
+    # Files are stored as they are: PNGs and videos are already compressed.
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    def add(self, name, path):
+        info = zipfile.ZipInfo.from_file(path, name)
+        info.compress_type = zipfile.ZIP_STORED
+        with open(path, 'rb') as source, self.archive.open(info, 'w', force_zip64=info.file_size >= zipfile.ZIP64_LIMIT) as target:
+            reader = HashingReader(source)
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                target.write(chunk)
+        return reader.sha256.hexdigest(), reader.size
+
+    def link(self, name, path, target_name):
+        # Zip has no links: the copy is stored again.
+        return False
+
+    def close(self):
+        self.archive.close()
+
+class TarWriter:
+    def __init__(self, path):
+        self.archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+
+    def add(self, name, path):
+        info = self.archive.gettarinfo(path, arcname=name)
+        with open(path, 'rb') as source:
+            reader = HashingReader(source)
+            self.archive.addfile(info, reader)
+        return reader.sha256.hexdigest(), reader.size
+
+    def link(self, name, path, target_name):
+        # A hard-link member: extracted as a link to the earlier copy, stored once.
+        info = self.archive.gettarinfo(path, arcname=name)
+        info.type = tarfile.LNKTYPE
+        info.linkname = target_name
+        info.size = 0
+        self.archive.addfile(info)
+        return True
+
+    def close(self):
+        self.archive.close()
+
+ARCHIVE_WRITERS = {
+    'zip': ZipWriter,
+    'tar': TarWriter,
+}
+
+def team_files(team_folder):
+    # Half-written assets end in .tmp and are left out.
+    return sorted(entry.name for entry in os.scandir(team_folder) if entry.is_file() and not entry.name.endswith('.tmp'))
+
+def link_duplicate(path, original):
+    # Replaces `path` with a hard link to the identical `original`.
+    if os.path.samefile(path, original):
+        return False
+    tmp_path = f"{path}.link.tmp"
+    os.link(original, tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+@timed('package.team')
+def package_team(team_folder, archive_path, archive_format='zip', known=None, dedupe=False, hardlink=False):
+    # Writes every file of a team folder into one archive, written next to its
+    # final path and renamed once complete. `known` maps the SHA-256 of files
+    # packaged so far to their 'team/name'; it is updated with this team's files.
+    # Returns the team's manifest entry.
+    started = time.monotonic()
+    team = os.path.basename(os.path.normpath(team_folder))
+    known = {} if known is None else known
+    files = []
+    stored = {}  # sha256 -> name inside this archive
+    linked = 0
+    tmp_path = f"{archive_path}.tmp"
+    writer = ARCHIVE_WRITERS[archive_format](tmp_path)
+    try:
+        for name in team_files(team_folder):
+            path = os.path.join(team_folder, name)
+            if dedupe:
+                # Hashed first: a repeat is written as a link instead of a copy.
+                sha256 = file_sha256(path)
+                if sha256 in stored and writer.link(name, path, stored[sha256]):
+                    linked += 1
+                    size = os.path.getsize(path)
+                else:
+                    sha256, size = writer.add(name, path)
+            else:
+                sha256, size = writer.add(name, path)
+            stored.setdefault(sha256, name)
+            entry = {'name': name, 'size': size, 'sha256': sha256}
+            original = known.get(sha256)
+            if original is not None and original != f"{team}/{name}":
+                entry['duplicate_of'] = original
+                if hardlink:
+                    original_path = os.path.join(os.path.dirname(os.path.normpath(team_folder)), *original.split('/'))
+                    if os.path.isfile(original_path) and os.path.getsize(original_path) == size:
+                        link_duplicate(path, original_path)
+            else:
+                known[sha256] = f"{team}/{name}"
+            files.append(entry)
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, archive_path)
+    return {
+        'archive': os.path.basename(archive_path),
+        'format': archive_format,
+        'size': os.path.getsize(archive_path),
+        'sha256': file_sha256(archive_path),
+        'packaged': datetime.now().isoformat(timespec='seconds'),
+        'seconds': round(time.monotonic() - started, 3),
+        'linked': linked,
+        'files': files,
+    }
+
+class TeamPackager:
+    # Packs each finished team folder into one archive (zip or tar, stored
+    # without recompression) on a background thread, so the run's thousands of
+    # small files become a few large sequential writes while the next team is
+    # being captured. A single worker keeps the writes sequential. The SHA-256
+    # and size of every file and archive go into a JSON manifest, which also
+    # notes files identical to one packaged earlier.
+    def __init__(self, output_dir='archives', archive_format='zip', dedupe=False, hardlink=False, manifest_path=None):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format '{archive_format}'. Use one of: {', '.join(ARCHIVE_FORMATS)}.")
+        self.output_dir = output_dir
+        self.archive_format = archive_format
+        self.dedupe = dedupe
+        self.hardlink = hardlink
+        self.manifest_path = manifest_path or os.path.join(output_dir, 'manifest.json')
+        self.manifest = {'format': MANIFEST_FORMAT, 'teams': {}}
+        self._known = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="packager")
+        self._tasks = []
+        self.packaged = 0
+        self.failures = 0
+        os.makedirs(output_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get('format') == MANIFEST_FORMAT:
+                    self.manifest = manifest
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read archive manifest {self.manifest_path}: {e}")
+        # Teams packaged by earlier runs still count for duplicates.
+        for team, entry in self.manifest['teams'].items():
+            for file in entry['files']:
+                self._known.setdefault(file['sha256'], file.get('duplicate_of', f"{team}/{file['name']}"))
+
+    def archive_path(self, team_folder):
+        team = os.path.basename(os.path.normpath(team_folder))
+        return os.path.join(self.output_dir, team + ARCHIVE_FORMATS[self.archive_format])
+
+    def _write_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _package(self, team_folder):
+        # Runs on the worker thread, which is the only one touching the manifest
+        # until finish().
+        team = os.path.basename(os.path.normpath(team_folder))
+        previous = self.manifest['teams'].get(team)
+        if previous is not None and previous['archive'] == os.path.basename(self.archive_path(team_folder)) \
+                and os.path.exists(self.archive_path(team_folder)):
+            # Nothing new since the last run, e.g. a team skipped on resume.
+            sizes = {name: os.path.getsize(os.path.join(team_folder, name)) for name in team_files(team_folder)}
+            if sizes == {file['name']: file['size'] for file in previous['files']}:
+                return previous, False
+        # A re-captured team replaces its earlier files as originals.
+        for file in (previous or {}).get('files', []):
+            if self._known.get(file['sha256']) == f"{team}/{file['name']}":
+                del self._known[file['sha256']]
+        entry = package_team(team_folder, self.archive_path(team_folder), self.archive_format, self._known, self.dedupe, self.hardlink)
+        self.manifest['teams'][team] = entry
+        self._write_manifest()
+        return entry, True
+
+    async def package(self, team_folder, wait_for=None):
+        if wait_for is not None:
+            # Motion clips still being split out of the team recording.
+            try:
+                await wait_for
+            except Exception:
+                pass  # Logged by the splitter; package what is there.
+        if not os.path.isdir(team_folder):
+            logger.warning(f"Packaging: {team_folder} does not exist.")
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            entry, changed = await loop.run_in_executor(self._executor, self._package, team_folder)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Packaging: could not archive {team_folder}: {e}")
+            return None
+        if not changed:
+            logger.info(f"Packaging: {entry['archive']} is up to date.")
+            return entry
+        self.packaged += 1
+        duplicates = sum(1 for file in entry['files'] if 'duplicate_of' in file)
+        logger.info(f"Packaging: {entry['archive']} with {len(entry['files'])} files ({entry['size'] / 1e6:.1f} MB, "
+                    f"{entry['seconds']:.1f}s{f', {duplicates} duplicates' if duplicates else ''}).")
+        return entry
+
+    def submit_team(self, team_folder, wait_for=None):
+        # Packages a finished team in the background while the next one is captured.
+        self._tasks.append(asyncio.ensure_future(self.package(team_folder, wait_for)))
+
+    async def finish(self):
+        started = time.monotonic()
+        for result in await asyncio.gather(*self._tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"Packaging: background task failed: {result!r}")
+        self._tasks.clear()
+        logger.info(f"Packaging: {self.packaged} team archives in {self.output_dir} ({self.failures} failed, "
+                    f"waited {time.monotonic() - started:.1f}s at the end; manifest in {self.manifest_path}).")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+def packager_from_config(config):
+    packaging_config = config.get('packaging', {})
+    if not packaging_config.get('enabled', True):
+        return None
+    return TeamPackager(
+        output_dir=packaging_config.get('output_dir', 'archives'),
+        archive_format=packaging_config.get('format', 'zip'),
+        dedupe=packaging_config.get('dedupe', False),
+        hardlink=packaging_config.get('hardlink', False),
+        manifest_path=packaging_config.get('manifest')
+    )
+
+async def run(args):
+    import yaml
+    with open("config.yaml", 'r') as f:
+        config = yaml.safe_load(f)
+    config.setdefault('packaging', {})['enabled'] = True
+    if args.format:
+        config['packaging']['format'] = args.format
+    packager = packager_from_config(config)
+    try:
+        folders = [os.path.join(args.root, team) for team in args.team] if args.team else [
+            entry.path for entry in sorted(os.scandir(args.root), key=lambda entry: entry.name) if entry.is_dir()]
+        for folder in folders:
+            packager.submit_team(folder)
+        await packager.finish()
+    finally:
+        packager.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack captured team folders into one archive per team with a SHA-256 manifest.")
+    parser.add_argument("root", nargs='?', default='screenshots', help="Output folder with one sub-folder per team.")
+    parser.add_argument("--team", action='append', help="Only package this team folder (can be repeated).")
+    parser.add_argument("--format", choices=list(ARCHIVE_FORMATS), help="Override packaging.format.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "<team id><player> - 0 - mainview.png" and "<team id><player> - 2 - motion.mp4"
+ASSET_PATTERN = re.compile(r'^(?P<team_id>.+)(?P<player>\d{2}) - (?:0 - (?P<mainview>mainview)|2 - (?P<motion>motion))\.\w+$')
+
+def pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def dhash(gray, size=8):
+    resized = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return pack_bits(resized[:, 1:] > resized[:, :-1])
+
+def phash(gray, size=8):
+    resized = cv2.resize(gray, (size * 4, size * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(resized)[:size, :size]
+    # The DC term only carries the overall brightness.
+    return pack_bits(low > np.median(low.flatten()[1:]))
+
+def analyze_screenshot(path, region=None):
+    # The hashes only cover `region` (canvas coordinates): the rest of the screen
+    # is the same layout for every player. No hashes without a region.
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return {'error': "unreadable image"}
+    hashes = {}
+    if region is not None:
+        x1, y1, x2, y2 = region
+        crop = gray[y1:y2, x1:x2]
+        if crop.size == 0:
+            return {'error': f"duplicate region {region} is outside the {gray.shape[1]}x{gray.shape[0]} image"}
+        hashes = {'dhash': dhash(crop), 'phash': phash(crop)}
+    return {
+        **hashes,
+        'mean': float(gray.mean()),
+        'std': float(gray.std()),
+        'dark_fraction': float(np.count_nonzero(gray < 16) / gray.size),
+    }
+
+def analyze_clip(path, deep=False):
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            return {'error': "unreadable video"}
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        if deep or frames <= 0:
+            # The container's frame count is wrong for truncated files; decode them all.
+            frames = 0
+            while capture.grab():
+                frames += 1
+        return {'frames': frames, 'fps': fps, 'duration': frames / fps if fps > 0 else 0.0}
+    finally:
+        capture.release()
+
+def analyze_file(path, kind, deep=False, region=None):
+    # Runs in the QA process pool.
+    try:
+        if kind == 'screenshot':
+            return analyze_screenshot(path, region)
+        return analyze_clip(path, deep)
+    except Exception as e:
+        return {'error': repr(e)}
+
+class BKTree:
+    # Burkhard-Keller tree over 64-bit hashes with the Hamming distance: finding
+    # all hashes within a small radius only visits a fraction of the tree.
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                matches.append((distance, item))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return matches
+
+def scan_team(team_folder):
+    # {player: {'team_id': ..., 'screenshot': path, 'motion': path}} for one team folder.
+    players = {}
+    for name in sorted(os.listdir(team_folder)):
+        match = ASSET_PATTERN.match(name)
+        if match is None or '.tmp' in name:
+            continue
+        player = players.setdefault(match.group('player'), {'team_id': match.group('team_id')})
+        player['screenshot' if match.group('mainview') else 'motion'] = os.path.join(team_folder, name)
+    return players
+
+class QualityChecker:
+    # Post-capture checks of the screenshots and motion clips: near-duplicate
+    # screenshots across all teams (perceptual hashes of the player-specific
+    # `duplicate_region` in a BK-tree), black or blank frames, and clips that
+    # are unreadable, too short or have too few frames. Files are analysed in a
+    # process pool; results are cached by size and modification time, so
+    # re-checking a team only reads new files.
+    def __init__(self, root='screenshots', clip_length=3.0, workers=2, dark_mean=16.0, dark_fraction=0.95, blank_std=3.0,
+                 duplicate_distance=2, duplicate_region=None, clip_tolerance=0.25, min_clip_frames=10, deep_clip_check=False, report_path=None):
+        self.root = root
+        self.clip_length = clip_length
+        self.dark_mean = dark_mean
+        self.dark_fraction = dark_fraction
+        self.blank_std = blank_std
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_region = list(duplicate_region) if duplicate_region else None
+        if self.duplicate_region is None:
+            logger.info("QA: no qa.duplicate_region set; screenshots are not checked for near-duplicates.")
+        self.clip_tolerance = clip_tolerance
+        self.min_clip_frames = min_clip_frames
+        self.deep_clip_check = deep_clip_check
+        self.report_path = report_path or os.path.join(root, 'qa_report.json')
+        self.cache_path = os.path.join(root, 'qa_cache.json')
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self.index = BKTree()
+        self.problems = {}  # (team folder, player) -> reasons
+        self.checked = set()
+        self._indexed = set()
+        self._tasks = []
+        self._cache = {}
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read QA cache {self.cache_path}: {e}")
+
+    async def _analyze(self, path, kind):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        region = self.duplicate_region if kind == 'screenshot' else None
+        cached = self._cache.get(key)
+        if (cached is not None and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns
+                and cached.get('region') == region):
+            return cached['result']
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.pool, analyze_file, path, kind, self.deep_clip_check, region)
+        self._cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'region': region, 'result': result}
+        return result
+
+    def _check_screenshot(self, team, player, path, result):
+        reasons = []
+        if 'error' in result:
+            return [f"screenshot: {result['error']}"]
+        if result['mean'] < self.dark_mean or result['dark_fraction'] >= self.dark_fraction:
+            reasons.append(f"dark screenshot (mean brightness {result['mean']:.1f})")
+        elif result['std'] < self.blank_std:
+            reasons.append(f"blank screenshot (contrast {result['std']:.1f})")
+        if 'phash' not in result:
+            return reasons
+        for distance, (other_team, other_player, other_dhash) in self.index.search(result['phash'], self.duplicate_distance):
+            if (other_team, other_player) == (team, player) or hamming(result['dhash'], other_dhash) > self.duplicate_distance * 2:
+                continue
+            reasons.append(f"near-duplicate of {other_team}/{other_player} (distance {distance})")
+        if path not in self._indexed:
+            self._indexed.add(path)
+            self.index.add(result['phash'], (team, player, result['dhash']))
+        return reasons
+
+    def _check_clip(self, result):
+        if 'error' in result:
+            return [f"motion: {result['error']}"]
+        reasons = []
+        if result['frames'] < self.min_clip_frames:
+            reasons.append(f"motion clip has {result['frames']} frames")
+        if result['duration'] < self.clip_length * (1 - self.clip_tolerance):
+            reasons.append(f"motion clip is {result['duration']:.2f}s long")
+        return reasons
+
+    async def check_team(self, team_folder, final=True):
+        # Before the end of the run (`final` False) motion clips may still be
+        # waiting to be split, so missing ones are not reported yet.
+        team = os.path.basename(os.path.normpath(team_folder))
+        players = scan_team(team_folder)
+        paths = [(player, kind, assets[kind]) for player, assets in players.items() for kind in ('screenshot', 'motion') if kind in assets]
+        results = await asyncio.gather(*(self._analyze(path, kind) for _, kind, path in paths))
+        reasons = {player: [] for player in players}
+        for (player, kind, path), result in zip(paths, results):
+            if kind == 'screenshot':
+                reasons[player].extend(self._check_screenshot(team, player, path, result))
+            else:
+                reasons[player].extend(self._check_clip(result))
+        for player, assets in players.items():
+            if 'screenshot' not in assets:
+                reasons[player].append("missing screenshot")
+            if final and 'motion' not in assets:
+                reasons[player].append("missing motion clip")
+        for key in [key for key in self.problems if key[0] == team]:
+            del self.problems[key]
+        for player, player_reasons in sorted(reasons.items()):
+            if player_reasons:
+                self.problems[(team, player)] = player_reasons
+                logger.warning(f"QA: {team} player {player}: {'; '.join(player_reasons)}")
+        self.checked.add(team_folder)
+        return {player: player_reasons for player, player_reasons in reasons.items() if player_reasons}
+
+    def submit_team(self, team_folder):
+        # Checks a finished team in the background while the next one is captured.
+        self._tasks.append(asyncio.ensure_future(self.check_team(team_folder, final=False)))
+
+    def report(self):
+        return {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'teams_checked': len(self.checked),
+            'screenshots_indexed': self.index.size,
+            'recapture': [
+                {'team': team, 'player': player, 'reasons': reasons}
+                for (team, player), reasons in sorted(self.problems.items())
+            ],
+        }
+
+    async def finish(self):
+        # Waits for the background checks, re-checks every team now that all clips
+        # are in place, and writes the report and cache.
+        started = time.monotonic()
+        for result in await asyncio.gather(*self._tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"QA: background check failed: {result!r}")
+        self._tasks.clear()
+        for team_folder in sorted(self.checked):
+            if os.path.isdir(team_folder):
+                await self.check_team(team_folder, final=True)
+        report = self.report()
+        os.makedirs(os.path.dirname(os.path.abspath(self.report_path)), exist_ok=True)
+        with open(self.report_path, 'w') as f:
+            json.dump(report, f, indent=1)
+        with open(self.cache_path, 'w') as f:
+            json.dump(self._cache, f)
+        logger.info(f"QA: {len(report['recapture'])} players to re-capture in {report['teams_checked']} teams "
+                    f"(report in {self.report_path}, {time.monotonic() - started:.1f}s).")
+        return report
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+def quality_checker_from_config(config, root='screenshots'):
+    qa_config = config.get('qa', {})
+    if not qa_config.get('enabled', True):
+        return None
+    return QualityChecker(
+        root=root,
+        clip_length=config.get('recording', {}).get('clip_length', 3.0),
+        workers=qa_config.get('workers', 2),
+        dark_mean=qa_config.get('dark_mean', 16.0),
+        dark_fraction=qa_config.get('dark_fraction', 0.95),
+        blank_std=qa_config.get('blank_std', 3.0),
+        duplicate_distance=qa_config.get('duplicate_distance', 2),
+        duplicate_region=qa_config.get('duplicate_region'),
+        clip_tolerance=qa_config.get('clip_tolerance', 0.25),
+        min_clip_frames=qa_config.get('min_clip_frames', 10),
+        deep_clip_check=qa_config.get('deep_clip_check', False),
+        report_path=qa_config.get('report')
+    )
+
+async def run(args):
+    import yaml
+    with open("config.yaml", 'r') as f:
+        config = yaml.safe_load(f)
+    config.setdefault('qa', {})['enabled'] = True
+    if args.workers:
+        config['qa']['workers'] = args.workers
+    if args.deep:
+        config['qa']['deep_clip_check'] = True
+    checker = quality_checker_from_config(config, args.root)
+    try:
+        folders = [os.path.join(args.root, team) for team in args.team] if args.team else [
+            entry.path for entry in sorted(os.scandir(args.root), key=lambda entry: entry.name) if entry.is_dir()]
+        for folder in folders:
+            checker.checked.add(folder)
+        report = await checker.finish()
+    finally:
+        checker.close()
+    for entry in report['recapture']:
+        print(f"{entry['team']:30} {entry['player']}  {'; '.join(entry['reasons'])}")
+    print(f"{len(report['recapture'])} players to re-capture in {report['teams_checked']} teams.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check captured screenshots and motion clips and list the players to re-capture.")
+    parser.add_argument("root", nargs='?', default='screenshots', help="Output folder with one sub-folder per team.")
+    parser.add_argument("--team", action='append', help="Only check this team folder (can be repeated).")
+    parser.add_argument("--workers", type=int, help="Override qa.workers.")
+    parser.add_argument("--deep", action='store_true', help="Decode every clip to count its frames.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+RECORDING_MODES = ('per_player', 'per_team')
+
+def motion_clip_name(team_id, player_id, extension):
+    return f"{team_id}{player_id} - 2 - motion{extension}"
+
+def split_clips(source_path, clips, fourcc='mp4v', remove_source=False):
+    # Cuts [start, end) windows (in seconds from the start of the file) out of a
+    # long recording in a single sequential pass. `clips` is a list of
+    # (output_path, start, end). Returns a list of (output_path, frames_written).
+    capture = cv2.VideoCapture(source_path)
+    if not capture.isOpened():
+        raise IOError(f"Could not open recording {source_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    pending = sorted(clips, key=lambda clip: clip[1])
+    open_writers = {}
+    written = {output_path: 0 for output_path, _, _ in clips}
+    last_end = max((end for _, _, end in clips), default=0)
+    index = 0
+    try:
+        while True:
+            timestamp = index / fps
+            if timestamp >= last_end:
+                break
+            ok, frame = capture.read()
+            if not ok:
+                break
+            while pending and pending[0][1] <= timestamp:
+                output_path, start, end = pending.pop(0)
+                root, extension = os.path.splitext(output_path)
+                tmp_path = f"{root}.tmp{extension}"
+                writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+                open_writers[output_path] = (writer, tmp_path, end)
+            for output_path, (writer, tmp_path, end) in list(open_writers.items()):
+                if timestamp < end:
+                    writer.write(frame)
+                    written[output_path] += 1
+                else:
+                    writer.release()
+                    os.replace(tmp_path, output_path)
+                    del open_writers[output_path]
+            index += 1
+    finally:
+        capture.release()
+        for output_path, (writer, tmp_path, _) in open_writers.items():
+            writer.release()
+            os.replace(tmp_path, output_path)
+    if remove_source:
+        empty = [output_path for output_path, frames in written.items() if frames == 0]
+        if empty:
+            # Keep the recording (and its .clips.json) so the split can be redone.
+            logger.warning(f"Keeping {source_path}: {len(empty)} of {len(clips)} clips came out empty.")
+        else:
+            os.remove(source_path)
+    return [(output_path, written[output_path]) for output_path, _, _ in clips]
+
+class ClipSplitter:
+    # Runs split_clips in a process pool so cutting one team's recording overlaps
+    # with capturing the next team.
+    def __init__(self, workers=2, fourcc='mp4v'):
+        self.fourcc = fourcc
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._pending = set()
+
+    def submit(self, source_path, clips, remove_source=False, on_clip=None):
+        # `on_clip(output_path)` is called on a worker thread for every non-empty clip.
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, split_clips, source_path, clips, self.fourcc, remove_source)
+        self._pending.add(future)
+
+        def report(results):
+            for output_path, frames in results:
+                if frames == 0:
+                    logger.warning(f"Clip {output_path} is empty; its window is outside the recording.")
+                elif on_clip is not None:
+                    on_clip(output_path)
+            logger.info(f"Split {len(clips)} clips out of {source_path}.")
+
+        def done(f):
+            self._pending.discard(f)
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is not None:
+                logger.error(f"Error while splitting {source_path}: {error}")
+                return
+            reported = loop.run_in_executor(None, report, f.result())
+            self._pending.add(reported)
+            reported.add_done_callback(self._pending.discard)
+
+        future.add_done_callback(done)
+        return future
+
+    async def wait(self):
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+class TeamRecorder:
+    # Records the motion clips of a team, either with one OBS recording per
+    # player (start/stop around every clip) or with a single recording per team
+    # whose player windows are logged with monotonic timestamps and cut out
+    # afterwards by the ClipSplitter.
+    def __init__(self, obs, assets, mode='per_player', clip_length=3.0, splitter=None, keep_source=False, start_offset=0.0, manifest=None):
+        if mode not in RECORDING_MODES:
+            raise ValueError(f"Unknown recording mode '{mode}'. Use one of: {', '.join(RECORDING_MODES)}.")
+        self.obs = obs
+        self.assets = assets
+        self.mode = mode
+        self.clip_length = clip_length
+        self.splitter = splitter
+        self.keep_source = keep_source
+        self.start_offset = start_offset
+        self.manifest = manifest
+        self._team_name = None
+        self._team_folder = None
+        self._team_id = None
+        self._started_at = None
+        self._windows = []
+        # The split of the last team's recording, while it runs in the background.
+        self.split = None
+
+    def _on_clip(self, player_id):
+        if self.manifest is None:
+            return None
+        team_name, team_id = self._team_name, self._team_id
+        return lambda path: self.manifest.record_asset(team_name, team_id, player_id, 'motion', path)
+
+    async def start_team(self, team_folder, team_id, team_name=None):
+        self._team_name = team_name
+        self._team_folder = team_folder
+        self._team_id = team_id
+        self._windows = []
+        self.split = None
+        await self.obs.request('SetRecordDirectory', recordDirectory=str(team_folder.resolve()))
+        if self.mode == 'per_team':
+            started = self.obs.aio.expect_event('RecordStateChanged', lambda data: data.get('outputState') == 'OBS_WEBSOCKET_OUTPUT_STARTED')
+            await self.obs.request('StartRecord')
+            try:
+                await asyncio.wait_for(started, 5.0)
+            except asyncio.TimeoutError:
+                logger.warning("OBS did not report the recording as started; clip windows may be offset.")
+            self._started_at = time.monotonic() + self.start_offset
+            logger.info(f"Team recording started in folder '{team_folder.resolve()}'")
+
+    async def record_player(self, player_id):
+        # Records one clip. Returns a task to pass to finish_player once the menu
+        # has been backed out of, or None.
+        if self.mode == 'per_team':
+            start = time.monotonic() - self._started_at
+            await asyncio.sleep(self.clip_length)
+            self._windows.append((player_id, start, time.monotonic() - self._started_at))
+            logger.info(f"Marked motion window for player {player_id}: {start:.2f}s + {self.clip_length}s")
+            return None
+
+        await self.obs.request('StartRecord')
+        logger.info(f"Recording started for player {player_id} in folder '{self._team_folder.resolve()}'")
+        await asyncio.sleep(self.clip_length)
+        # OBS finalizes the file while we back out of the menu.
+        stop_task = await self.obs.begin_stop_record()
+        logger.info("Recording stopped.")
+        return stop_task
+
+    async def finish_player(self, player_id, stop_task):
+        if stop_task is None:
+            return
+        # OBS v28+ returns outputPath in the response. We will rename this file.
+        response = await stop_task
+        output_path = response.get('outputPath')
+        if not output_path:
+            logger.warning("Could not get output path from OBS. File may not have been saved or may require manual renaming.")
+            return
+        file_extension = os.path.splitext(output_path)[1]
+        desired_path = os.path.join(os.path.dirname(output_path), motion_clip_name(self._team_id, player_id, file_extension))
+        # The rename (replacing any existing file) happens in the background.
+        await self.assets.rename(output_path, desired_path, on_done=self._on_clip(player_id))
+        logger.info(f"Queued rename of video to: {desired_path}")
+
+    async def finish_team(self):
+        if self.mode != 'per_team' or self._started_at is None:
+            return
+        stop_task = await self.obs.begin_stop_record()
+        response = await stop_task
+        self._started_at = None
+        output_path = response.get('outputPath')
+        if not output_path:
+            logger.error("Could not get the team recording's output path from OBS; motion clips were not split.")
+            return
+        clips = [
+            (os.path.join(os.path.dirname(output_path), motion_clip_name(self._team_id, player_id, '.mp4')), start, end)
+            for player_id, start, end in self._windows
+        ]
+        # Keep the windows next to the recording so the split can be redone offline.
+        with open(f"{output_path}.clips.json", 'w') as f:
+            json.dump({'source': output_path, 'clips': clips}, f, indent=2)
+        if self.splitter is None:
+            logger.info(f"Team recording saved to {output_path}; split it later with recording.py.")
+            return
+        on_clips = {clip[0]: self._on_clip(player_id) for clip, (player_id, _, _) in zip(clips, self._windows)}
+
+        def on_clip(path):
+            callback = on_clips.get(path)
+            if callback is not None:
+                callback(path)
+
+        self.split = self.splitter.submit(output_path, clips, remove_source=not self.keep_source, on_clip=on_clip)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Cut the motion clips out of a per-team recording.")
+    parser.add_argument("clips_file", help="The '.clips.json' file written next to the team recording.")
+    parser.add_argument("--fourcc", default='mp4v')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with open(args.clips_file, 'r') as f:
+        windows = json.load(f)
+    for output_path, frames in split_clips(windows['source'], [tuple(clip) for clip in windows['clips']], args.fourcc):
+        logging.info(f"{output_path}: {frames} frames")
@@ -1,58 +1,372 @@
+import asyncio
 import base64
-import io
+import collections
+import threading
+import time
 import cv2
 import numpy as np
 import logging
-from PIL import Image
 
 # OBS WebSocket API client
 from obswebsocket import obsws, requests
+from obs_async import AsyncOBSConnection
+from timing import span, timed
 
 import os
 
 logger = logging.getLogger(__name__)
 
+# A captured frame as stored in the ring buffer. `seq` increases by one per frame.
+CapturedFrame = collections.namedtuple('CapturedFrame', ['seq', 'timestamp', 'image'])
+# How screenshots are requested from OBS: image format, size relative to the
+# canvas and compression quality (-1 for the OBS default). Polling frames feed
+# the menu waits and OCR and can be small and lossy; archival frames are the
+# ones saved as mainview images.
+CaptureProfile = collections.namedtuple('CaptureProfile', ['image_format', 'scale', 'quality'])
+
+def capture_profiles(capture_config):
+    polling = CaptureProfile(
+        capture_config.get('poll_format', 'jpeg'),
+        capture_config.get('poll_scale', 0.5),
+        capture_config.get('poll_quality', -1)
+    )
+    archival = CaptureProfile(capture_config.get('archival_format', 'png'), 1.0, -1)
+    return polling, archival
+
 class OBSClient:
-    def __init__(self, host="localhost", port=4455, password="", source_name="Scene"):
+    def __init__(self, host="localhost", port=4455, password="", source_name="Scene", buffer_size=4, capture_interval=0.05, scene_refresh_interval=5.0,
+                 polling=None, archival=None):
         self.ws = obsws(host, port, password)
+        # obsws is not thread-safe: the producer thread and the sync fallbacks on
+        # the event loop would otherwise interleave requests and take each other's
+        # responses. Every sync request goes through _call().
+        self._ws_lock = threading.Lock()
+        self.aio = AsyncOBSConnection(host, port, password)
         self.source_name = source_name
         self.capture_scene_name = os.environ.get('OBS_CAPTURE_SCENE')
         if self.capture_scene_name:
             logger.info(f"OBS_CAPTURE_SCENE environment variable set. Capturing from scene: {self.capture_scene_name}")
 
+        self.polling = polling or CaptureProfile('jpeg', 1.0, -1)
+        self.archival = archival or CaptureProfile('png', 1.0, -1)
+        # (width, height) of the OBS canvas, looked up on connect; polling frames
+        # are only scaled once it is known.
+        self.canvas_size = None
+        self.capture_interval = capture_interval
+        self.scene_refresh_interval = scene_refresh_interval
+        self._scene_name = None
+        self._scene_name_time = 0.0
+        self._frames = collections.deque(maxlen=buffer_size)
+        self._frames_lock = threading.Lock()
+        self._seq = 0
+        self._producer = None
+        self._stop_event = threading.Event()
+
     def connect(self):
         self.ws.connect()
         logger.info("Connected to OBS")
+        try:
+            self._set_canvas_size(self._call(requests.GetVideoSettings()).datain)
+        except Exception as e:
+            logger.warning(f"Could not read the OBS canvas size ({e}); polling at full resolution.")
+
+    def _set_canvas_size(self, settings):
+        self.canvas_size = (settings['baseWidth'], settings['baseHeight'])
+        if self.poll_scale != 1.0:
+            width, height = self._profile_size(self.polling)
+            logger.info(f"Polling {width}x{height} {self.polling.image_format} screenshots; mainview screenshots are "
+                        f"{self.canvas_size[0]}x{self.canvas_size[1]} {self.archival.image_format}.")
+
+    @property
+    def poll_scale(self):
+        # Scale of the polling frames relative to the canvas (and config.yaml's regions).
+        return self.polling.scale if self.canvas_size is not None else 1.0
+
+    def scale_regions(self, regions):
+        # OCR regions in config.yaml are canvas coordinates; polling frames are smaller.
+        scale = self.poll_scale
+        if scale == 1.0:
+            return regions
+        return {name: [round(value * scale) for value in region] for name, region in regions.items()}
+
+    def _profile_size(self, profile):
+        width, height = self.canvas_size
+        # OBS accepts 8 to 4096 pixels per side.
+        return (min(max(round(width * profile.scale), 8), 4096), min(max(round(height * profile.scale), 8), 4096))
+
+    def _screenshot_data(self, scene_name, profile):
+        data = {'sourceName': scene_name, 'imageFormat': profile.image_format}
+        if profile.scale != 1.0 and self.canvas_size is not None:
+            data['imageWidth'], data['imageHeight'] = self._profile_size(profile)
+        if profile.quality is not None and profile.quality >= 0:
+            data['imageCompressionQuality'] = profile.quality
+        return data
+
+    def _call(self, request):
+        with self._ws_lock:
+            return self.ws.call(request)
 
     def disconnect(self):
-        self.ws.disconnect()
+        self.stop_capture()
+        with self._ws_lock:
+            self.ws.disconnect()
         logger.info("Disconnected from OBS")
 
-    def get_frame(self):
+    async def connect_async(self):
+        await self.aio.connect()
+        if self.canvas_size is None:
+            try:
+                self._set_canvas_size(await self.request('GetVideoSettings'))
+            except Exception as e:
+                logger.warning(f"Could not read the OBS canvas size ({e}); polling at full resolution.")
+
+    async def disconnect_async(self):
+        await self.aio.disconnect()
+
+    async def request(self, request_type, **request_data):
+        # Non-blocking OBS request over the asyncio connection. Several requests
+        # can be awaited concurrently.
+        with span(f"obs.{request_type}"):
+            return await self.aio.call(request_type, request_data)
+
+    async def begin_stop_record(self, timeout=5.0):
+        # Returns as soon as OBS has stopped capturing. The returned task resolves
+        # to the StopRecord response (with outputPath) once the file is finalized,
+        # so the caller can carry on with inputs in the meantime.
+        stopping = self.aio.expect_event(
+            'RecordStateChanged',
+            lambda data: data.get('outputState') in ('OBS_WEBSOCKET_OUTPUT_STOPPING', 'OBS_WEBSOCKET_OUTPUT_STOPPED')
+        )
+        stop_task = asyncio.create_task(self.request('StopRecord'))
+        await asyncio.wait([stopping, stop_task], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not stopping.done():
+            stopping.cancel()
+        return stop_task
+
+    def _get_scene_name(self):
+        if self.capture_scene_name:
+            return self.capture_scene_name
+        # The program scene rarely changes, so avoid a round-trip on every frame.
+        now = time.monotonic()
+        if self._scene_name is None or now - self._scene_name_time > self.scene_refresh_interval:
+            scene_response = self._call(requests.GetCurrentProgramScene())
+            self._scene_name = scene_response.datain['currentProgramSceneName']
+            self._scene_name_time = now
+            logger.debug(f"Getting screenshots from active scene: {self._scene_name}")
+        return self._scene_name
+
+    def _decode_screenshot(self, b64_data):
+        if ',' in b64_data:
+            b64_data = b64_data.split(',', 1)[1]
+        img_data = base64.b64decode(b64_data)
+        frame = cv2.imdecode(np.frombuffer(img_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("could not decode screenshot data")
+        logger.debug(f"Successfully captured frame with dimensions: {frame.shape}")
+        return frame
+
+    @timed('obs.grab_frame')
+    def _grab_frame(self, profile=None):
         try:
-            if self.capture_scene_name:
-                scene_name = self.capture_scene_name
-                logger.debug(f"Getting screenshot from specified scene: {scene_name}")
-            else:
-                scene_response = self.ws.call(requests.GetCurrentProgramScene())
-                scene_name = scene_response.datain['currentProgramSceneName']
-                logger.debug(f"Getting screenshot from active scene: {scene_name}")
-
-            screenshot_request = requests.GetSourceScreenshot(
-                sourceName=scene_name,
-                imageFormat='jpeg'
-            )
-
-            screenshot_response = self.ws.call(screenshot_request)
-            b64_data = screenshot_response.datain['imageData']
-            # logger.debug(f"Raw image data: {b64_data[:100]}...") # Removed full image data logging
-            if ',' in b64_data:
-                b64_data = b64_data.split(',', 1)[1]
-            img_data = base64.b64decode(b64_data)
-            img = Image.open(io.BytesIO(img_data))
-            frame = np.array(img)
-            logger.debug(f"Successfully captured frame with dimensions: {frame.shape}")
-            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            scene_name = self._get_scene_name()
+            screenshot_request = requests.GetSourceScreenshot(**self._screenshot_data(scene_name, profile or self.polling))
+
+            screenshot_response = self._call(screenshot_request)
+            return self._decode_screenshot(screenshot_response.datain['imageData'])
         except Exception as e:
             logger.error(f"Failed to get frame: {e}")
+            # The scene may have been renamed or switched; look it up again next time.
+            self._scene_name = None
             return None
+
+    @timed('obs.grab_frame')
+    async def _grab_frame_async(self, profile=None):
+        try:
+            scene_name = self.capture_scene_name or self._scene_name
+            if scene_name is None:
+                response = await self.request('GetCurrentProgramScene')
+                scene_name = self._scene_name = response['currentProgramSceneName']
+                self._scene_name_time = time.monotonic()
+            response = await self.request('GetSourceScreenshot', **self._screenshot_data(scene_name, profile or self.polling))
+            return self._decode_screenshot(response['imageData'])
+        except Exception as e:
+            logger.error(f"Failed to get frame: {e}")
+            self._scene_name = None
+            return None
+
+    async def get_frame_async(self):
+        if self.capturing or not self.aio.connected:
+            return self.get_frame()
+        frame = await self._grab_frame_async()
+        if frame is not None:
+            self._push_frame(frame)
+        return frame
+
+    @timed('obs.grab_archival')
+    async def grab_archival(self):
+        # Full-resolution, lossless frame for saving; not put in the ring buffer,
+        # whose frames are all at the polling size.
+        if self.aio.connected:
+            return await self._grab_frame_async(self.archival)
+        return self._grab_frame(self.archival)
+
+    def _push_frame(self, frame):
+        with self._frames_lock:
+            self._seq += 1
+            captured = CapturedFrame(self._seq, time.monotonic(), frame)
+            self._frames.append(captured)
+        return captured
+
+    @property
+    def capturing(self):
+        return self._producer is not None and self._producer.is_alive()
+
+    def start_capture(self):
+        if self.capturing:
+            return
+        self._stop_event.clear()
+        self._producer = threading.Thread(target=self._produce_frames, name="obs-frame-producer", daemon=True)
+        self._producer.start()
+        logger.info(f"Background frame capture started (interval {self.capture_interval}s, buffer {self._frames.maxlen} frames).")
+
+    def stop_capture(self):
+        if self._producer is None:
+            return
+        self._stop_event.set()
+        self._producer.join(timeout=2)
+        self._producer = None
+        logger.info("Background frame capture stopped.")
+
+    def _produce_frames(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            frame = self._grab_frame()
+            if frame is not None:
+                self._push_frame(frame)
+            remaining = self.capture_interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+
+    def latest(self):
+        with self._frames_lock:
+            return self._frames[-1] if self._frames else None
+
+    def next_after(self, seq):
+        # Oldest buffered frame newer than `seq`; if `seq` has already fallen out
+        # of the buffer, that is the oldest frame still buffered. None if nothing
+        # newer exists yet.
+        with self._frames_lock:
+            for captured in self._frames:
+                if captured.seq > seq:
+                    return captured
+        return None
+
+    async def frame_after(self, seq, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            captured = self.next_after(seq)
+            if captured is not None or time.monotonic() >= deadline:
+                return captured
+            await asyncio.sleep(self.capture_interval / 2)
+
+    def get_frame(self):
+        if self.capturing:
+            captured = self.latest()
+            return captured.image if captured is not None else None
+        frame = self._grab_frame()
+        if frame is not None:
+            self._push_frame(frame)
+        return frame
+
+    async def _poll_frame(self, last_seq, interval):
+        # Next frame for the wait_* helpers: taken from the producer when it runs,
+        # otherwise grabbed directly after `interval` seconds.
+        if self.capturing:
+            captured = await self.frame_after(last_seq, timeout=max(interval, self.capture_interval) * 4)
+            if captured is None:
+                return last_seq, None
+            return captured.seq, captured.image
+        await asyncio.sleep(interval)
+        return last_seq, await self.get_frame_async()
+
+    def _fingerprint(self, frame, region=None, size=(64, 16)):
+        if region is not None:
+            x1, y1, x2, y2 = region
+            frame = frame[y1:y2, x1:x2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _difference(self, a, b):
+        return float(np.mean(np.abs(a - b)))
+
+    def region_difference(self, a, b, region=None):
+        # Same measure the wait_* helpers compare against their thresholds.
+        return self._difference(self._fingerprint(a, region), self._fingerprint(b, region))
+
+    def region_fingerprint(self, frame, region=None):
+        # For callers that keep many reference frames: compare with fingerprint_difference.
+        return self._fingerprint(frame, region)
+
+    def fingerprint_difference(self, a, b):
+        return self._difference(a, b)
+
+    @timed('wait.change')
+    async def wait_for_change(self, region=None, timeout=2.0, threshold=6.0, interval=0.05, reference=None):
+        # Returns the first frame whose downscaled region differs from the reference
+        # (or from the frame at call time), or None once the timeout expires.
+        deadline = time.monotonic() + timeout
+        captured = self.latest()
+        last_seq = captured.seq if captured is not None else 0
+        if reference is None:
+            reference = await self.get_frame_async()
+        if reference is None:
+            await asyncio.sleep(timeout)
+            return None
+        reference_fp = self._fingerprint(reference, region)
+        while time.monotonic() < deadline:
+            last_seq, frame = await self._poll_frame(last_seq, interval)
+            if frame is None:
+                continue
+            if self._difference(self._fingerprint(frame, region), reference_fp) > threshold:
+                return frame
+        logger.debug(f"wait_for_change timed out after {timeout}s")
+        return None
+
+    @timed('wait.stable')
+    async def wait_for_stable(self, region=None, timeout=3.0, threshold=2.0, interval=0.05, stable_time=0.15):
+        # Returns once the downscaled region has stopped changing for `stable_time`
+        # seconds, or the last frame seen when the timeout expires.
+        deadline = time.monotonic() + timeout
+        captured = self.latest()
+        last_seq = captured.seq - 1 if captured is not None else 0
+        previous_fp = None
+        frame = None
+        stable_since = None
+        while True:
+            last_seq, latest = await self._poll_frame(last_seq, interval if previous_fp is not None else 0)
+            now = time.monotonic()
+            if latest is not None:
+                frame = latest
+                fp = self._fingerprint(frame, region)
+                if previous_fp is not None and self._difference(fp, previous_fp) <= threshold:
+                    if stable_since is None:
+                        stable_since = now
+                    elif now - stable_since >= stable_time:
+                        return frame
+                else:
+                    stable_since = None
+                previous_fp = fp
+            if now >= deadline:
+                logger.debug(f"wait_for_stable timed out after {timeout}s")
+                return frame
+
+    @timed('wait.transition')
+    async def wait_for_transition(self, region=None, change_timeout=1.0, settle_timeout=3.0, stable_time=0.15, reference=None):
+        # Waits for a menu transition to start and then to finish. If nothing changes
+        # within `change_timeout` the screen is assumed to already be settled. The
+        # current frame is returned then, not `reference`: a change too small to
+        # cross the threshold (e.g. a short name replaced by another) is still a change.
+        changed = await self.wait_for_change(region=region, timeout=change_timeout, reference=reference)
+        if changed is None:
+            return await self.get_frame_async()
+        return await self.wait_for_stable(region=region, timeout=settle_timeout, stable_time=stable_time)
@@ -0,0 +1,4 @@
+# Headless stand-ins for the game, OBS, the virtual gamepad and EasyOCR, for
+# measuring and checking navigation without Windows, PES or OBS.
+from simulator.gamepad import FakeGamepad, XUSB_BUTTON, install_fake_vgamepad
+from simulator.game import MenuGame, render_text
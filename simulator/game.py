@@ -0,0 +1,220 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+BACKGROUND_COLOR = (60, 45, 30)
+BOX_COLOR = (90, 40, 20)
+HIGHLIGHT_COLOR = (30, 140, 220)
+TEXT_COLOR = (255, 255, 255)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+SCREENS = ('league', 'team', 'players', 'player_menu', 'motion', 'other')
+
+def render_text(image, text, region, color=TEXT_COLOR):
+    # Draws `text` left-aligned and vertically centred in the (x1, y1, x2, y2)
+    # region. The Hershey fonts only have ASCII glyphs.
+    x1, y1, x2, y2 = region
+    text = ''.join(c if ord(c) < 128 else '?' for c in str(text))
+    height = y2 - y1
+    (width_at_1, height_at_1), _ = cv2.getTextSize(text, FONT, 1.0, 2)
+    scale = 0.45 * height / max(height_at_1, 1)
+    if width_at_1 * scale > (x2 - x1) - 20:
+        scale = ((x2 - x1) - 20) / max(width_at_1, 1)
+    baseline_y = y1 + (height + int(height_at_1 * scale)) // 2
+    cv2.putText(image, text, (x1 + 10, baseline_y), FONT, scale, color, 2, cv2.LINE_AA)
+
+class MenuGame:
+    # Headless model of the game's edit menus: the league list, the team list of
+    # the chosen league (both shown in the same box), a team's player list, the
+    # per-player menu and the motion view. Inputs take effect `reaction_time`
+    # after they are sent; cursor moves blank the list box for `scroll_time` and
+    # screen changes fade in over `screen_time`, during which inputs are ignored.
+    # Presses sent less than `min_press_gap` after the previous release are
+    # dropped, like the game does with presses that come too fast.
+    def __init__(self, teams_config, ocr_regions, frame_size=(1920, 1080), players_per_team=23,
+                 reaction_time=0.03, scroll_time=0.08, screen_time=0.4, min_press_gap=0.0,
+                 menu_items=8, motion_item=7, menu_cursor_persists=False, wrap=True):
+        self.leagues = list(teams_config.keys())
+        self.teams = {
+            league: [team.get('name') for team in teams or [] if team.get('name')]
+            for league, teams in teams_config.items()
+        }
+        self.league_region = tuple(ocr_regions['p1_league_text'])
+        self.team_region = tuple(ocr_regions['p1_team_select_text'])
+        self.frame_size = frame_size
+        self.players_per_team = players_per_team
+        self.reaction_time = reaction_time
+        self.scroll_time = scroll_time
+        self.screen_time = screen_time
+        self.min_press_gap = min_press_gap
+        self.menu_items = menu_items
+        self.motion_item = motion_item
+        self.menu_cursor_persists = menu_cursor_persists
+        self.wrap = wrap
+        self._background = np.full((frame_size[1], frame_size[0], 3), BACKGROUND_COLOR, dtype=np.uint8)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, screen='league', league_index=0, team_index=0, player_index=0):
+        if screen not in SCREENS:
+            raise ValueError(f"Unknown screen '{screen}'. Use one of: {', '.join(SCREENS)}.")
+        with self._lock:
+            self.screen = screen
+            self.league_index = league_index
+            self.team_index = team_index
+            self.player_index = player_index
+            self.menu_index = 0
+            self.motion_active = False
+            self.captured_players = set()
+            self.presses = 0
+            self.presses_by_button = collections.Counter()
+            self.dropped = 0
+            self._pending = []
+            self._last_release = float('-inf')
+            self._scroll_until = 0.0
+            self._screen_started = 0.0
+            self._screen_until = 0.0
+
+    @property
+    def league(self):
+        return self.leagues[self.league_index]
+
+    @property
+    def team(self):
+        return self.teams[self.league][self.team_index]
+
+    def press(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self.presses += 1
+            self.presses_by_button[name] += 1
+            if now - self._last_release < self.min_press_gap:
+                self.dropped += 1
+                return
+            self._pending.append((now + self.reaction_time, name))
+
+    def release(self, name):
+        with self._lock:
+            self._last_release = time.monotonic()
+
+    def set_motion(self, active):
+        with self._lock:
+            self._advance(time.monotonic())
+            self.motion_active = active
+
+    def state(self):
+        with self._lock:
+            self._advance(time.monotonic())
+            return {
+                'screen': self.screen,
+                'league': self.league,
+                'team': self.team if self.teams[self.league] else None,
+                'player_index': self.player_index,
+                'menu_index': self.menu_index,
+            }
+
+    def _move(self, index, length, step):
+        if self.wrap:
+            return (index + step) % length
+        return min(max(index + step, 0), length - 1)
+
+    def _change_screen(self, screen, at):
+        self.screen = screen
+        self._screen_started = at
+        self._screen_until = at + self.screen_time
+
+    def _advance(self, now):
+        while self._pending and self._pending[0][0] <= now:
+            at, name = self._pending.pop(0)
+            if at < self._screen_until:
+                self.dropped += 1
+                continue
+            self._apply(name, at)
+
+    def _apply(self, name, at):
+        step = {'UP': -1, 'DOWN': 1}.get(name)
+        if self.screen == 'league':
+            if step:
+                self.league_index = self._move(self.league_index, len(self.leagues), step)
+                self._scroll_until = at + self.scroll_time
+            elif name == 'A' and self.teams[self.league]:
+                self.team_index = 0
+                self._change_screen('team', at)
+        elif self.screen == 'team':
+            if step:
+                self.team_index = self._move(self.team_index, len(self.teams[self.league]), step)
+                self._scroll_until = at + self.scroll_time
+            elif name == 'A':
+                self.player_index = 0
+                self._change_screen('players', at)
+            elif name == 'B':
+                self._change_screen('league', at)
+        elif self.screen == 'players':
+            if step:
+                self.player_index = self._move(self.player_index, self.players_per_team, step)
+                self._scroll_until = at + self.scroll_time
+            elif name == 'A':
+                if not self.menu_cursor_persists:
+                    self.menu_index = 0
+                self._change_screen('player_menu', at)
+            elif name == 'B':
+                self._change_screen('team', at)
+        elif self.screen == 'player_menu':
+            if step:
+                self.menu_index = self._move(self.menu_index, self.menu_items, step)
+            elif name == 'A':
+                if self.menu_index == self.motion_item:
+                    self.captured_players.add((self.league, self.team, self.player_index))
+                    self._change_screen('motion', at)
+                else:
+                    self._change_screen('other', at)
+            elif name == 'B':
+                self._change_screen('players', at)
+        elif self.screen in ('motion', 'other'):
+            if name == 'B':
+                self._change_screen('player_menu', at)
+
+    def render(self):
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            frame = self._background.copy()
+            width, height = self.frame_size
+            if self.screen in ('league', 'team'):
+                region = self.league_region if self.screen == 'league' else self.team_region
+                x1, y1, x2, y2 = region
+                cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, -1)
+                if now >= self._scroll_until:
+                    render_text(frame, self.league if self.screen == 'league' else self.team, region)
+            elif self.screen == 'players':
+                render_text(frame, self.team, (40, 20, width // 2, 100))
+                row = (height - 160) // self.players_per_team
+                for i in range(self.players_per_team):
+                    y = 140 + i * row
+                    if i == self.player_index:
+                        cv2.rectangle(frame, (40, y), (width // 3, y + row), HIGHLIGHT_COLOR, -1)
+                    render_text(frame, f"{i + 1:02d} PLAYER {i + 1}", (40, y, width // 3, y + row))
+                # Stand-in for the player's portrait, different for every player.
+                shade = 40 + (self.player_index * 37) % 200
+                cv2.rectangle(frame, (width // 2, 200), (width - 200, height - 200), (shade, 255 - shade, 128), -1)
+            elif self.screen == 'player_menu':
+                for i in range(self.menu_items):
+                    y = 200 + i * 70
+                    if i == self.menu_index:
+                        cv2.rectangle(frame, (width // 3, y), (2 * width // 3, y + 60), HIGHLIGHT_COLOR, -1)
+                    render_text(frame, f"MENU ITEM {i + 1}", (width // 3, y, 2 * width // 3, y + 60))
+            elif self.screen == 'motion':
+                render_text(frame, f"MOTION {self.player_index + 1:02d}", (40, 20, width // 2, 100))
+                x = width // 2
+                if self.motion_active:
+                    x = 200 + int((now - self._screen_started) * 600) % (width - 400)
+                cv2.circle(frame, (x, height // 2), 120, TEXT_COLOR, -1)
+            else:
+                render_text(frame, "OTHER MENU", (40, 20, width // 2, 100))
+            if now < self._screen_until:
+                progress = (now - self._screen_started) / max(self.screen_time, 1e-6)
+                frame = (frame * max(progress, 0.0)).astype(np.uint8)
+            return frame
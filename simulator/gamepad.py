@@ -0,0 +1,126 @@
+import enum
+import sys
+import types
+
+class XUSB_BUTTON(enum.IntFlag):
+    # Same values as vgamepad.XUSB_BUTTON.
+    XUSB_GAMEPAD_DPAD_UP = 0x0001
+    XUSB_GAMEPAD_DPAD_DOWN = 0x0002
+    XUSB_GAMEPAD_DPAD_LEFT = 0x0004
+    XUSB_GAMEPAD_DPAD_RIGHT = 0x0008
+    XUSB_GAMEPAD_START = 0x0010
+    XUSB_GAMEPAD_BACK = 0x0020
+    XUSB_GAMEPAD_LEFT_THUMB = 0x0040
+    XUSB_GAMEPAD_RIGHT_THUMB = 0x0080
+    XUSB_GAMEPAD_LEFT_SHOULDER = 0x0100
+    XUSB_GAMEPAD_RIGHT_SHOULDER = 0x0200
+    XUSB_GAMEPAD_GUIDE = 0x0400
+    XUSB_GAMEPAD_A = 0x1000
+    XUSB_GAMEPAD_B = 0x2000
+    XUSB_GAMEPAD_X = 0x4000
+    XUSB_GAMEPAD_Y = 0x8000
+
+# Buttons the menu model understands, by name. Stick directions map to the DPAD.
+BUTTON_NAMES = {
+    XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP: 'UP',
+    XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN: 'DOWN',
+    XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT: 'LEFT',
+    XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT: 'RIGHT',
+    XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER: 'LB',
+    XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER: 'RB',
+    XUSB_BUTTON.XUSB_GAMEPAD_A: 'A',
+    XUSB_BUTTON.XUSB_GAMEPAD_B: 'B',
+}
+
+def stick_direction(x, y, deadzone=0.5):
+    if y <= -deadzone:
+        return 'UP'
+    if y >= deadzone:
+        return 'DOWN'
+    if x <= -deadzone:
+        return 'LEFT'
+    if x >= deadzone:
+        return 'RIGHT'
+    return None
+
+class FakeGamepad:
+    # Stand-in for vgamepad.VX360Gamepad. Like the real pad, nothing is sent until
+    # update(); every update reports the new button and stick edges to the game.
+    def __init__(self, game=None):
+        self.game = game
+        self._buttons = 0
+        self._left_stick = (0.0, 0.0)
+        self._right_stick = (0.0, 0.0)
+        self._left_trigger = 0.0
+        self._right_trigger = 0.0
+        self._sent_buttons = 0
+        self._sent_direction = None
+        self._sent_hold = False
+
+    def press_button(self, button):
+        self._buttons |= int(button)
+
+    def release_button(self, button):
+        self._buttons &= ~int(button)
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        self._left_stick = (x_value_float, y_value_float)
+
+    def right_joystick_float(self, x_value_float, y_value_float):
+        self._right_stick = (x_value_float, y_value_float)
+
+    def left_trigger_float(self, value_float):
+        self._left_trigger = value_float
+
+    def right_trigger_float(self, value_float):
+        self._right_trigger = value_float
+
+    def left_trigger(self, value):
+        self._left_trigger = value / 255
+
+    def right_trigger(self, value):
+        self._right_trigger = value / 255
+
+    def reset(self):
+        self._buttons = 0
+        self._left_stick = self._right_stick = (0.0, 0.0)
+        self._left_trigger = self._right_trigger = 0.0
+
+    def update(self):
+        if self.game is None:
+            return
+        pressed = self._buttons & ~self._sent_buttons
+        released = self._sent_buttons & ~self._buttons
+        self._sent_buttons = self._buttons
+        for button, name in BUTTON_NAMES.items():
+            if pressed & button:
+                self.game.press(name)
+            elif released & button:
+                self.game.release(name)
+        direction = stick_direction(*self._left_stick)
+        if direction != self._sent_direction:
+            if self._sent_direction is not None:
+                self.game.release(self._sent_direction)
+            if direction is not None:
+                self.game.press(direction)
+            self._sent_direction = direction
+        # The motion view plays while the right stick or left trigger is held.
+        hold = abs(self._right_stick[0]) >= 0.5 or self._left_trigger >= 0.5
+        if hold != self._sent_hold:
+            self.game.set_motion(hold)
+            self._sent_hold = hold
+
+def install_fake_vgamepad():
+    # Registers a `vgamepad` module backed by FakeGamepad when the real package is
+    # not available (it needs the ViGEmBus driver on Windows), so the bot's modules
+    # can be imported on any machine. Returns True if the fake was installed.
+    try:
+        import vgamepad  # noqa: F401
+        return False
+    except ImportError:
+        pass
+    module = types.ModuleType('vgamepad')
+    module.XUSB_BUTTON = XUSB_BUTTON
+    module.VX360Gamepad = FakeGamepad
+    sys.modules['vgamepad'] = module
+    return True
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+import cv2
+
+from screen_capture import OBSClient
+
+class SimulatedOBS(OBSClient):
+    # OBSClient whose frames are rendered by a MenuGame instead of fetched from
+    # OBS. Recording requests are answered locally, writing a small placeholder
+    # file on StopRecord, so TeamRecorder and AssetWriter run unchanged.
+    def __init__(self, game, record_directory=None, buffer_size=4, capture_interval=0.03, record_finalize_delay=0.05, polling=None):
+        super().__init__(buffer_size=buffer_size, capture_interval=capture_interval, polling=polling)
+        self.game = game
+        self.canvas_size = game.frame_size
+        self.record_directory = record_directory or tempfile.gettempdir()
+        self.record_finalize_delay = record_finalize_delay
+        self.recording = False
+        self.requests = []
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        self.stop_capture()
+
+    async def connect_async(self):
+        pass
+
+    async def disconnect_async(self):
+        pass
+
+    def _grab_frame(self, profile=None):
+        frame = self.game.render()
+        profile = profile or self.polling
+        if profile.scale != 1.0:
+            frame = cv2.resize(frame, self._profile_size(profile), interpolation=cv2.INTER_AREA)
+        return frame
+
+    async def _grab_frame_async(self, profile=None):
+        return self._grab_frame(profile)
+
+    async def request(self, request_type, **request_data):
+        self.requests.append(request_type)
+        if request_type == 'SetRecordDirectory':
+            self.record_directory = request_data['recordDirectory']
+            return {}
+        if request_type == 'GetRecordDirectory':
+            return {'recordDirectory': self.record_directory}
+        if request_type == 'StartRecord':
+            self.recording = True
+            return {}
+        if request_type == 'StopRecord':
+            self.recording = False
+            await asyncio.sleep(self.record_finalize_delay)
+            os.makedirs(self.record_directory, exist_ok=True)
+            output_path = os.path.join(self.record_directory, time.strftime('%Y-%m-%d %H-%M-%S') + f"-{uuid.uuid4().hex[:6]}.mkv")
+            with open(output_path, 'wb') as f:
+                f.write(b'simulated recording')
+            return {'outputPath': output_path}
+        return {}
+
+    async def begin_stop_record(self, timeout=5.0):
+        return asyncio.create_task(self.request('StopRecord'))
@@ -0,0 +1,69 @@
+import random
+import time
+
+import cv2
+import numpy as np
+
+from simulator.game import BOX_COLOR, render_text
+
+class FakeReader:
+    # Stand-in for easyocr.Reader that reads the names rendered by MenuGame. Every
+    # known name is rendered once the same way and a crop is read as the render
+    # closest to it in plain pixel distance. This is deliberately not the bot's
+    # TemplateRecognizer: the simulator renders every name identically, so it says
+    # nothing about how reliable the templates are on the real game's fonts.
+    # `latency` mimics inference time; with `error_rate` a reading loses one
+    # character, so fuzzy matching gets exercised too. `region_size` is in canvas
+    # pixels; with a `scale` below 1 the renders are downscaled like the polling
+    # frames, since the font does not render the same when drawn smaller.
+    def __init__(self, names, region_size=(640, 88), latency=0.0, error_rate=0.0, seed=None, size=(160, 22), max_distance=40.0, scale=1.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.size = size
+        self.max_distance = max_distance
+        self.calls = 0
+        self._random = random.Random(seed)
+        width, height = region_size
+        self._names = []
+        renders = []
+        for name in dict.fromkeys(name for name in names if name):
+            image = np.full((height, width, 3), BOX_COLOR, dtype=np.uint8)
+            render_text(image, name, (0, 0, width, height))
+            if scale != 1.0:
+                image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+            self._names.append(str(name))
+            renders.append(self._vector(image))
+        self._renders = np.stack(renders) if renders else np.zeros((0, size[0] * size[1]), dtype=np.float32)
+
+    def _vector(self, image):
+        # The bot may hand over a binarized, inverted or upscaled crop; reduce
+        # both sides to the same light-text-on-dark strip first.
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        if cv2.countNonZero(binary) > binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        return cv2.resize(binary, self.size, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+
+    def _read(self, image):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not self._names or image.size == 0:
+            return []
+        distances = np.abs(self._renders - self._vector(image)).mean(axis=1)
+        best = int(np.argmin(distances))
+        # Fading or scrolling frames are too far from every render to read.
+        if distances[best] > self.max_distance:
+            return []
+        name = self._names[best]
+        if len(name) > 2 and self._random.random() < self.error_rate:
+            drop = self._random.randrange(len(name))
+            name = name[:drop] + name[drop + 1:]
+        height, width = image.shape[:2]
+        return [([[0, 0], [width, 0], [width, height], [0, height]], name, 0.99)]
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        return self._read(image)
+
+    def readtext(self, image, **kwargs):
+        return self._read(image)
@@ -0,0 +1,170 @@
+import asyncio
+import collections
+import logging
+import time
+
+import vgamepad as vg
+
+from timing import TRACER, span
+
+logger = logging.getLogger(__name__)
+
+BUTTONS = {
+    'A': vg.XUSB_BUTTON.XUSB_GAMEPAD_A,
+    'B': vg.XUSB_BUTTON.XUSB_GAMEPAD_B,
+    'X': vg.XUSB_BUTTON.XUSB_GAMEPAD_X,
+    'Y': vg.XUSB_BUTTON.XUSB_GAMEPAD_Y,
+    'DPAD_UP': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP,
+    'DPAD_DOWN': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN,
+    'DPAD_LEFT': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT,
+    'DPAD_RIGHT': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT,
+    'LB': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
+    'RB': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
+    'START': vg.XUSB_BUTTON.XUSB_GAMEPAD_START,
+    'BACK': vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK,
+}
+
+# Stick directions as (x, y) deflections; the y axis points down, as in press_left_analog.
+STICK_DIRECTIONS = {'UP': (0.0, -1.0), 'DOWN': (0.0, 1.0), 'LEFT': (-1.0, 0.0), 'RIGHT': (1.0, 0.0)}
+STICKS = {'LS': 'left_joystick_float', 'RS': 'right_joystick_float'}
+TRIGGERS = {'LT': 'left_trigger_float', 'RT': 'right_trigger_float'}
+SYNC_STEPS = ('settle', 'stable')
+
+# One step of a compiled segment: at `offset` seconds from the segment start,
+# press ('down') or release ('up') a control.
+TimelineEvent = collections.namedtuple('TimelineEvent', ['offset', 'action', 'control'])
+# Events with fixed offsets, then an optional sync point ('settle' or 'stable'
+# with keyword arguments) that waits on the screen before the next segment.
+TimelineSegment = collections.namedtuple('TimelineSegment', ['events', 'duration', 'sync'])
+
+class MacroError(ValueError):
+    pass
+
+def check_control(control):
+    if control in BUTTONS or control in TRIGGERS:
+        return control
+    stick, _, direction = control.partition('_')
+    if stick in STICKS and direction in STICK_DIRECTIONS:
+        return control
+    raise MacroError(f"Unknown control '{control}'. Use a button ({', '.join(BUTTONS)}), a trigger (LT, RT) "
+                     f"or a stick direction such as LS_LEFT or RS_RIGHT.")
+
+def compile_macro(name, macros, defaults=None, _stack=()):
+    # Turns a macro (a list of steps from config.yaml) into timeline segments.
+    # Steps:
+    #   {press: A, hold: 0.2, gap: 0.1, repeat: 1}  press and release, then wait `gap`
+    #   {down: RS_RIGHT} / {up: RS_RIGHT}             start / end a hold that overlaps later steps
+    #   {wait: 0.5}                                   pause
+    #   {settle: {change_timeout: 1, ...}}            wait for a menu transition (OBSClient.wait_for_transition)
+    #   {stable: {timeout: 2}}                        wait for the screen to stop changing (OBSClient.wait_for_stable)
+    #   {macro: other_name}                           inline another macro
+    # `defaults` is the timeline section of config.yaml: the default hold and gap,
+    # and a scale applied to every gap and wait to tighten (or relax) all macros at once.
+    defaults = defaults or {}
+    scale = defaults.get('scale', 1.0)
+    if name in _stack:
+        raise MacroError(f"Macro '{name}' includes itself ({' -> '.join(_stack + (name,))}).")
+    if name not in macros:
+        raise MacroError(f"Unknown macro '{name}'.")
+    segments = []
+    events = []
+    cursor = 0.0
+    for step in macros[name] or []:
+        if not isinstance(step, dict):
+            raise MacroError(f"Macro '{name}': steps must be mappings, got {step!r}.")
+        if 'press' in step:
+            control = check_control(step['press'])
+            hold = step.get('hold', defaults.get('hold', 0.2))
+            gap = step.get('gap', defaults.get('gap', 0.1)) * scale
+            for _ in range(step.get('repeat', 1)):
+                events.append(TimelineEvent(cursor, 'down', control))
+                events.append(TimelineEvent(cursor + hold, 'up', control))
+                cursor += hold + gap
+        elif 'down' in step or 'up' in step:
+            action = 'down' if 'down' in step else 'up'
+            events.append(TimelineEvent(cursor, action, check_control(step[action])))
+            cursor += step.get('gap', 0.0) * scale
+        elif 'wait' in step:
+            cursor += step['wait'] * scale
+        elif any(kind in step for kind in SYNC_STEPS):
+            kind = next(kind for kind in SYNC_STEPS if kind in step)
+            segments.append(TimelineSegment(sorted(events, key=lambda event: event.offset), cursor, (kind, dict(step[kind] or {}))))
+            events = []
+            cursor = 0.0
+        elif 'macro' in step:
+            for segment in compile_macro(step['macro'], macros, defaults, _stack + (name,)):
+                shifted = [event._replace(offset=event.offset + cursor) for event in segment.events]
+                if segment.sync is None:
+                    events.extend(shifted)
+                    cursor += segment.duration
+                else:
+                    segments.append(TimelineSegment(sorted(events + shifted, key=lambda event: event.offset), cursor + segment.duration, segment.sync))
+                    events = []
+                    cursor = 0.0
+        else:
+            raise MacroError(f"Macro '{name}': unknown step {step!r}.")
+    if events or cursor or not segments:
+        segments.append(TimelineSegment(sorted(events, key=lambda event: event.offset), cursor, None))
+    return segments
+
+def compile_macros(macros, defaults=None):
+    return {name: compile_macro(name, macros, defaults) for name in macros}
+
+def macro_duration(segments):
+    # Fixed part of a macro's run time; sync points add whatever the screen takes.
+    return sum(segment.duration for segment in segments)
+
+class TimelineRunner:
+    # Plays compiled macros on an async gamepad (game_pads.Gamepad). Every event
+    # is scheduled against an absolute monotonic deadline from the start of its
+    # segment, so a late event does not delay the ones after it, and holds can
+    # overlap other presses. Sync points call the settle/stable hooks.
+    def __init__(self, gamepad, settle=None, stable=None):
+        self.gamepad = gamepad
+        self.hooks = {'settle': settle, 'stable': stable}
+        self.max_lateness = 0.0
+
+    async def _apply(self, action, control):
+        down = action == 'down'
+        if control in BUTTONS:
+            if down:
+                await self.gamepad.press_button(BUTTONS[control])
+            else:
+                await self.gamepad.release_button(BUTTONS[control])
+        elif control in TRIGGERS:
+            await getattr(self.gamepad, TRIGGERS[control])(1.0 if down else 0.0)
+        else:
+            stick, _, direction = control.partition('_')
+            x, y = STICK_DIRECTIONS[direction] if down else (0.0, 0.0)
+            await getattr(self.gamepad, STICKS[stick])(x_value_float=x, y_value_float=y)
+
+    async def _sleep_until(self, deadline):
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run_segments(self, segments):
+        frame = None
+        for segment in segments:
+            base = time.monotonic()
+            for event in segment.events:
+                deadline = base + event.offset
+                await self._sleep_until(deadline)
+                lateness = time.monotonic() - deadline
+                self.max_lateness = max(self.max_lateness, lateness)
+                TRACER.record('timeline.lateness', deadline, lateness)
+                await self._apply(event.action, event.control)
+            await self._sleep_until(base + segment.duration)
+            if segment.sync is not None:
+                kind, kwargs = segment.sync
+                hook = self.hooks.get(kind)
+                if hook is None:
+                    logger.warning(f"No '{kind}' hook configured; skipping sync point.")
+                    continue
+                frame = await hook(**kwargs)
+        return frame
+
+    async def run(self, name, macros):
+        # Returns the frame from the last sync point, if any.
+        with span(f"macro.{name}"):
+            return await self.run_segments(macros[name])
@@ -0,0 +1,180 @@
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class SpanStats:
+    # Running count, total and max of one span name, with a fixed-size uniform
+    # sample of its durations (reservoir sampling) for the percentiles, so a
+    # span recorded at 20 Hz for hours does not grow memory or the summary's work.
+    def __init__(self, sample_size=1024, rng=None):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample_size = sample_size
+        self.sample = []
+        self._random = rng or random.Random()
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if len(self.sample) < self.sample_size:
+            self.sample.append(duration)
+        else:
+            index = self._random.randrange(self.count)
+            if index < self.sample_size:
+                self.sample[index] = duration
+
+class Tracer:
+    # Collects named spans (frame grabs, OCR calls, presses, OBS requests, menu
+    # phases, ...) from any thread. Each name keeps a SpanStats for the end-of-run
+    # summary and, when a trace file is open, every span is also written as one
+    # JSON line. Lines are buffered and written in batches to keep spans cheap.
+    def __init__(self, flush_every=256, sample_size=1024):
+        self.enabled = True
+        self.flush_every = flush_every
+        self.sample_size = sample_size
+        self.path = None
+        self.started = time.monotonic()
+        self._random = random.Random()
+        self._stats = {}
+        self._counters = collections.Counter()
+        self._buffer = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self.path = path
+        logger.info(f"Writing timing trace to {path}")
+
+    def record(self, name, start, duration, **fields):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = SpanStats(self.sample_size, self._random)
+            stats.add(duration)
+            if self._file is None:
+                return
+            entry = {'name': name, 't': round(start - self.started, 6), 'duration': round(duration, 6)}
+            if fields:
+                entry.update(fields)
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.monotonic() - start, **fields)
+
+    def timed(self, name):
+        # Decorator form of span() for plain and async functions.
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _flush_locked(self):
+        if self._file is None or not self._buffer:
+            return
+        self._file.write(''.join(json.dumps(entry) + '\n' for entry in self._buffer))
+        self._file.flush()
+        self._buffer.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def summary(self):
+        with self._lock:
+            stats = {name: (span_stats.count, span_stats.total, span_stats.max, list(span_stats.sample))
+                     for name, span_stats in self._stats.items()}
+            counters = dict(self._counters)
+        elapsed = time.monotonic() - self.started
+        spans = {}
+        for name, (count, total, maximum, sample) in sorted(stats.items()):
+            spans[name] = {
+                'count': count,
+                'total': total,
+                'mean': total / count,
+                'p50': percentile(sample, 50),
+                'p95': percentile(sample, 95),
+                'max': maximum,
+            }
+        teams = counters.get('teams', 0)
+        return {
+            'elapsed': elapsed,
+            'counters': counters,
+            'teams_per_hour': teams / elapsed * 3600 if elapsed > 0 else 0.0,
+            'spans': spans,
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"Timing summary: {summary['elapsed']:.0f}s elapsed, {summary['counters'].get('teams', 0)} teams "
+                    f"({summary['teams_per_hour']:.1f} teams/hour).")
+        for name, stats in summary['spans'].items():
+            logger.info(f"  {name:28} n={stats['count']:6}  total {stats['total']:8.1f}s  "
+                        f"p50 {stats['p50'] * 1000:8.1f}ms  p95 {stats['p95'] * 1000:8.1f}ms  max {stats['max'] * 1000:8.1f}ms")
+        return summary
+
+    def close(self):
+        summary = self.summary()
+        with self._lock:
+            self._flush_locked()
+            if self._file is None:
+                return
+            # The summary goes last, so a trace file is self-contained.
+            self._file.write(json.dumps({'name': 'summary', **summary}) + '\n')
+            self._file.close()
+            self._file = None
+
+TRACER = Tracer()
+
+def configure_timing(enabled=True, trace_path=None):
+    TRACER.enabled = enabled
+    TRACER.started = time.monotonic()
+    if enabled and trace_path:
+        TRACER.open(trace_path)
+
+def span(name, **fields):
+    return TRACER.span(name, **fields)
+
+def timed(name):
+    return TRACER.timed(name)